@@ -0,0 +1,56 @@
+"""
+Сравнение двух прогонов benchmarks/load.py по маршрутам.
+
+    python benchmarks/compare.py benchmarks/results/before.json benchmarks/results/after.json
+"""
+import argparse
+
+import orjson
+
+METRICS = ("rps", "p50_ms", "p95_ms", "p99_ms", "sql_statements_mean")
+
+
+def load(path: str) -> dict:
+    with open(path, "rb") as file:
+        return orjson.loads(file.read())
+
+
+def change(before: float | None, after: float | None) -> str:
+    if before is None or after is None:
+        return "-"
+    if before == 0:
+        return "=" if after == 0 else "new"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    before, after = load(args.before), load(args.after)
+    for run, path in ((before, args.before), (after, args.after)):
+        print(f"{path}: {run['git_commit']} {run['target']} mix={run['mix']} concurrency={run['concurrency']} "
+              f"config={run['config']}")
+    print()
+
+    print(f"{'route':<52} {'metric':<20} {'before':>10} {'after':>10} {'change':>9}")
+    routes = sorted(set(before["routes"]) | set(after["routes"]))
+    for route, old, new in [
+        *((route, before["routes"].get(route, {}), after["routes"].get(route, {})) for route in routes),
+        ("TOTAL", before["total"], after["total"]),
+    ]:
+        for metric in METRICS:
+            old_value, new_value = old.get(metric), new.get(metric)
+            print(
+                f"{route:<52} {metric:<20} "
+                f"{'-' if old_value is None else f'{old_value:.2f}':>10} "
+                f"{'-' if new_value is None else f'{new_value:.2f}':>10} "
+                f"{change(old_value, new_value):>9}"
+            )
+            route = ""
+
+
+if __name__ == "__main__":
+    main()
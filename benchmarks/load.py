@@ -0,0 +1,213 @@
+"""
+Нагрузочный прогон: пропускная способность и перцентили задержки по маршрутам, число SQL-запросов.
+
+    python benchmarks/load.py --mix mixed --concurrency 32 --duration 30
+    python benchmarks/load.py --url http://127.0.0.1:8000 --mix search
+
+Без --url приложение поднимается в этом же процессе (ASGI, без сети) с включённым Server-Timing
+и выключенным кешем ответов, если он не включён переменной окружения явно. С --url нагружается
+запущенный сервер; число SQL-запросов берётся из заголовка Server-Timing, поэтому сервер нужно
+запустить с SERVER_TIMING_ENABLED=true.
+
+Результат пишется в JSON (по умолчанию в benchmarks/results/), прогоны сравнивает benchmarks/compare.py
+"""
+import sys
+import os
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+import argparse
+import asyncio
+import math
+import random
+import re
+import subprocess
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import httpx
+import orjson
+
+from benchmarks.workload import MIXES, load_dataset, request_generator
+
+SQL_STATEMENTS = re.compile(r'desc="(\d+) statements"')
+
+# Настройки приложения, которые влияют на результат и сохраняются вместе с ним
+CONFIG_KEYS = (
+    "READ_ENGINE",
+    "RESPONSE_CACHE_ENABLED",
+    "SPATIAL_INDEX_ENABLED",
+    "QUERY_BUDGET_MODE",
+    "SQLITE_WAL",
+    "SQLITE_READ_POOL_SIZE",
+)
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """Перцентиль по ближайшему рангу; values отсортированы"""
+    if not values:
+        return None
+    return values[max(math.ceil(q / 100 * len(values)) - 1, 0)]
+
+
+@asynccontextmanager
+async def open_client(url: str | None, api_key: str | None):
+    if url:
+        import config
+
+        headers = {"X-API-Key": api_key or config.API_KEY}
+        async with httpx.AsyncClient(base_url=url, headers=headers, timeout=60) as client:
+            yield client, None
+        return
+
+    # Настройки читаются при импорте приложения — задаём их до него
+    os.environ["SERVER_TIMING_ENABLED"] = "true"
+    os.environ.setdefault("RESPONSE_CACHE_ENABLED", "false")
+    import config
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark", headers={"X-API-Key": config.API_KEY}, timeout=60
+        ) as client:
+            yield client, {key: getattr(config, key) for key in CONFIG_KEYS}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statements = defaultdict(list)
+
+    def record(self, route: str, latency: float, response: httpx.Response):
+        self.latencies[route].append(latency)
+        if response.status_code >= 400:
+            self.errors[route] += 1
+        match = SQL_STATEMENTS.search(response.headers.get("server-timing", ""))
+        if match:
+            self.statements[route].append(int(match.group(1)))
+
+    def summary(self, latencies: list[float], errors: int, statements: list[int], elapsed: float) -> dict:
+        latencies = sorted(latencies)
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "rps": len(latencies) / elapsed,
+            "mean_ms": sum(latencies) / len(latencies) * 1000,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "max_ms": latencies[-1] * 1000,
+            "sql_statements_mean": sum(statements) / len(statements) if statements else None,
+            "sql_statements_max": max(statements) if statements else None,
+        }
+
+    def report(self, elapsed: float) -> dict:
+        routes = {
+            route: self.summary(latencies, self.errors[route], self.statements[route], elapsed)
+            for route, latencies in sorted(self.latencies.items())
+        }
+        total = self.summary(
+            [value for values in self.latencies.values() for value in values],
+            sum(self.errors.values()),
+            [value for values in self.statements.values() for value in values],
+            elapsed,
+        )
+        return {"total": total, "routes": routes}
+
+
+async def drive(client, next_request, recorder: Recorder | None, concurrency: int, duration: float, limit: int | None):
+    """concurrency воркеров шлют запросы, пока не выйдет время или не наберётся limit запросов"""
+    deadline = time.perf_counter() + duration
+    issued = 0
+
+    async def worker():
+        nonlocal issued
+        while time.perf_counter() < deadline and (limit is None or issued < limit):
+            issued += 1
+            spec = next_request()
+            started = time.perf_counter()
+            response = await client.request(spec.method, spec.url, params=spec.params, json=spec.json)
+            if recorder is not None:
+                recorder.record(f"{spec.method} {spec.route}", time.perf_counter() - started, response)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: dict):
+    print(f"{'route':<52} {'req':>7} {'err':>5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'sql':>5}")
+    rows = [*report["routes"].items(), ("TOTAL", report["total"])]
+    for route, stats in rows:
+        sql = "-" if stats["sql_statements_mean"] is None else f"{stats['sql_statements_mean']:.1f}"
+        print(
+            f"{route:<52} {stats['requests']:>7} {stats['errors']:>5} {stats['rps']:>9.1f} "
+            f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} {sql:>5}"
+        )
+
+
+async def main_async(args) -> dict:
+    async with open_client(args.url, args.api_key) as (client, app_config):
+        dataset = await load_dataset(client, args.sample, args.seed)
+        next_request = request_generator(args.mix, dataset, random.Random(args.seed))
+
+        if args.warmup:
+            await drive(client, next_request, None, args.concurrency, args.warmup, None)
+        recorder = Recorder()
+        elapsed = await drive(client, next_request, recorder, args.concurrency, args.duration, args.requests)
+
+    return {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "target": args.url or "in-process",
+        "mix": args.mix,
+        "concurrency": args.concurrency,
+        "duration": elapsed,
+        "seed": args.seed,
+        "config": app_config,
+        **recorder.report(elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="адрес запущенного сервера; без него приложение поднимается в процессе")
+    parser.add_argument("--api-key", help="ключ для --url (по умолчанию API_KEY из настроек)")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=16, help="одновременных запросов")
+    parser.add_argument("--duration", type=float, default=20, help="секунд нагрузки")
+    parser.add_argument("--requests", type=int, help="остановиться после стольких запросов")
+    parser.add_argument("--warmup", type=float, default=3, help="секунд прогрева, не входят в результат")
+    parser.add_argument("--sample", type=int, default=2000, help="записей каждой таблицы в выборке")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="файл результата (по умолчанию benchmarks/results/<время>-<смесь>.json)")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+
+    output = args.output or os.path.join(
+        project_root, "benchmarks", "results", f"{datetime.now():%Y%m%d-%H%M%S}-{args.mix}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "wb") as file:
+        file.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+    print(f"\n{output}")
+
+
+if __name__ == "__main__":
+    main()
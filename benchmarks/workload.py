@@ -0,0 +1,200 @@
+"""
+Нагрузка для бенчмарков: выборка из справочника и смеси запросов.
+
+Выборка берётся через эндпоинты /export/*.ndjson, поэтому одинаково работает и с приложением
+в процессе, и с сервером по сети. Из неё строятся реальные id организаций, зданий и видов
+деятельности, поисковые фрагменты названий и области карты вокруг существующих зданий
+"""
+import random
+from dataclasses import dataclass, field
+from typing import Callable
+
+import orjson
+
+# Метров в градусе широты — для размеров областей карты
+METERS_PER_DEGREE = 111_320
+
+
+@dataclass
+class Dataset:
+    org_ids: list[int] = field(default_factory=list)
+    org_names: list[str] = field(default_factory=list)
+    building_ids: list[int] = field(default_factory=list)
+    building_points: list[tuple[float, float]] = field(default_factory=list)
+    activity_ids: list[int] = field(default_factory=list)
+    root_activity_ids: list[int] = field(default_factory=list)
+
+
+def _reservoir(sample: list, seen: int, item, size: int, rng: random.Random):
+    """Равномерная выборка фиксированного размера из потока неизвестной длины"""
+    if len(sample) < size:
+        sample.append(item)
+    else:
+        index = rng.randrange(seen)
+        if index < size:
+            sample[index] = item
+
+
+async def _sample_export(client, path: str, size: int, rng: random.Random) -> list[dict]:
+    sample = []
+    seen = 0
+    async with client.stream("GET", path) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line:
+                seen += 1
+                _reservoir(sample, seen, orjson.loads(line), size, rng)
+    return sample
+
+
+async def load_dataset(client, size: int, seed: int) -> Dataset:
+    rng = random.Random(seed)
+    organizations = await _sample_export(client, "/export/organizations.ndjson", size, rng)
+    buildings = await _sample_export(client, "/export/buildings.ndjson", size, rng)
+    activities = await _sample_export(client, "/export/activities.ndjson", size, rng)
+    if not organizations or not buildings or not activities:
+        raise RuntimeError("Справочник пуст — нагружать нечего")
+
+    return Dataset(
+        org_ids=[org["id"] for org in organizations],
+        org_names=[org["name"] for org in organizations],
+        building_ids=[building["id"] for building in buildings],
+        building_points=[(building["latitude"], building["longitude"]) for building in buildings],
+        activity_ids=[activity["id"] for activity in activities],
+        root_activity_ids=[activity["id"] for activity in activities if activity["parent_id"] is None]
+        or [activity["id"] for activity in activities],
+    )
+
+
+@dataclass
+class RequestSpec:
+    route: str
+    method: str
+    url: str
+    params: dict | list | None = None
+    json: dict | None = None
+
+
+def _search_term(rng: random.Random, data: Dataset) -> str:
+    """Фрагмент реального названия: короткие запросы идут через подстроку, от трёх символов — через FTS"""
+    name = rng.choice(data.org_names)
+    length = min(len(name), rng.choice((2, 3, 4, 5, 6)))
+    start = rng.randint(0, len(name) - length)
+    return name[start:start + length]
+
+
+def _near(rng: random.Random, data: Dataset, jitter: float = 0.005) -> tuple[float, float]:
+    lat, lng = rng.choice(data.building_points)
+    return lat + rng.uniform(-jitter, jitter), lng + rng.uniform(-jitter, jitter)
+
+
+def organization_card(rng, data):
+    org_id = rng.choice(data.org_ids)
+    return RequestSpec("/organizations/{org_id}", "GET", f"/organizations/{org_id}")
+
+
+def organization_search(rng, data):
+    return RequestSpec(
+        "/organizations/search", "GET", "/organizations/search",
+        {"query": _search_term(rng, data), "limit": 20},
+    )
+
+
+def organizations_bulk(rng, data):
+    ids = rng.sample(data.org_ids, min(len(data.org_ids), rng.randint(5, 50)))
+    return RequestSpec("/organizations", "GET", "/organizations", [("ids", org_id) for org_id in ids])
+
+
+def building_organizations(rng, data):
+    building_id = rng.choice(data.building_ids)
+    return RequestSpec(
+        "/buildings/{building_id}/organizations", "GET", f"/buildings/{building_id}/organizations", {"limit": 100},
+    )
+
+
+def nearby_radius(rng, data):
+    lat, lng = _near(rng, data)
+    return RequestSpec(
+        "/buildings/organizations/nearby", "GET", "/buildings/organizations/nearby",
+        {"lat": lat, "lng": lng, "radius": rng.choice((200, 500, 1000, 2000))},
+    )
+
+
+def nearby_viewport(rng, data):
+    """Окно карты: от квартала до района, как при масштабировании"""
+    lat, lng = _near(rng, data)
+    half = rng.choice((250, 1000, 3000)) / METERS_PER_DEGREE
+    return RequestSpec(
+        "/buildings/organizations/nearby", "GET", "/buildings/organizations/nearby",
+        {"lat_min": lat - half, "lng_min": lng - half * 2, "lat_max": lat + half, "lng_max": lng + half * 2},
+    )
+
+
+def nearby_batch(rng, data):
+    centers = []
+    for _ in range(rng.randint(2, 10)):
+        lat, lng = _near(rng, data)
+        centers.append({"lat": lat, "lng": lng, "radius": rng.choice((200, 500, 1000))})
+    return RequestSpec(
+        "/buildings/organizations/nearby/batch", "POST", "/buildings/organizations/nearby/batch",
+        json={"centers": centers},
+    )
+
+
+def activity_organizations(rng, data):
+    activity_id = rng.choice(data.activity_ids)
+    return RequestSpec(
+        "/activities/{activity_id}/organizations", "GET", f"/activities/{activity_id}/organizations", {"limit": 100},
+    )
+
+
+def activity_subtree_organizations(rng, data):
+    activity_id = rng.choice(data.root_activity_ids)
+    return RequestSpec(
+        "/activities/root/{activity_id}/organizations", "GET", f"/activities/root/{activity_id}/organizations",
+        {"limit": 100},
+    )
+
+
+def organizations_query(rng, data):
+    """«Аптека рядом с названием X»: вид деятельности с подвидами + радиус, иногда ещё и название"""
+    lat, lng = _near(rng, data)
+    params = {
+        "activity_id": rng.choice(data.root_activity_ids),
+        "lat": lat, "lng": lng, "radius": rng.choice((500, 1000, 3000)),
+        "limit": 20,
+    }
+    if rng.random() < 0.5:
+        params["name"] = _search_term(rng, data)
+    return RequestSpec("/organizations/query", "GET", "/organizations/query", params)
+
+
+def activity_tree(rng, data):
+    return RequestSpec("/activities/tree", "GET", "/activities/tree", {"root": rng.choice(data.root_activity_ids)})
+
+
+# Смеси запросов: (вес, генератор). mixed — типичная нагрузка справочника с картой
+MIXES: dict[str, list[tuple[int, Callable[[random.Random, Dataset], RequestSpec]]]] = {
+    "mixed": [
+        (30, organization_card),
+        (15, organization_search),
+        (5, organizations_bulk),
+        (10, building_organizations),
+        (15, nearby_radius),
+        (10, nearby_viewport),
+        (3, nearby_batch),
+        (5, activity_organizations),
+        (5, activity_subtree_organizations),
+        (2, activity_tree),
+        (5, organizations_query),
+    ],
+    "search": [(3, organization_search), (1, organizations_query)],
+    "map": [(3, nearby_viewport), (2, nearby_radius), (1, nearby_batch)],
+    "cards": [(4, organization_card), (1, organizations_bulk)],
+    "activities": [(2, activity_organizations), (2, activity_subtree_organizations), (1, activity_tree)],
+}
+
+
+def request_generator(mix: str, data: Dataset, rng: random.Random) -> Callable[[], RequestSpec]:
+    weights, makers = zip(*MIXES[mix])
+    return lambda: rng.choices(makers, weights)[0](rng, data)
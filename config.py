@@ -6,3 +6,52 @@ load_dotenv()
 DATABASE_CONNECTION_STRING = os.environ.get("DATABASE_CONNECTION_STRING")
 
 API_KEY = os.environ.get("API_KEY")
+
+# Как часто (в секундах) проверять версию данных для перезагрузки кешей в памяти
+DATA_VERSION_POLL_INTERVAL = float(os.environ.get("DATA_VERSION_POLL_INTERVAL", 5))
+
+# Пространственный индекс зданий в памяти процесса (равномерная сетка)
+SPATIAL_INDEX_ENABLED = os.environ.get("SPATIAL_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+# Размер ячейки сетки в градусах (0.01° ≈ 1 км)
+SPATIAL_INDEX_CELL_SIZE = float(os.environ.get("SPATIAL_INDEX_CELL_SIZE", 0.01))
+
+# Контроль числа SQL-запросов на эндпоинт: off | warn | enforce (enforce — для тестовых прогонов)
+QUERY_BUDGET_MODE = os.environ.get("QUERY_BUDGET_MODE", "off").lower()
+
+# Метрики запросов в формате Prometheus на /metrics
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Заголовок Server-Timing с временем SQL и сериализации в каждом ответе
+SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Кеш ответов горячих эндпоинтов в памяти процесса, сбрасывается при смене версии данных
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 10000))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Сколько секунд ответ свежий и сколько ещё его можно отдавать устаревшим, обновляя в фоне
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", 60))
+RESPONSE_CACHE_STALE_TTL = float(os.environ.get("RESPONSE_CACHE_STALE_TTL", 300))
+
+# Cache-Control для GET-ответов с ETag: по умолчанию хранить можно, но каждый раз перепроверять по If-None-Match
+CACHE_CONTROL = os.environ.get("CACHE_CONTROL", "no-cache")
+
+# Настройки SQLite: журнал WAL (читатели не блокируют писателя и друг друга)
+SQLITE_WAL = os.environ.get("SQLITE_WAL", "true").lower() in ("1", "true", "yes")
+# Размер пула соединений только для чтения (GET-запросы, кеши в памяти, выгрузки)
+SQLITE_READ_POOL_SIZE = int(os.environ.get("SQLITE_READ_POOL_SIZE", 8))
+# NORMAL в WAL безопасен для целостности, теряются лишь последние транзакции при сбое ОС
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+# Сколько миллисекунд ждать снятия блокировки вместо мгновенной ошибки "database is locked"
+SQLITE_BUSY_TIMEOUT = int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000))
+# Кеш страниц на соединение; отрицательное значение — в КиБ (по умолчанию 64 МиБ)
+SQLITE_CACHE_SIZE = int(os.environ.get("SQLITE_CACHE_SIZE", -65536))
+# Сколько байт файла БД отображать в память (0 — не использовать mmap)
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+
+# Движок чтения для GET-эндпоинтов: sql — запросы к SQLite, memory — колоночный снимок всего справочника в памяти
+READ_ENGINE = os.environ.get("READ_ENGINE", "sql").lower()
+
+# До какого масштаба тайлы карты собираются из кластеров; на более крупных отдаются отдельные здания
+TILE_CLUSTER_MAX_ZOOM = int(os.environ.get("TILE_CLUSTER_MAX_ZOOM", 15))
+
+# До скольких совпадений поиска по названию total считается точно; дальше — оценка по пройденной части
+SEARCH_TOTAL_EXACT_LIMIT = int(os.environ.get("SEARCH_TOTAL_EXACT_LIMIT", 10000))
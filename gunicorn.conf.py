@@ -0,0 +1,49 @@
+# Запуск в несколько процессов: gunicorn -c gunicorn.conf.py main:app
+import asyncio
+import gc
+import math
+import os
+
+
+def available_cpus() -> int:
+    """
+    Ядра, которые процессу реально достанутся: привязка к CPU (taskset, cpuset контейнера)
+    и квота CFS из cgroup (docker --cpus). os.cpu_count() видит все ядра машины и ни то, ни другое не учитывает
+    """
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    quota = period = None
+    try:
+        # cgroup v2: "<квота> <период>" или "max <период>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+    except (OSError, ValueError):
+        try:
+            # cgroup v1: квота -1 — без ограничения
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                quota = f.read().strip()
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = f.read().strip()
+        except OSError:
+            pass
+    if quota not in (None, "max", "-1") and int(period) > 0:
+        cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    return max(cpus, 1)
+
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+# По умолчанию — по воркеру на доступное ядро
+workers = int(os.environ.get("WORKERS", available_cpus()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Приложение и снимки в памяти (дерево видов деятельности, пространственный индекс) строятся
+# один раз в мастере и достаются воркерам через fork, а не копируются в каждый
+preload_app = True
+
+
+def when_ready(server):
+    from main import preload_snapshots
+
+    asyncio.run(preload_snapshots())
+    # Убираем уже созданные объекты из поля зрения сборщика мусора: его обходы в воркерах
+    # иначе пишут в заголовки объектов и постепенно копируют общие страницы памяти
+    gc.freeze()
@@ -1,6 +1,61 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
 from src.api import general_router
+from src.api.query_budget import QueryBudgetMiddleware
+from src.api.metrics import MetricsMiddleware, router_metrics, metrics_registry
+from src.api.response_cache import ResponseCacheMiddleware, response_cache
+from src.api.activities.tree import activity_tree_cache
+from src.api.buildings.spatial import spatial_index_cache
+from src.api.buildings.tiles import tile_index_cache
+from src.api.columnar import columnar_snapshot_cache
+from src.api.organizations.planner import planner_statistics_cache
+from config import (
+    SPATIAL_INDEX_ENABLED,
+    QUERY_BUDGET_MODE,
+    METRICS_ENABLED,
+    SERVER_TIMING_ENABLED,
+    RESPONSE_CACHE_ENABLED,
+    READ_ENGINE,
+)
+from src.db.session import engine_general, engine_read
+from src.db.stats import instrument_engine
+from src.db.version import data_version_watcher
+
+# Кеши в памяти строятся при старте и перестраиваются при смене версии данных
+data_version_watcher.subscribe(activity_tree_cache.reload)
+if READ_ENGINE == "memory":
+    # В колоночном снимке есть своя сетка по зданиям — отдельный пространственный индекс не нужен,
+    # а планировщику /organizations/query хватает точных размеров из снимка
+    data_version_watcher.subscribe(columnar_snapshot_cache.reload)
+else:
+    data_version_watcher.subscribe(planner_statistics_cache.reload)
+    if SPATIAL_INDEX_ENABLED:
+        data_version_watcher.subscribe(spatial_index_cache.reload)
+data_version_watcher.subscribe(tile_index_cache.reload)
+# Кеш ответов сбрасывается последним — после перестройки снимков, из которых ответы собираются
+if RESPONSE_CACHE_ENABLED:
+    data_version_watcher.subscribe(response_cache.invalidate)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await data_version_watcher.start()
+    yield
+    await data_version_watcher.stop()
+
+
+async def preload_snapshots():
+    """
+    Строит снимки в памяти в мастер-процессе gunicorn (preload_app) до запуска воркеров.
+    Воркеры получают их через fork (copy-on-write) и при старте не перестраивают: версия данных
+    уже совпадает. Соединения мастера закрываются — воркеры открывают свои
+    """
+    await data_version_watcher.refresh()
+    await engine_read.dispose()
+    await engine_general.dispose()
+
 
 app = FastAPI(
     title="Compendium API",
@@ -26,8 +81,43 @@ app = FastAPI(
         {
             "name": "Здания",
             "description": "Работа со зданиями."
+        },
+        {
+            "name": "Выгрузка",
+            "description": "Полная выгрузка справочника в NDJSON."
         }
     ],
-    docs_url="/docs"
+    docs_url="/docs",
+    lifespan=lifespan
 )
 app.include_router(general_router)
+
+if METRICS_ENABLED or SERVER_TIMING_ENABLED or QUERY_BUDGET_MODE != "off":
+    instrument_engine(engine_general)
+    instrument_engine(engine_read)
+
+if QUERY_BUDGET_MODE != "off":
+    app.add_middleware(QueryBudgetMiddleware, mode=QUERY_BUDGET_MODE)
+
+if RESPONSE_CACHE_ENABLED:
+    app.add_middleware(ResponseCacheMiddleware, cache=response_cache)
+
+# Добавленный последним middleware — внешний: метрики учитывают и отказы по бюджету запросов
+if METRICS_ENABLED or SERVER_TIMING_ENABLED:
+    app.add_middleware(MetricsMiddleware, server_timing=SERVER_TIMING_ENABLED)
+
+if METRICS_ENABLED:
+    app.include_router(router_metrics)
+    if RESPONSE_CACHE_ENABLED:
+        metrics_registry.register("compendium_response_cache_hits_total", "counter",
+                                  "Ответы из кеша", lambda: response_cache.hits)
+        metrics_registry.register("compendium_response_cache_stale_hits_total", "counter",
+                                  "Устаревшие ответы из кеша с фоновым обновлением", lambda: response_cache.stale_hits)
+        metrics_registry.register("compendium_response_cache_misses_total", "counter",
+                                  "Промахи кеша ответов", lambda: response_cache.misses)
+        metrics_registry.register("compendium_response_cache_evictions_total", "counter",
+                                  "Вытеснения из кеша ответов", lambda: response_cache.evictions)
+        metrics_registry.register("compendium_response_cache_entries", "gauge",
+                                  "Записей в кеше ответов", lambda: len(response_cache))
+        metrics_registry.register("compendium_response_cache_bytes", "gauge",
+                                  "Размер кеша ответов", lambda: response_cache.bytes)
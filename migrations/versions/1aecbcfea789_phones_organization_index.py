@@ -0,0 +1,29 @@
+"""phones organization index
+
+Revision ID: 1aecbcfea789
+Revises: 9bdc655f32ea
+Create Date: 2026-10-18 02:39:57.737370
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1aecbcfea789'
+down_revision: Union[str, Sequence[str], None] = '9bdc655f32ea'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Телефоны организации: карточка организации и выгрузка читают их по organization_id
+    op.create_index('ix_phones_organization_id', 'phones', ['organization_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_phones_organization_id', table_name='phones')
@@ -0,0 +1,50 @@
+"""data version counter
+
+Revision ID: 3122ce0ec737
+Revises: f3936c186af4
+Create Date: 2026-10-18 02:25:27.489202
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3122ce0ec737'
+down_revision: Union[str, Sequence[str], None] = 'f3936c186af4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Таблицы справочника, любая запись в которые меняет версию набора данных
+TRACKED_TABLES = ("buildings", "organizations", "phones", "activities", "organization_activities")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('data_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.CheckConstraint('id = 1', name='ck_data_version_single_row'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO data_version (id, version) VALUES (1, 1)")
+
+    for table in TRACKED_TABLES:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            op.execute(f"""
+                CREATE TRIGGER {table}_data_version_{event.lower()} AFTER {event} ON {table}
+                BEGIN
+                    UPDATE data_version SET version = version + 1 WHERE id = 1;
+                END
+            """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TRACKED_TABLES:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_data_version_{event.lower()}")
+    op.drop_table('data_version')
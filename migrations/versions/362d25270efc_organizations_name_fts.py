@@ -0,0 +1,61 @@
+"""organizations name fts
+
+Revision ID: 362d25270efc
+Revises: 3f78cedacf0f
+Create Date: 2026-10-18 02:29:57.396605
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '362d25270efc'
+down_revision: Union[str, Sequence[str], None] = '3f78cedacf0f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Внешний контент: текст хранится только в organizations, FTS держит лишь индекс триграмм.
+    # case_sensitive 0 — Unicode-свёртка регистра (в т.ч. кириллицы) и при индексации, и в запросе
+    op.execute("""
+        CREATE VIRTUAL TABLE organizations_fts USING fts5(
+            name,
+            content='organizations',
+            content_rowid='id',
+            tokenize='trigram case_sensitive 0'
+        )
+    """)
+    op.execute("INSERT INTO organizations_fts (organizations_fts) VALUES ('rebuild')")
+
+    op.execute("""
+        CREATE TRIGGER organizations_fts_ai AFTER INSERT ON organizations
+        BEGIN
+            INSERT INTO organizations_fts (rowid, name) VALUES (NEW.id, NEW.name);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER organizations_fts_au AFTER UPDATE OF id, name ON organizations
+        BEGIN
+            INSERT INTO organizations_fts (organizations_fts, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+            INSERT INTO organizations_fts (rowid, name) VALUES (NEW.id, NEW.name);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER organizations_fts_ad AFTER DELETE ON organizations
+        BEGIN
+            INSERT INTO organizations_fts (organizations_fts, rowid, name) VALUES ('delete', OLD.id, OLD.name);
+        END
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS organizations_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS organizations_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS organizations_fts_ai")
+    op.execute("DROP TABLE IF EXISTS organizations_fts")
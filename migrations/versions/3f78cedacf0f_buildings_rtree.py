@@ -0,0 +1,62 @@
+"""buildings rtree
+
+Revision ID: 3f78cedacf0f
+Revises: 3122ce0ec737
+Create Date: 2026-10-18 02:27:39.187704
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f78cedacf0f'
+down_revision: Union[str, Sequence[str], None] = '3122ce0ec737'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_organizations_building_id'), 'organizations', ['building_id'], unique=False)
+
+    # R*Tree хранит координаты во float32 с округлением наружу, поэтому
+    # точную проверку по buildings.latitude/longitude делает запрос
+    op.execute("CREATE VIRTUAL TABLE buildings_rtree USING rtree(id, min_lat, max_lat, min_lng, max_lng)")
+    op.execute("""
+        INSERT INTO buildings_rtree (id, min_lat, max_lat, min_lng, max_lng)
+        SELECT id, latitude, latitude, longitude, longitude FROM buildings
+    """)
+
+    op.execute("""
+        CREATE TRIGGER buildings_rtree_ai AFTER INSERT ON buildings
+        BEGIN
+            INSERT INTO buildings_rtree (id, min_lat, max_lat, min_lng, max_lng)
+            VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER buildings_rtree_au AFTER UPDATE OF id, latitude, longitude ON buildings
+        BEGIN
+            DELETE FROM buildings_rtree WHERE id = OLD.id;
+            INSERT INTO buildings_rtree (id, min_lat, max_lat, min_lng, max_lng)
+            VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER buildings_rtree_ad AFTER DELETE ON buildings
+        BEGIN
+            DELETE FROM buildings_rtree WHERE id = OLD.id;
+        END
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS buildings_rtree_ad")
+    op.execute("DROP TRIGGER IF EXISTS buildings_rtree_au")
+    op.execute("DROP TRIGGER IF EXISTS buildings_rtree_ai")
+    op.execute("DROP TABLE IF EXISTS buildings_rtree")
+    op.drop_index(op.f('ix_organizations_building_id'), table_name='organizations')
@@ -0,0 +1,210 @@
+"""organization counts
+
+Revision ID: 7cf44002e61e
+Revises: 1aecbcfea789
+Create Date: 2026-10-18 03:12:41.508219
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7cf44002e61e'
+down_revision: Union[str, Sequence[str], None] = '1aecbcfea789'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Тело триггера activities_closure_au из f3936c186af4: перенос поддерева в таблице замыкания
+CLOSURE_MOVE = """
+            DELETE FROM activity_closure
+            WHERE descendant_id IN (SELECT descendant_id FROM activity_closure WHERE ancestor_id = NEW.id)
+              AND ancestor_id NOT IN (SELECT descendant_id FROM activity_closure WHERE ancestor_id = NEW.id);
+
+            INSERT INTO activity_closure (ancestor_id, descendant_id, depth)
+            SELECT p.ancestor_id, s.descendant_id, p.depth + s.depth + 1
+            FROM activity_closure p, activity_closure s
+            WHERE p.descendant_id = NEW.parent_id AND s.ancestor_id = NEW.id;
+"""
+
+
+def recount_subtrees(activity_ids: str) -> str:
+    """Пересчёт организаций поддерева с нуля — для редких изменений, которые не выразить приращением"""
+    return f"""
+            UPDATE activity_organization_counts
+            SET subtree_organizations = (
+                SELECT count(DISTINCT oa.organization_id)
+                FROM activity_closure c
+                JOIN organization_activities oa ON oa.activity_id = c.descendant_id
+                WHERE c.ancestor_id = activity_organization_counts.activity_id
+            )
+            WHERE activity_id IN ({activity_ids});
+    """
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('building_organization_counts',
+    sa.Column('building_id', sa.Integer(), nullable=False),
+    sa.Column('organizations', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['building_id'], ['buildings.id'], ),
+    sa.PrimaryKeyConstraint('building_id')
+    )
+    op.create_table('activity_organization_counts',
+    sa.Column('activity_id', sa.Integer(), nullable=False),
+    sa.Column('organizations', sa.Integer(), nullable=False),
+    sa.Column('subtree_organizations', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['activity_id'], ['activities.id'], ),
+    sa.PrimaryKeyConstraint('activity_id')
+    )
+
+    # Заполняем счётчики по уже существующим данным
+    op.execute("""
+        INSERT INTO building_organization_counts (building_id, organizations)
+        SELECT id, (SELECT count(*) FROM organizations WHERE building_id = buildings.id)
+        FROM buildings
+    """)
+    op.execute("""
+        INSERT INTO activity_organization_counts (activity_id, organizations, subtree_organizations)
+        SELECT
+            id,
+            (SELECT count(*) FROM organization_activities WHERE activity_id = activities.id),
+            (
+                SELECT count(DISTINCT oa.organization_id)
+                FROM activity_closure c
+                JOIN organization_activities oa ON oa.activity_id = c.descendant_id
+                WHERE c.ancestor_id = activities.id
+            )
+        FROM activities
+    """)
+
+    # Строка счётчика заводится вместе со зданием или видом деятельности — дальше триггеры только меняют числа
+    op.execute("""
+        CREATE TRIGGER buildings_counts_ai AFTER INSERT ON buildings
+        BEGIN
+            INSERT INTO building_organization_counts (building_id, organizations) VALUES (NEW.id, 0);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER buildings_counts_ad AFTER DELETE ON buildings
+        BEGIN
+            DELETE FROM building_organization_counts WHERE building_id = OLD.id;
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER activities_counts_ai AFTER INSERT ON activities
+        BEGIN
+            INSERT INTO activity_organization_counts (activity_id, organizations, subtree_organizations)
+            VALUES (NEW.id, 0, 0);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER activities_counts_ad AFTER DELETE ON activities
+        BEGIN
+            DELETE FROM activity_organization_counts WHERE activity_id = OLD.id;
+        END
+    """)
+
+    op.execute("""
+        CREATE TRIGGER organizations_counts_ai AFTER INSERT ON organizations
+        BEGIN
+            UPDATE building_organization_counts SET organizations = organizations + 1 WHERE building_id = NEW.building_id;
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER organizations_counts_au AFTER UPDATE OF building_id ON organizations
+        WHEN OLD.building_id IS NOT NEW.building_id
+        BEGIN
+            UPDATE building_organization_counts SET organizations = organizations - 1 WHERE building_id = OLD.building_id;
+            UPDATE building_organization_counts SET organizations = organizations + 1 WHERE building_id = NEW.building_id;
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER organizations_counts_ad AFTER DELETE ON organizations
+        BEGIN
+            UPDATE building_organization_counts SET organizations = organizations - 1 WHERE building_id = OLD.building_id;
+        END
+    """)
+
+    # Новая связь добавляет организацию в поддерево каждого предка, если её там ещё не было
+    # через другой вид деятельности; удаление связи — зеркально
+    op.execute("""
+        CREATE TRIGGER organization_activities_counts_ai AFTER INSERT ON organization_activities
+        BEGIN
+            UPDATE activity_organization_counts SET organizations = organizations + 1 WHERE activity_id = NEW.activity_id;
+
+            UPDATE activity_organization_counts SET subtree_organizations = subtree_organizations + 1
+            WHERE activity_id IN (SELECT ancestor_id FROM activity_closure WHERE descendant_id = NEW.activity_id)
+              AND NOT EXISTS (
+                  SELECT 1
+                  FROM organization_activities oa
+                  JOIN activity_closure c ON c.descendant_id = oa.activity_id
+                  WHERE oa.organization_id = NEW.organization_id
+                    AND oa.activity_id != NEW.activity_id
+                    AND c.ancestor_id = activity_organization_counts.activity_id
+              );
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER organization_activities_counts_ad AFTER DELETE ON organization_activities
+        BEGIN
+            UPDATE activity_organization_counts SET organizations = organizations - 1 WHERE activity_id = OLD.activity_id;
+
+            UPDATE activity_organization_counts SET subtree_organizations = subtree_organizations - 1
+            WHERE activity_id IN (SELECT ancestor_id FROM activity_closure WHERE descendant_id = OLD.activity_id)
+              AND NOT EXISTS (
+                  SELECT 1
+                  FROM organization_activities oa
+                  JOIN activity_closure c ON c.descendant_id = oa.activity_id
+                  WHERE oa.organization_id = OLD.organization_id
+                    AND c.ancestor_id = activity_organization_counts.activity_id
+              );
+        END
+    """)
+    op.execute(f"""
+        CREATE TRIGGER organization_activities_counts_au AFTER UPDATE ON organization_activities
+        BEGIN
+            UPDATE activity_organization_counts SET organizations = organizations - 1 WHERE activity_id = OLD.activity_id;
+            UPDATE activity_organization_counts SET organizations = organizations + 1 WHERE activity_id = NEW.activity_id;
+            {recount_subtrees(
+                "SELECT ancestor_id FROM activity_closure WHERE descendant_id IN (OLD.activity_id, NEW.activity_id)"
+            )}
+        END
+    """)
+
+    # Перенос узла меняет поддеревья старых и новых предков. Пересчёт — в том же триггере, что и замыкание:
+    # порядок срабатывания разных триггеров SQLite не гарантирует, а считать нужно по уже обновлённому замыканию
+    op.execute("DROP TRIGGER activities_closure_au")
+    op.execute(f"""
+        CREATE TRIGGER activities_closure_au AFTER UPDATE OF parent_id ON activities
+        WHEN OLD.parent_id IS NOT NEW.parent_id
+        BEGIN
+            {CLOSURE_MOVE}
+            {recount_subtrees(
+                "SELECT ancestor_id FROM activity_closure WHERE descendant_id IN (OLD.parent_id, NEW.parent_id)"
+            )}
+        END
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS activities_closure_au")
+    op.execute(f"""
+        CREATE TRIGGER activities_closure_au AFTER UPDATE OF parent_id ON activities
+        WHEN OLD.parent_id IS NOT NEW.parent_id
+        BEGIN
+            {CLOSURE_MOVE}
+        END
+    """)
+    for trigger in (
+        "organization_activities_counts_au", "organization_activities_counts_ad", "organization_activities_counts_ai",
+        "organizations_counts_ad", "organizations_counts_au", "organizations_counts_ai",
+        "activities_counts_ad", "activities_counts_ai", "buildings_counts_ad", "buildings_counts_ai",
+    ):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.drop_table('activity_organization_counts')
+    op.drop_table('building_organization_counts')
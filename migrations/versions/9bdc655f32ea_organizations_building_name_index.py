@@ -0,0 +1,31 @@
+"""organizations building name index
+
+Revision ID: 9bdc655f32ea
+Revises: 362d25270efc
+Create Date: 2026-10-18 02:30:58.160288
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9bdc655f32ea'
+down_revision: Union[str, Sequence[str], None] = '362d25270efc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Покрывает и выборку по зданию, и сортировку (name, id) для курсорной пагинации
+    op.create_index('ix_organizations_building_id_name', 'organizations', ['building_id', 'name', 'id'], unique=False)
+    op.drop_index(op.f('ix_organizations_building_id'), table_name='organizations')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_organizations_building_id'), 'organizations', ['building_id'], unique=False)
+    op.drop_index('ix_organizations_building_id_name', table_name='organizations')
@@ -0,0 +1,32 @@
+"""bulk load triggers
+
+Revision ID: b52e8d1c7a90
+Revises: 7cf44002e61e
+Create Date: 2026-10-18 05:14:06.318442
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b52e8d1c7a90'
+down_revision: Union[str, Sequence[str], None] = '7cf44002e61e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('bulk_load_triggers',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('sql', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('bulk_load_triggers')
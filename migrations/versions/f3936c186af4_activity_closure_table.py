@@ -0,0 +1,106 @@
+"""activity closure table
+
+Revision ID: f3936c186af4
+Revises: e3472c6c44ba
+Create Date: 2026-10-18 02:24:30.880629
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3936c186af4'
+down_revision: Union[str, Sequence[str], None] = 'e3472c6c44ba'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('activity_closure',
+    sa.Column('ancestor_id', sa.Integer(), nullable=False),
+    sa.Column('descendant_id', sa.Integer(), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ancestor_id'], ['activities.id'], ),
+    sa.ForeignKeyConstraint(['descendant_id'], ['activities.id'], ),
+    sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    op.create_index('ix_activity_closure_descendant_id', 'activity_closure', ['descendant_id', 'ancestor_id'], unique=False)
+    op.create_index('ix_organization_activities_activity_id', 'organization_activities', ['activity_id', 'organization_id'], unique=False)
+
+    # Заполняем замыкание для уже существующего дерева
+    op.execute("""
+        INSERT INTO activity_closure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE paths(ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM activities
+            UNION ALL
+            SELECT p.ancestor_id, a.id, p.depth + 1
+            FROM paths p
+            JOIN activities a ON a.parent_id = p.descendant_id
+        )
+        SELECT ancestor_id, descendant_id, depth FROM paths
+    """)
+
+    # Новый узел: путь к самому себе + пути от всех предков родителя
+    op.execute("""
+        CREATE TRIGGER activities_closure_ai AFTER INSERT ON activities
+        BEGIN
+            INSERT INTO activity_closure (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, NEW.id, depth + 1
+            FROM activity_closure
+            WHERE descendant_id = NEW.parent_id
+            UNION ALL
+            SELECT NEW.id, NEW.id, 0;
+        END
+    """)
+
+    # Запрещаем перенос узла внутрь собственного поддерева
+    op.execute("""
+        CREATE TRIGGER activities_closure_bu BEFORE UPDATE OF parent_id ON activities
+        WHEN NEW.parent_id IS NOT NULL
+        BEGIN
+            SELECT RAISE(ABORT, 'activity cannot be moved under its own descendant')
+            WHERE EXISTS (
+                SELECT 1 FROM activity_closure
+                WHERE ancestor_id = NEW.id AND descendant_id = NEW.parent_id
+            );
+        END
+    """)
+
+    # Перенос узла: отрываем поддерево от старых предков и подвешиваем к новым
+    op.execute("""
+        CREATE TRIGGER activities_closure_au AFTER UPDATE OF parent_id ON activities
+        WHEN OLD.parent_id IS NOT NEW.parent_id
+        BEGIN
+            DELETE FROM activity_closure
+            WHERE descendant_id IN (SELECT descendant_id FROM activity_closure WHERE ancestor_id = NEW.id)
+              AND ancestor_id NOT IN (SELECT descendant_id FROM activity_closure WHERE ancestor_id = NEW.id);
+
+            INSERT INTO activity_closure (ancestor_id, descendant_id, depth)
+            SELECT p.ancestor_id, s.descendant_id, p.depth + s.depth + 1
+            FROM activity_closure p, activity_closure s
+            WHERE p.descendant_id = NEW.parent_id AND s.ancestor_id = NEW.id;
+        END
+    """)
+
+    op.execute("""
+        CREATE TRIGGER activities_closure_ad AFTER DELETE ON activities
+        BEGIN
+            DELETE FROM activity_closure
+            WHERE descendant_id = OLD.id OR ancestor_id = OLD.id;
+        END
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS activities_closure_ad")
+    op.execute("DROP TRIGGER IF EXISTS activities_closure_au")
+    op.execute("DROP TRIGGER IF EXISTS activities_closure_bu")
+    op.execute("DROP TRIGGER IF EXISTS activities_closure_ai")
+    op.drop_index('ix_organization_activities_activity_id', table_name='organization_activities')
+    op.drop_index('ix_activity_closure_descendant_id', table_name='activity_closure')
+    op.drop_table('activity_closure')
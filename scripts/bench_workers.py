@@ -0,0 +1,140 @@
+"""
+Замер масштабирования по воркерам gunicorn: пропускная способность и память (PSS)
+для разного числа процессов на одной и той же БД.
+
+    python scripts/bench_workers.py --workers 1 2 4 --duration 15
+    python scripts/bench_workers.py --workers 1 4 --mix cards
+
+Смесь запросов — та же, что у benchmarks/load.py: строится из выборки реального справочника, поэтому
+годится для БД любого объёма. Кеш ответов на время замера выключается, чтобы мерить работу приложения, а не кеша
+"""
+import sys
+import os
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+import argparse
+import asyncio
+import multiprocessing
+import random
+import signal
+import subprocess
+import time
+
+import httpx
+
+from benchmarks.workload import MIXES, Dataset, load_dataset, request_generator
+from config import API_KEY
+
+
+async def _load_dataset(base_url: str, sample: int, seed: int) -> Dataset:
+    async with httpx.AsyncClient(base_url=base_url, headers={"X-API-Key": API_KEY}, timeout=None) as client:
+        return await load_dataset(client, sample, seed)
+
+
+async def _client_loop(
+    base_url: str, duration: float, concurrency: int, mix: str, dataset: Dataset, seed: int
+) -> tuple[int, int]:
+    next_request = request_generator(mix, dataset, random.Random(seed))
+    done = errors = 0
+    deadline = time.perf_counter() + duration
+    async with httpx.AsyncClient(base_url=base_url, headers={"X-API-Key": API_KEY}, timeout=30) as client:
+        async def worker():
+            nonlocal done, errors
+            while time.perf_counter() < deadline:
+                spec = next_request()
+                response = await client.request(spec.method, spec.url, params=spec.params, json=spec.json)
+                if response.status_code == 200:
+                    done += 1
+                else:
+                    errors += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return done, errors
+
+
+def _client_process(args):
+    return asyncio.run(_client_loop(*args))
+
+
+def process_tree_pss(pid: int) -> int:
+    """Суммарный PSS (КиБ) процесса и его потомков: общие страницы делятся между процессами"""
+    children = subprocess.run(["pgrep", "-P", str(pid)], capture_output=True, text=True).stdout.split()
+    total = 0
+    for process_id in [str(pid), *children]:
+        try:
+            with open(f"/proc/{process_id}/smaps_rollup") as smaps:
+                for line in smaps:
+                    if line.startswith("Pss:"):
+                        total += int(line.split()[1])
+        except FileNotFoundError:
+            pass
+    return total
+
+
+def wait_ready(base_url: str, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/docs", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Server did not start")
+
+
+def run(
+    workers: int, port: int, duration: float, clients: int, concurrency: int, mix: str,
+    dataset: Dataset | None, sample: int, seed: int,
+) -> tuple[dict, Dataset]:
+    """Прогон с workers воркерами; выборка справочника берётся у первого поднятого сервера и переиспользуется"""
+    env = {**os.environ, "WORKERS": str(workers), "BIND": f"127.0.0.1:{port}", "RESPONSE_CACHE_ENABLED": "false"}
+    server = subprocess.Popen(
+        ["gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+        cwd=project_root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_ready(base_url)
+        if dataset is None:
+            dataset = asyncio.run(_load_dataset(base_url, sample, seed))
+        with multiprocessing.Pool(clients) as pool:
+            results = pool.map(_client_process, [
+                (base_url, duration, concurrency, mix, dataset, seed + client) for client in range(clients)
+            ])
+        pss = process_tree_pss(server.pid)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+    done = sum(result[0] for result in results)
+    errors = sum(result[1] for result in results)
+    return {"workers": workers, "rps": done / duration, "errors": errors, "pss_mb": pss / 1024}, dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=15, help="секунд нагрузки на каждый прогон")
+    parser.add_argument("--clients", type=int, default=multiprocessing.cpu_count(), help="процессов-клиентов")
+    parser.add_argument("--concurrency", type=int, default=16, help="одновременных запросов на клиента")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed")
+    parser.add_argument("--sample", type=int, default=2000, help="записей каждой таблицы в выборке")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'req/s':>10} {'errors':>7} {'PSS, MB':>9}")
+    dataset = None
+    for workers in args.workers:
+        result, dataset = run(
+            workers, args.port, args.duration, args.clients, args.concurrency,
+            args.mix, dataset, args.sample, args.seed,
+        )
+        print(f"{result['workers']:>7} {result['rps']:>10.1f} {result['errors']:>7} {result['pss_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
 """
-Генерирует тестовые данные для БД
-made by GIGAChat
+Генерирует тестовый справочник заданного объёма. При одинаковых параметрах и --seed результат одинаковый.
+
+    python scripts/gen_data.py --profile small --output data/compendium.db --replace
+    python scripts/gen_data.py --profile medium --output /tmp/compendium-1m.db
+    python scripts/gen_data.py --organizations 250000 --activity-depth 4 --activity-fanout 5
+
+Здания группируются в кластеры вокруг центров притяжения, как в реальном городе; число организаций
+в здании — с тяжёлым хвостом (бизнес-центры). Схема создаётся миграциями, строки пишутся пакетами
+Core-insert с отключёнными триггерами, производные индексы перестраиваются один раз в конце
 """
 import sys
 import os
@@ -8,178 +15,210 @@ import os
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(project_root)
 
-import asyncio
+import argparse
 import random
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import select
-
-from src.models import Model
-from src.api.organizations.models import Organization
-from src.api.organizations.models import Building
-from src.api.organizations.models import Activity
-from src.api.organizations.models import Phone
-
-
-# Настройка БД
-DATABASE_URL = "sqlite+aiosqlite:///./data/compendium.db"
-
-engine = create_async_engine(DATABASE_URL, echo=False)
-async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
-
-def fake_address():
-    streets = [
-        "Ленина", "Гагарина", "Мира", "Энтузиастов", "Пушкина", "Садовая",
-        "Кирова", "Тургенева", "Жукова", "Чехова", "Лермонтова", "Радио",
-        "Вавилова", "Космонавтов", "Баумана", "Новослободская"
-    ]
-    street = random.choice(streets)
-    number = random.randint(1, 100)
-    return f"г. Москва, ул. {street}, {number}"
-
-
-def fake_name():
-    prefixes = ["Торг", "Сервис", "Центр", "Мастер", "Профи", "Евро", "Мега", "Супер", "Альфа", "Омега", "Нано", "Квант"]
-    cores = ["Сервис", "Групп", "Лайн", "Тех", "Сеть", "Маркет", "Плюс", "Холдинг", "Системс", "Банк", "Фуд", "Фреш", "Лайф"]
-    return f"{random.choice(prefixes)}{random.choice(cores)}"
-
-
-def fake_phone():
-    return f"+7 9{random.randint(10, 99)} {random.randint(100, 999)}-{random.randint(10, 99)}-{random.randint(10, 99)}"
-
-
-async def main():
-    # Создаём таблицы
-    async with engine.begin() as conn:
-        await conn.run_sync(Model.metadata.create_all)
-
-    async with async_session() as db:
-        print("🌍 Создаём 20 зданий...")
-        buildings = []
-        base_lat = 55.75
-        base_lng = 37.61
-        for i in range(20):
-            lat = round(base_lat + random.uniform(-0.02, 0.02), 5)
-            lng = round(base_lng + random.uniform(-0.02, 0.02), 5)
-            b = Building(
-                address=fake_address(),
-                latitude=lat,
-                longitude=lng
-            )
-            buildings.append(b)
-            db.add(b)
-        await db.commit()
-        print("✅ Здания созданы")
-
-        # Назначим ID
-        for b in buildings:
-            await db.refresh(b)
-
-        print("📁 Создаём дерево из 5 корневых видов деятельности...")
-        root_names = ["Еда", "Образование", "Финансы", "Медицина", "Транспорт"]
-        roots = []
-
-        for name in root_names:
-            act = Activity(name=name, parent_id=None)
-            db.add(act)
-            roots.append(act)
-
-        await db.commit()
-        print("✅ Корни созданы")
-
-        all_activities = []
-
-        for root in roots:
-            await db.refresh(root)
-            all_activities.append(root)
-
-            # Уровень 2: 1–3 подвида
-            num_level2 = random.randint(1, 3)
-            level2_acts = []
-
-            for _ in range(num_level2):
-                act = Activity(
-                    name=f"{root.name} - {fake_name()}",
-                    parent_id=root.id
-                )
-                db.add(act)
-                level2_acts.append(act)
-                all_activities.append(act)
-
-            await db.commit()
-
-            # Уровень 3: для каждого level2 — 1–3 подвида
-            for lvl2_act in level2_acts:
-                await db.refresh(lvl2_act)
-                num_level3 = random.randint(1, 3)
-                for _ in range(num_level3):
-                    act = Activity(
-                        name=f"{lvl2_act.name} - {fake_name()}",
-                        parent_id=lvl2_act.id
-                    )
-                    db.add(act)
-                    all_activities.append(act)
-
-            await db.commit()
-
-        print("✅ Дерево активностей построено")
-
-        # Обновим все ID
-        for act in all_activities:
-            await db.refresh(act)
-
-        print("🏢 Создаём 150 организаций...")
-        organizations = []
-        for i in range(150):
-            org = Organization(
-                name=fake_name(),
-                building_id=random.choice(buildings).id
-            )
-            db.add(org)
-            organizations.append(org)
-
-        await db.commit()
-        print("✅ Организации созданы")
-
-        for org in organizations:
-            await db.refresh(org)
-
-        print("📞 Добавляем 1–2 телефона каждой организации...")
-        phones = []
-        for org in organizations:
-            num_phones = random.randint(1, 2)
-            for _ in range(num_phones):
-                phone = Phone(
-                    number=fake_phone(),
-                    organization_id=org.id
-                )
-                phones.append(phone)
-                db.add(phone)
-
-        await db.commit()
-        print("✅ Телефоны добавлены")
-
-        print("🔗 Связываем организации с 1–2 видами деятельности...")
-        activity_ids = [act.id for act in all_activities]
-        for org in organizations:
-            num_activities = random.randint(1, 2)
-            chosen_ids = random.sample(activity_ids, num_activities)
-            # Загружаем активности
-            result = await db.execute(select(Activity).where(Activity.id.in_(chosen_ids)))
-            acts = result.scalars().all()
-            org.activities.extend(acts)
-
-        await db.commit()
-        print("✅ Связи с деятельностью созданы")
-
-        print("🎉 Готово! База данных заполнена тестовыми данными.")
-        print(f"  • Здания: 20")
-        print(f"  • Организации: 150")
-        print(f"  • Телефоны: {len(phones)}")
-        print(f"  • Виды деятельности: {len(all_activities)}")
-        await engine.dispose()
+import time
+from itertools import accumulate
+
+from sqlalchemy import create_engine, event, insert
+
+from src.db.maintenance import bulk_load, upgrade_schema
+from src.models import Activity, Building, Organization, Phone, organization_activities
+
+# Число организаций по профилям; зданий в BUILDINGS_RATIO раз меньше
+PROFILES = {"small": 10_000, "medium": 1_000_000, "large": 10_000_000}
+BUILDINGS_RATIO = 5
+
+# Центр и размах города (Москва), градусы
+CITY_LAT, CITY_LNG = 55.75, 37.61
+CITY_LAT_SPREAD, CITY_LNG_SPREAD = 0.15, 0.25
+# Доля зданий вне кластеров — равномерно по городу
+BACKGROUND_SHARE = 0.15
+# Зданий на один кластер
+BUILDINGS_PER_CLUSTER = 2000
+# Параметр Парето для популярности зданий: чем меньше, тем крупнее бизнес-центры
+BUILDING_POPULARITY_ALPHA = 2.0
+
+ROOT_ACTIVITIES = [
+    "Еда", "Образование", "Финансы", "Медицина", "Транспорт", "Строительство",
+    "Торговля", "Спорт", "Красота", "Туризм", "Связь", "Недвижимость",
+]
+STREETS = [
+    "Ленина", "Гагарина", "Мира", "Энтузиастов", "Пушкина", "Садовая",
+    "Кирова", "Тургенева", "Жукова", "Чехова", "Лермонтова", "Радио",
+    "Вавилова", "Космонавтов", "Баумана", "Новослободская",
+]
+NAME_PREFIXES = ["Торг", "Сервис", "Центр", "Мастер", "Профи", "Евро", "Мега", "Супер", "Альфа", "Омега", "Нано", "Квант"]
+NAME_CORES = ["Сервис", "Групп", "Лайн", "Тех", "Сеть", "Маркет", "Плюс", "Холдинг", "Системс", "Банк", "Фуд", "Фреш", "Лайф"]
+NAME_QUALIFIERS = ["Москва", "Столица", "Север", "Юг", "Восток", "Запад", "Центр", "Экспресс", "Премиум", "Эконом"]
+
+
+def fake_address(rng: random.Random) -> str:
+    return f"г. Москва, ул. {rng.choice(STREETS)}, {rng.randint(1, 200)}"
+
+
+def fake_name(rng: random.Random) -> str:
+    name = f"{rng.choice(NAME_PREFIXES)}{rng.choice(NAME_CORES)}"
+    kind = rng.random()
+    if kind < 0.3:
+        return f"{name} {rng.choice(NAME_QUALIFIERS)}"
+    if kind < 0.5:
+        return f"{name} №{rng.randint(1, 999)}"
+    return name
+
+
+def fake_phone(rng: random.Random) -> str:
+    return f"+7 9{rng.randint(10, 99)} {rng.randint(100, 999)}-{rng.randint(10, 99)}-{rng.randint(10, 99)}"
+
+
+def generate_activities(rng: random.Random, roots: int, depth: int, fanout: int) -> list[dict]:
+    """Дерево видов деятельности: depth уровней, у каждого узла выше последнего уровня 1..fanout детей"""
+    activities = []
+    level = []
+    for index in range(roots):
+        name = ROOT_ACTIVITIES[index % len(ROOT_ACTIVITIES)]
+        if index >= len(ROOT_ACTIVITIES):
+            name = f"{name} {index // len(ROOT_ACTIVITIES) + 1}"
+        level.append({"id": len(activities) + 1, "name": name, "parent_id": None})
+        activities.append(level[-1])
+
+    for _ in range(depth - 1):
+        next_level = []
+        for parent in level:
+            for _ in range(rng.randint(1, fanout)):
+                next_level.append({
+                    "id": len(activities) + 1,
+                    "name": f"{parent['name']} - {fake_name(rng)}",
+                    "parent_id": parent["id"],
+                })
+                activities.append(next_level[-1])
+        level = next_level
+    return activities
+
+
+def generate_buildings(rng: random.Random, count: int, batch_size: int):
+    """Пакеты зданий: кластеры разной плотности и размера плюс равномерный фон"""
+    clusters = []
+    for _ in range(max(count // BUILDINGS_PER_CLUSTER, 1)):
+        clusters.append((
+            rng.gauss(CITY_LAT, CITY_LAT_SPREAD / 2),
+            rng.gauss(CITY_LNG, CITY_LNG_SPREAD / 2),
+            rng.uniform(0.002, 0.015),
+        ))
+    cluster_weights = list(accumulate(rng.paretovariate(1.2) for _ in clusters))
+
+    batch = []
+    for building_id in range(1, count + 1):
+        if rng.random() < BACKGROUND_SHARE:
+            lat = CITY_LAT + rng.uniform(-CITY_LAT_SPREAD, CITY_LAT_SPREAD)
+            lng = CITY_LNG + rng.uniform(-CITY_LNG_SPREAD, CITY_LNG_SPREAD)
+        else:
+            center_lat, center_lng, sigma = rng.choices(clusters, cum_weights=cluster_weights)[0]
+            lat = rng.gauss(center_lat, sigma)
+            # Градус долготы на широте Москвы почти вдвое короче градуса широты
+            lng = rng.gauss(center_lng, sigma * 1.8)
+        batch.append({
+            "id": building_id,
+            "address": fake_address(rng),
+            "latitude": round(lat, 5),
+            "longitude": round(lng, 5),
+        })
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def generate_organizations(rng: random.Random, count: int, buildings: int, activity_ids: list[int], batch_size: int):
+    """Пакеты (организации, телефоны, связи с видами деятельности)"""
+    building_weights = list(accumulate(rng.paretovariate(BUILDING_POPULARITY_ALPHA) for _ in range(buildings)))
+    building_ids = range(1, buildings + 1)
+    phone_id = 0
+
+    for start in range(1, count + 1, batch_size):
+        stop = min(start + batch_size, count + 1)
+        chosen_buildings = rng.choices(building_ids, cum_weights=building_weights, k=stop - start)
+        organizations, phones, links = [], [], []
+        for org_id, building_id in zip(range(start, stop), chosen_buildings):
+            organizations.append({"id": org_id, "name": fake_name(rng), "building_id": building_id})
+            for _ in range(rng.randint(1, 2)):
+                phone_id += 1
+                phones.append({"id": phone_id, "number": fake_phone(rng), "organization_id": org_id})
+            for activity_id in rng.sample(activity_ids, min(rng.randint(1, 2), len(activity_ids))):
+                links.append({"organization_id": org_id, "activity_id": activity_id})
+        yield organizations, phones, links
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=PROFILES, default="small")
+    parser.add_argument("--organizations", type=int, help="число организаций (вместо профиля)")
+    parser.add_argument("--buildings", type=int, help=f"число зданий (по умолчанию организаций / {BUILDINGS_RATIO})")
+    parser.add_argument("--activity-roots", type=int, default=5, help="корневых видов деятельности")
+    parser.add_argument("--activity-depth", type=int, default=3, help="уровней в дереве видов деятельности")
+    parser.add_argument("--activity-fanout", type=int, default=3, help="до стольких детей у каждого узла")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=50_000, help="строк в пакете и в транзакции")
+    parser.add_argument("--output", default=os.path.join(project_root, "data", "compendium.db"))
+    parser.add_argument("--replace", action="store_true", help="перезаписать существующий файл")
+    args = parser.parse_args()
+
+    organizations = args.organizations or PROFILES[args.profile]
+    buildings = args.buildings or max(organizations // BUILDINGS_RATIO, 1)
+    if os.path.exists(args.output):
+        if not args.replace:
+            parser.error(f"{args.output} уже существует, добавьте --replace")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.output + suffix):
+                os.remove(args.output + suffix)
+
+    url = f"sqlite:///{os.path.abspath(args.output)}"
+    upgrade_schema(url)
+
+    engine = create_engine(url)
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        # Файл создаётся с нуля: при сбое его проще сгенерировать заново, чем защищать журналом
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=OFF")
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.execute("PRAGMA cache_size=-262144")
+        cursor.close()
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    with engine.connect() as connection, bulk_load(connection):
+        activities = generate_activities(rng, args.activity_roots, args.activity_depth, args.activity_fanout)
+        connection.execute(insert(Activity), activities)
+        connection.commit()
+        print(f"Виды деятельности: {len(activities)}")
+
+        for batch in generate_buildings(rng, buildings, args.batch_size):
+            connection.execute(insert(Building), batch)
+            connection.commit()
+        print(f"Здания: {buildings} ({time.perf_counter() - started:.0f} с)")
+
+        activity_ids = [activity["id"] for activity in activities]
+        done = phones = links = 0
+        for batch, batch_phones, batch_links in generate_organizations(
+            rng, organizations, buildings, activity_ids, args.batch_size
+        ):
+            connection.execute(insert(Organization), batch)
+            connection.execute(insert(Phone), batch_phones)
+            connection.execute(insert(organization_activities), batch_links)
+            connection.commit()
+            done += len(batch)
+            phones += len(batch_phones)
+            links += len(batch_links)
+            print(f"\rОрганизации: {done}/{organizations} ({time.perf_counter() - started:.0f} с)", end="", flush=True)
+        print(f"\nТелефоны: {phones}, связи с видами деятельности: {links}")
+        print("Перестройка индексов...")
+
+    engine.dispose()
+    print(f"Готово за {time.perf_counter() - started:.0f} с: {args.output}")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
@@ -0,0 +1,88 @@
+"""
+Импорт организаций из выгрузки партнёра (JSONL или CSV) в БД справочника.
+
+    python scripts/import_data.py partners.jsonl
+    python scripts/import_data.py partners.csv --chunk-size 10000
+    curl -H "X-API-Key: ..." http://host/export/organizations.ndjson | python scripts/import_data.py - --format jsonl
+
+Записи с id обновляют существующие организации (телефоны и виды деятельности заменяются; id телефонов
+сохраняются — по id из записи или по совпадающему номеру),
+без id — добавляются. Здания без id ищутся по адресу и координатам и создаются при отсутствии.
+На время импорта триггеры сняты: запускайте, когда в БД больше никто не пишет.
+Если импорт был прерван (процесс убит, кончилась память), триггеры и производные таблицы восстанавливает
+
+    python scripts/import_data.py --repair
+"""
+import sys
+import os
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+
+import argparse
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+from config import DATABASE_CONNECTION_STRING, SQLITE_BUSY_TIMEOUT
+from src.db.importer import OrganizationImporter, read_csv, read_jsonl
+from src.db.maintenance import repair_after_bulk_load
+
+READERS = {"jsonl": read_jsonl, "csv": read_csv}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", nargs="?", help="файл выгрузки или - для stdin")
+    parser.add_argument("--format", choices=READERS, help="по умолчанию — по расширению файла")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="записей в порции и в транзакции")
+    parser.add_argument("--database", default=DATABASE_CONNECTION_STRING, help="адрес БД (по умолчанию из настроек)")
+    parser.add_argument("--repair", action="store_true",
+                        help="вернуть триггеры и перестроить производные таблицы после прерванного импорта")
+    args = parser.parse_args()
+    if args.input is None and not args.repair:
+        parser.error("укажите файл выгрузки или --repair")
+
+    # Импорт синхронный: асинхронный драйвер из настроек меняем на встроенный sqlite3
+    engine = create_engine(make_url(args.database).set(drivername="sqlite"))
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+
+    if args.repair:
+        try:
+            with engine.connect() as connection:
+                restored = repair_after_bulk_load(connection)
+        finally:
+            engine.dispose()
+        print(f"Готово: восстановлено триггеров {restored}, производные таблицы перестроены")
+        return
+
+    input_format = args.format
+    if input_format is None:
+        extension = os.path.splitext(args.input)[1].lower()
+        input_format = "csv" if extension == ".csv" else "jsonl" if extension in (".jsonl", ".ndjson") else None
+    if input_format is None:
+        parser.error("не удалось определить формат, укажите --format")
+
+    file = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8", newline="")
+    try:
+        with engine.connect() as connection:
+            report = OrganizationImporter(connection, args.chunk_size).run(READERS[input_format](file))
+    finally:
+        if file is not sys.stdin:
+            file.close()
+        engine.dispose()
+
+    print(f"Готово: записей {report.records}, импортировано {report.imported}, "
+          f"новых зданий {report.buildings_created}, ошибок {report.errors}")
+    for message in report.messages:
+        print(f"  {message}")
+    if report.errors > len(report.messages):
+        print(f"  ... и ещё {report.errors - len(report.messages)}")
+    sys.exit(1 if report.errors else 0)
+
+
+if __name__ == "__main__":
+    main()
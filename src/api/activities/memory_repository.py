@@ -0,0 +1,55 @@
+from itertools import islice
+
+from src.api.activities.repository import ActivityRepository
+from src.api.columnar import columnar_snapshot_cache
+from src.api.pagination import keyset_page, slice_page
+
+
+class MemoryActivityRepository(ActivityRepository):
+    """Те же выборки, что у ActivityRepository, но из колоночного снимка в памяти, без запросов к БД"""
+
+    async def get_organizations_by_activity_id(self, activity_id: int, offset: int, limit: int, cursor: list | None = None):
+        snapshot = await columnar_snapshot_cache.get()
+        if not snapshot.has_activity(activity_id):
+            return None, "Activity not found"
+
+        positions = snapshot.activity_organizations(activity_id)
+        page, next_cursor = slice_page(positions, limit, snapshot.id_key, offset, cursor)
+        return {
+                   "offset": offset,
+                   "limit": limit,
+                   "organizations": [snapshot.organization(pos) for pos in page],
+                   "next_cursor": next_cursor,
+                   "total": len(positions),
+                   "total_is_exact": True
+               }, None
+
+    async def get_organizations_by_activity_and_descendants(self, activity_id: int, offset: int, limit: int, cursor: list | None = None):
+        snapshot = await columnar_snapshot_cache.get()
+        if not snapshot.has_activity(activity_id):
+            return None, "Activity not found"
+
+        # Позиции по возрастанию id, как и GROUP BY ... ORDER BY в SQL; слияние ленивое — берём только страницу
+        activities = set(snapshot.tree.descendants(activity_id))
+        skip = 0 if cursor is not None else offset
+        positions = snapshot.subtree_organizations(activity_id, cursor[0] if cursor is not None else None)
+        page, next_cursor = keyset_page(list(islice(positions, skip, skip + limit + 1)), limit, snapshot.id_key)
+        organizations = [
+            {
+                "organization": snapshot.organization(pos),
+                "matched_activities": [
+                    {"id": matched_id, "name": snapshot.tree.get_name(matched_id)}
+                    for matched_id in sorted(a for a in snapshot.activity_ids(pos) if a in activities)
+                ]
+            }
+            for pos in page
+        ]
+
+        return {
+                   "offset": offset,
+                   "limit": limit,
+                   "organizations": organizations,
+                   "next_cursor": next_cursor,
+                   "total": snapshot.subtree_organization_count(activity_id),
+                   "total_is_exact": True
+               }, None
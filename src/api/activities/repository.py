@@ -1,86 +1,107 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func, JSON
 
+from src.api.pagination import keyset_page
 from src.models import Organization
 from src.models import Activity
+from src.models import activity_closure
+from src.models import activity_organization_counts
+from src.models import organization_activities
 
 
 class ActivityRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def get_organizations_by_activity_id(self, activity_id: int, offset: int, limit: int):
-        # Проверяем, существует ли вид деятельности
+    async def _organization_counts(self, activity_id: int):
+        """
+        Число организаций с видом деятельности и в его поддереве из счётчиков, которые ведут триггеры;
+        None — вида деятельности нет. Заодно проверка существования, без отдельного запроса
+        """
         result = await self.session.execute(
-            select(Activity).where(Activity.id == activity_id)
+            select(
+                func.coalesce(activity_organization_counts.c.organizations, 0).label("organizations"),
+                func.coalesce(activity_organization_counts.c.subtree_organizations, 0).label("subtree_organizations"),
+            )
+            .select_from(Activity)
+            .outerjoin(activity_organization_counts, activity_organization_counts.c.activity_id == Activity.id)
+            .where(Activity.id == activity_id)
         )
-        activity = result.scalar_one_or_none()
-        if not activity:
+        return result.one_or_none()
+
+    async def get_organizations_by_activity_id(self, activity_id: int, offset: int, limit: int, cursor: list | None = None):
+        # Проверяем, существует ли вид деятельности
+        counts = await self._organization_counts(activity_id)
+        if counts is None:
             return None, "Activity not found"
 
-        # Получаем организации с пагинацией
-        result = await self.session.execute(
-            select(Organization)
-            .join(Organization.activities)
-            .where(Activity.id == activity_id)
-            .offset(offset)
-            .limit(limit)
+        # Порядок по id организации идёт прямо по индексу (activity_id, organization_id)
+        statement = (
+            select(Organization.id, Organization.name)
+            .join(organization_activities, organization_activities.c.organization_id == Organization.id)
+            .where(organization_activities.c.activity_id == activity_id)
+            .order_by(organization_activities.c.organization_id)
         )
-        organizations = result.scalars().all()
+        if cursor is not None:
+            statement = statement.where(organization_activities.c.organization_id > cursor[0])
+        else:
+            statement = statement.offset(offset)
+
+        # Получаем организации с пагинацией
+        result = await self.session.execute(statement.limit(limit + 1))
+        page, next_cursor = keyset_page(result.all(), limit, lambda org: (org.id,))
 
         return {
                    "offset": offset,
                    "limit": limit,
-                   "organizations": organizations
+                   "organizations": [{"id": org.id, "name": org.name} for org in page],
+                   "next_cursor": next_cursor,
+                   "total": counts.organizations,
+                   "total_is_exact": True
                }, None
 
-    async def get_organizations_by_activity_and_descendants(self, activity_id: int, offset: int, limit: int):
-        result = await self.session.execute(
-            select(Activity).where(Activity.id == activity_id)
-        )
-        activity = result.scalar_one_or_none()
-        if not activity:
+    async def get_organizations_by_activity_and_descendants(self, activity_id: int, offset: int, limit: int, cursor: list | None = None):
+        counts = await self._organization_counts(activity_id)
+        if counts is None:
             return None, "Activity not found"
 
-        descendant_ids = await self._get_all_descendant_ids(activity_id)
-        all_activity_ids = [activity_id] + descendant_ids
-
-        result = await self.session.execute(
-            select(Organization, Activity)
-            .join(Organization.activities)
-            .where(Activity.id.in_(all_activity_ids))
-            .offset(offset)
-            .limit(limit)
+        # Один запрос: поддерево из таблицы замыкания, группировка по организации и сборка
+        # совпавших видов деятельности в JSON на стороне SQLite. Пагинация — по уникальным организациям
+        matched_activities = func.json_group_array(
+            func.json_object("id", Activity.id, "name", Activity.name),
+            type_=JSON
         )
-        rows = result.all()
+        statement = (
+            select(Organization.id, Organization.name, matched_activities.label("matched_activities"))
+            .select_from(activity_closure)
+            .join(organization_activities, organization_activities.c.activity_id == activity_closure.c.descendant_id)
+            .join(Organization, Organization.id == organization_activities.c.organization_id)
+            .join(Activity, Activity.id == organization_activities.c.activity_id)
+            .where(activity_closure.c.ancestor_id == activity_id)
+            .group_by(Organization.id)
+            .order_by(Organization.id)
+        )
+        if cursor is not None:
+            statement = statement.where(Organization.id > cursor[0])
+        else:
+            statement = statement.offset(offset)
 
-        org_map = {}
-        for org, act in rows:
-            if org.id not in org_map:
-                org_map[org.id] = {
-                    "organization": org,
-                    "matched_activities": []
-                }
-            org_map[org.id]["matched_activities"].append(act)
+        result = await self.session.execute(statement.limit(limit + 1))
+        page, next_cursor = keyset_page(result.all(), limit, lambda row: (row.id,))
 
-        organizations = list(org_map.values())
+        organizations = [
+            {
+                "organization": {"id": row.id, "name": row.name},
+                "matched_activities": sorted(row.matched_activities, key=lambda act: act["id"])
+            }
+            for row in page
+        ]
 
         return {
                    "offset": offset,
                    "limit": limit,
-                   "organizations": organizations
+                   "organizations": organizations,
+                   "next_cursor": next_cursor,
+                   "total": counts.subtree_organizations,
+                   "total_is_exact": True
                }, None
-
-    async def _get_all_descendant_ids(self, parent_id: int) -> list[int]:
-        """Рекурсивно собирает все ID потомков (дети, внуки и т.д.)"""
-        result = await self.session.execute(
-            select(Activity.id).where(Activity.parent_id == parent_id)
-        )
-        children = result.scalars().all()
-
-        all_ids = list(children)
-        for child_id in children:
-            sub_ids = await self._get_all_descendant_ids(child_id)
-            all_ids.extend(sub_ids)
-
-        return all_ids
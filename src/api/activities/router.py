@@ -1,19 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 
-from src.api.organizations.service import ActivityService
+from src.api.activities.service import ActivityService
 from src.api.schemas import OrganizationResponsePaginated
 from src.api.schemas import PaginatedOrgsWithActivitiesResponse
-from src.db.session import async_session_general
+from src.api.schemas import ActivityResponseFull
+from src.api.pagination import cursor_param
+from src.api.metrics import InstrumentedRoute
+from src.api.responses import fast_json_response
+from src.db.session import async_session_read
 
-router_activities = APIRouter(prefix="/activities", tags=["Виды деятельности"])
+router_activities = APIRouter(prefix="/activities", tags=["Виды деятельности"], route_class=InstrumentedRoute)
 
 
 async def get_db():
-    async with async_session_general() as session:
+    async with async_session_read() as session:
         yield session
 
 
+@router_activities.get(
+    "/tree",
+    response_model=list[ActivityResponseFull],
+    summary="Возвращает дерево видов деятельности"
+)
+async def get_activity_tree(
+    response: Response,
+    root: Optional[int] = Query(None, description="Идентификатор корня поддерева (по умолчанию — всё дерево)"),
+    depth: Optional[int] = Query(None, ge=0, description="Сколько уровней потомков вернуть (по умолчанию — все)"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Дерево видов деятельности произвольной глубины. Отдаётся из памяти, без запросов к БД.
+
+    - **root**: идентификатор корня поддерева
+    - **depth**: глубина поддерева (0 — только сам узел)
+    """
+    service = ActivityService(db)
+    result, error = await service.get_activity_tree(root=root, depth=depth)
+    if error:
+        raise HTTPException(status_code=404, detail=error)
+    return fast_json_response(result, response)
+
+
 @router_activities.get(
     "/{activity_id}/organizations",
     response_model=OrganizationResponsePaginated,
@@ -21,20 +50,23 @@ async def get_db():
 )
 async def get_organizations_by_activity(
     activity_id: int,
+    response: Response,
     offset: int = Query(0, ge=0, description="Сдвиг записей (для пагинации)"),
     limit: int = Query(100, ge=1, le=1000, description="Макс. количество записей (до 1000)"),
-    db: AsyncSession = Depends(get_db)
+    cursor: Optional[list] = Depends(cursor_param(1)),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Поиск организаций по идентификатору вида деятельности(без учета "поддеятельностей").
+    Организации отсортированы по id
 
     - **activity_id**: идентификатор вида деятельности
     """
     service = ActivityService(db)
-    result, error = await service.get_organizations_by_activity_id(activity_id, offset=offset, limit=limit)
+    result, error = await service.get_organizations_by_activity_id(activity_id, offset=offset, limit=limit, cursor=cursor)
     if error:
         raise HTTPException(status_code=404, detail=error)
-    return result
+    return fast_json_response(result, response)
 
 
 @router_activities.get(
@@ -44,12 +76,15 @@ async def get_organizations_by_activity(
 )
 async def get_organizations_by_activity_and_children(
     activity_id: int,
+    response: Response,
     offset: int = Query(0, ge=0, description="Сдвиг записей (для пагинации)"),
     limit: int = Query(100, ge=1, le=1000, description="Макс. количество записей (до 1000)"),
+    cursor: Optional[list] = Depends(cursor_param(1)),
     db: AsyncSession = Depends(get_db),
 ):
     """
     Поиск организаций по идентификатору вида деятельности и его потомков.
+    Организации отсортированы по id
 
     - **activity_id**: идентификатор вида деятельности
     """
@@ -57,8 +92,9 @@ async def get_organizations_by_activity_and_children(
     result, error = await service.get_organizations_by_activity_and_descendants(
         activity_id=activity_id,
         offset=offset,
-        limit=limit
+        limit=limit,
+        cursor=cursor
     )
     if error:
         raise HTTPException(status_code=404, detail=error)
-    return result
+    return fast_json_response(result, response)
@@ -1,14 +1,28 @@
 from src.api.activities.repository import ActivityRepository
+from src.api.activities.memory_repository import MemoryActivityRepository
+from src.api.activities.tree import activity_tree_cache
+from config import READ_ENGINE
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
 class ActivityService:
     def __init__(self, session: AsyncSession):
-        self.repo = ActivityRepository(session)
+        self.repo = (MemoryActivityRepository if READ_ENGINE == "memory" else ActivityRepository)(session)
 
-    async def get_organizations_by_activity_id(self, activity_id: int, offset: int = 0, limit: int = 100):
-        return await self.repo.get_organizations_by_activity_id(activity_id, offset, limit)
+    async def get_organizations_by_activity_id(self, activity_id: int, offset: int = 0, limit: int = 100, cursor: list | None = None):
+        return await self.repo.get_organizations_by_activity_id(activity_id, offset, limit, cursor)
 
-    async def get_organizations_by_activity_and_descendants(self, activity_id: int, offset: int = 0, limit: int = 100):
-        return await self.repo.get_organizations_by_activity_and_descendants(activity_id, offset, limit)
+    async def get_organizations_by_activity_and_descendants(self, activity_id: int, offset: int = 0, limit: int = 100, cursor: list | None = None):
+        return await self.repo.get_organizations_by_activity_and_descendants(activity_id, offset, limit, cursor)
+
+    async def get_activity_tree(self, root: int | None = None, depth: int | None = None):
+        # Дерево целиком в памяти, к БД не обращаемся
+        tree = await activity_tree_cache.get()
+        if root is None:
+            return tree.forest(depth), None
+
+        node = tree.subtree(root, depth)
+        if node is None:
+            return None, "Activity not found"
+        return [node], None
@@ -0,0 +1,129 @@
+from array import array
+from typing import Iterable
+
+from sqlalchemy import select
+
+from src.db.session import async_session_read
+from src.db.version import VersionedCache
+from src.models import Activity
+
+
+class ActivityTree:
+    """
+    Неизменяемое дерево видов деятельности в памяти процесса.
+
+    Узлы хранятся по позициям в компактных массивах: родитель, глубина и список
+    детей в формате CSR (child_offsets / child_positions). Позиции отсортированы по id
+    """
+
+    def __init__(self, rows: Iterable[tuple[int, str, int | None]]):
+        rows = sorted(rows, key=lambda row: row[0])
+
+        self.ids = array("q", (row[0] for row in rows))
+        self.names = [row[1] for row in rows]
+        self._positions = {activity_id: pos for pos, activity_id in enumerate(self.ids)}
+
+        # Узел без существующего родителя считаем корнем
+        self.parent = array("q", (self._positions.get(row[2], -1) for row in rows))
+
+        counts = [0] * (len(rows) + 1)
+        for parent in self.parent:
+            if parent >= 0:
+                counts[parent + 1] += 1
+        for pos in range(len(rows)):
+            counts[pos + 1] += counts[pos]
+        self.child_offsets = array("q", counts)
+
+        fill = list(counts[:-1])
+        child_positions = [0] * len(rows)
+        for pos, parent in enumerate(self.parent):
+            if parent >= 0:
+                child_positions[fill[parent]] = pos
+                fill[parent] += 1
+        self.child_positions = array("q", child_positions)
+
+        self.roots = array("q", (pos for pos, parent in enumerate(self.parent) if parent < 0))
+
+        # Глубина: обход в ширину от корней
+        depth = [0] * len(rows)
+        queue = list(self.roots)
+        for pos in queue:
+            for child in self._children(pos):
+                depth[child] = depth[pos] + 1
+                queue.append(child)
+        self.depth = array("l", depth)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, activity_id: int) -> bool:
+        return activity_id in self._positions
+
+    def _children(self, pos: int):
+        return self.child_positions[self.child_offsets[pos]:self.child_offsets[pos + 1]]
+
+    def _node(self, pos: int, depth: int | None) -> dict:
+        parent = self.parent[pos]
+        children = []
+        if depth is None or depth > 0:
+            next_depth = None if depth is None else depth - 1
+            children = [self._node(child, next_depth) for child in self._children(pos)]
+        # Порядок ключей — как у полей ActivityResponseFull: ответ кодируется без пересборки моделью
+        return {
+            "name": self.names[pos],
+            "parent_id": self.ids[parent] if parent >= 0 else None,
+            "id": self.ids[pos],
+            "children": children,
+        }
+
+    def subtree(self, activity_id: int, depth: int | None = None) -> dict | None:
+        """Узел со всеми потомками до глубины depth (None — без ограничения)"""
+        pos = self._positions.get(activity_id)
+        if pos is None:
+            return None
+        return self._node(pos, depth)
+
+    def forest(self, depth: int | None = None) -> list[dict]:
+        """Все корневые виды деятельности с потомками"""
+        return [self._node(pos, depth) for pos in self.roots]
+
+    def path(self, activity_id: int) -> list[dict]:
+        """Путь от корня до вида деятельности включительно (хлебные крошки)"""
+        pos = self._positions.get(activity_id)
+        if pos is None:
+            return []
+        path = []
+        while pos >= 0:
+            path.append({"id": self.ids[pos], "name": self.names[pos]})
+            pos = self.parent[pos]
+        path.reverse()
+        return path
+
+    def descendants(self, activity_id: int) -> list[int]:
+        """id вида деятельности и всех его потомков (обход в ширину)"""
+        pos = self._positions.get(activity_id)
+        if pos is None:
+            return []
+        queue = [pos]
+        for pos in queue:
+            queue.extend(self._children(pos))
+        return [self.ids[pos] for pos in queue]
+
+    def get_name(self, activity_id: int) -> str | None:
+        pos = self._positions.get(activity_id)
+        return None if pos is None else self.names[pos]
+
+    def get_depth(self, activity_id: int) -> int | None:
+        pos = self._positions.get(activity_id)
+        return None if pos is None else self.depth[pos]
+
+
+class ActivityTreeCache(VersionedCache):
+    """Держит актуальное дерево видов деятельности"""
+
+    async def build(self, session) -> ActivityTree:
+        result = await session.execute(select(Activity.id, Activity.name, Activity.parent_id))
+        return ActivityTree(result.all())
+
+
+activity_tree_cache = ActivityTreeCache(async_session_read)
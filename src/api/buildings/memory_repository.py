@@ -0,0 +1,37 @@
+from src.api.buildings.repository import BuildingRepository
+from src.api.columnar import columnar_snapshot_cache
+
+
+class MemoryBuildingRepository(BuildingRepository):
+    """
+    BuildingRepository поверх колоночного снимка: пространственный индекс и здания с организациями
+    берутся из памяти, поэтому SQL-ветки базового класса не используются
+    """
+
+    async def _spatial_index(self):
+        snapshot = await columnar_snapshot_cache.get()
+        return snapshot.spatial
+
+    async def _activity_tree(self):
+        snapshot = await columnar_snapshot_cache.get()
+        return snapshot.tree
+
+    async def _load_buildings_with_orgs(self, building_ids: list[int], activity_id: int | None = None) -> list[dict]:
+        snapshot = await columnar_snapshot_cache.get()
+        return snapshot.buildings_with_organizations(building_ids, activity_id)
+
+    async def _subtree_organizations(self, activity_id: int) -> int:
+        snapshot = await columnar_snapshot_cache.get()
+        return snapshot.subtree_organization_count(activity_id)
+
+    async def _table_sizes(self) -> tuple[int, int]:
+        snapshot = await columnar_snapshot_cache.get()
+        return len(snapshot.org_ids), len(snapshot.building_ids)
+
+    async def _subtree_buildings(self, activity_id: int) -> list[tuple[int, float, float]]:
+        snapshot = await columnar_snapshot_cache.get()
+        positions = {snapshot.org_buildings[pos] for pos in snapshot.subtree_organizations(activity_id)}
+        return [
+            (snapshot.building_ids[pos], snapshot.building_lats[pos], snapshot.building_lngs[pos])
+            for pos in positions if pos >= 0
+        ]
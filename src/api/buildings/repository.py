@@ -1,96 +1,389 @@
-from math import radians, cos, sin, sqrt, atan2
+from math import ceil, cos, pi, radians, sqrt
+from typing import AsyncIterator
 
-from sqlalchemy import select, func, and_
+import numpy as np
+from sqlalchemy import select, and_, func, union
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload, selectinload
-from sqlalchemy import select
 
+from config import SPATIAL_INDEX_ENABLED
+from src.api.activities.tree import activity_tree_cache
+from src.geo import EARTH_RADIUS, circle_bbox, haversine, haversine_matrix, radius_bbox
+from src.api.buildings.spatial import spatial_index_cache
+from src.api.organizations.planner import planner_statistics_cache
 from src.models import Organization
 from src.models import Building
+from src.models import buildings_rtree
+from src.models import activity_closure
+from src.models import organization_activities
+
+# Сколько id подставлять в один IN (...), чтобы не упереться в лимит параметров SQLite
+HYDRATE_CHUNK_SIZE = 5000
+# Сколько зданий обрабатывать за один проход матрицы расстояний (ограничивает память)
+DISTANCE_CHUNK_SIZE = 65536
+# Ближайшие здания без пространственного индекса: наименьшая начальная глубина R*Tree-запроса, во сколько раз
+# она растёт и на каком запросе брать все здания разом
+NEAREST_START_RADIUS = 500
+NEAREST_RADIUS_GROWTH = 4
+NEAREST_MAX_RINGS = 4
+# Во сколько раз растёт запас следующей порции кандидатов, если в предыдущей не набралось k зданий
+NEAREST_BATCH_GROWTH = 4
+# С activity_id: во сколько раз порция ближайших кандидатов больше ожидаемого числа нужных зданий
+# и сколько порций набирать, прежде чем пройти поддерево целиком
+NEAREST_BATCH_MARGIN = 2
+NEAREST_MAX_ROUNDS = 2
 
 
 class BuildingRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def get_buildings_in_bbox(self, lat_min: float, lng_min: float, lat_max: float, lng_max: float):
+    @staticmethod
+    async def _spatial_index():
+        if not SPATIAL_INDEX_ENABLED:
+            return None
+        return await spatial_index_cache.get()
+
+    @staticmethod
+    async def _activity_tree():
+        return await activity_tree_cache.get()
+
+    @staticmethod
+    async def _statistics():
+        return await planner_statistics_cache.get()
+
+    async def _subtree_organizations(self, activity_id: int) -> int:
+        """Число организаций вида деятельности и его потомков — из счётчиков, которые ведут триггеры"""
+        statistics = await self._statistics()
+        return statistics.activity_organizations(activity_id)
+
+    async def _table_sizes(self) -> tuple[int, int]:
+        """Число организаций и зданий"""
+        statistics = await self._statistics()
+        return statistics.organizations, statistics.buildings
+
+    async def _subtree_buildings(self, activity_id: int) -> list[tuple[int, float, float]]:
+        """
+        (id, широта, долгота) зданий, где есть организации вида деятельности activity_id или его потомков.
+        Идём от поддерева по замыканию: для редкого вида деятельности это несколько строк, а не вся застройка
+        """
         result = await self.session.execute(
-            select(Building)
-            .join(Organization)
+            select(Building.id, Building.latitude, Building.longitude)
+            .select_from(activity_closure)
+            .join(organization_activities, organization_activities.c.activity_id == activity_closure.c.descendant_id)
+            .join(Organization, Organization.id == organization_activities.c.organization_id)
+            .join(Building, Building.id == Organization.building_id)
+            .where(activity_closure.c.ancestor_id == activity_id)
+            .distinct()
+        )
+        return result.all()
+
+    @staticmethod
+    def _has_activity(activity_id: int):
+        """Условие «у организации есть вид деятельности activity_id или его потомок» — проверяется по индексам для каждой строки"""
+        return (
+            select(organization_activities.c.organization_id)
+            .join(activity_closure, activity_closure.c.descendant_id == organization_activities.c.activity_id)
             .where(
-                and_(
-                    Building.latitude >= lat_min,
-                    Building.latitude <= lat_max,
-                    Building.longitude >= lng_min,
-                    Building.longitude <= lng_max,
-                    )
+                organization_activities.c.organization_id == Organization.id,
+                activity_closure.c.ancestor_id == activity_id,
             )
-            .distinct()  # одно здание может иметь несколько орг — убираем дубли
+            .exists()
         )
-        buildings = result.scalars().all()
 
-        return self._format_building_with_orgs(buildings), None
+    async def _load_buildings_with_orgs(self, building_ids: list[int], activity_id: int | None = None) -> list[dict]:
+        """
+        Загружает здания (только с организациями) по id, найденным пространственным индексом.
+        Строки join'а сразу собираются в словари формата BuildingWithOrgsResponse, без ORM-объектов.
+        activity_id оставляет только организации этого вида деятельности и его потомков
+        """
+        buildings = []
+        for i in range(0, len(building_ids), HYDRATE_CHUNK_SIZE):
+            query = (
+                select(
+                    Building.id, Building.address, Building.latitude, Building.longitude,
+                    Organization.id.label("organization_id"), Organization.name,
+                )
+                .join(Organization, Organization.building_id == Building.id)
+                .where(Building.id.in_(building_ids[i:i + HYDRATE_CHUNK_SIZE]))
+                .order_by(Building.id, Organization.name, Organization.id)  # организации — по названию, как в /buildings/{id}/organizations
+            )
+            if activity_id is not None:
+                query = query.where(self._has_activity(activity_id))
+            result = await self.session.execute(query)
+            for building_id, address, latitude, longitude, organization_id, name in result.all():
+                if not buildings or buildings[-1]["building"]["id"] != building_id:
+                    buildings.append({
+                        "building": {"address": address, "latitude": latitude, "longitude": longitude, "id": building_id},
+                        "organizations": [],
+                    })
+                buildings[-1]["organizations"].append({"id": organization_id, "name": name})
+        return buildings
 
-    async def get_buildings_in_radius(self, lat: float, lng: float, radius: float):
-        # Приблизительный фильтр: сначала ограничим область по градусам
-        # 1° ≈ 111 км → приблизим радиус
-        lat_delta = radius / 111_000
-        lng_delta = radius / (111_000 * abs(cos(radians(lat))))
+    async def count_buildings_in_bbox(self, lat_min: float, lng_min: float, lat_max: float, lng_max: float) -> int:
+        """Оценка числа зданий в прямоугольнике — по ячейкам индекса, без него — по R*Tree"""
+        index = await self._spatial_index()
+        if index is not None:
+            return index.count_bbox(lat_min, lng_min, lat_max, lng_max)
 
-        # Сначала грубый фильтр по прямоугольнику
         result = await self.session.execute(
-            select(Building)
-            .join(Organization)
-            .where(
-                and_(
-                    Building.latitude >= lat - lat_delta,
-                    Building.latitude <= lat + lat_delta,
-                    Building.longitude >= lng - lng_delta,
-                    Building.longitude <= lng + lng_delta,
-                    )
+            select(func.count()).select_from(buildings_rtree).where(
+                buildings_rtree.c.max_lat >= lat_min,
+                buildings_rtree.c.min_lat <= lat_max,
+                buildings_rtree.c.max_lng >= lng_min,
+                buildings_rtree.c.min_lng <= lng_max,
             )
-            .distinct()
         )
-        buildings = result.scalars().all()
+        return result.scalar_one()
+
+    async def get_building_ids_in_bbox(self, lat_min: float, lng_min: float, lat_max: float, lng_max: float) -> list[int]:
+        """id зданий внутри прямоугольника; без индекса — только здания с организациями"""
+        index = await self._spatial_index()
+        if index is not None:
+            return index.query_bbox(lat_min, lng_min, lat_max, lng_max)
+
+        result = await self.session.execute(
+            self._select_buildings_in_bbox(lat_min, lng_min, lat_max, lng_max)
+            .with_only_columns(Building.id)
+            .order_by(Building.id)
+        )
+        return result.scalars().all()
+
+    async def get_building_ids_in_radius(self, lat: float, lng: float, radius: float) -> list[int]:
+        """id зданий не дальше radius метров от точки; без индекса — только здания с организациями"""
+        index = await self._spatial_index()
+        if index is not None:
+            # Индекс сразу отдаёт здания с точным фильтром по расстоянию
+            return index.query_radius(lat, lng, radius)
+
+        # Приблизительный фильтр: сначала ограничим область по градусам
+        lat_min, lng_min, lat_max, lng_max = radius_bbox(lat, lng, radius)
+
+        # Сначала грубый фильтр по прямоугольнику (только координаты)
+        result = await self.session.execute(
+            self._select_buildings_in_bbox(lat_min, lng_min, lat_max, lng_max)
+            .with_only_columns(Building.id, Building.latitude, Building.longitude)
+        )
+        candidates = result.all()
 
         # Теперь точный фильтр по расстоянию
-        filtered_buildings = []
-        for b in buildings:
+        return [
+            building_id
+            for building_id, b_lat, b_lng in candidates
             # Простая формула "haversine" на Python
-            if self._distance(lat, lng, b.latitude, b.longitude) <= radius:
-                filtered_buildings.append(b)
-
-        # Загружаем организации
-        if filtered_buildings:
-            result = await self.session.execute(
-                select(Building)
-                .options(selectinload(Building.organizations))
-                .where(Building.id.in_([b.id for b in filtered_buildings]))
+            if self._distance(lat, lng, b_lat, b_lng) <= radius
+        ]
+
+    async def get_buildings_in_bbox(self, lat_min: float, lng_min: float, lat_max: float, lng_max: float):
+        building_ids = await self.get_building_ids_in_bbox(lat_min, lng_min, lat_max, lng_max)
+        return await self._load_buildings_with_orgs(building_ids), None
+
+    async def get_buildings_in_radius(self, lat: float, lng: float, radius: float):
+        building_ids = await self.get_building_ids_in_radius(lat, lng, radius)
+        return await self._load_buildings_with_orgs(building_ids), None
+
+    async def get_buildings_in_radius_batch(self, centers: list[tuple[float, float, float]]):
+        """
+        Поиск по радиусу сразу для нескольких центров (lat, lng, radius).
+        Кандидаты из объединения описанных прямоугольников загружаются один раз,
+        расстояния центр × здание считаются векторно
+        """
+        bboxes = [radius_bbox(lat, lng, radius) for lat, lng, radius in centers]
+
+        index = await self._spatial_index()
+        if index is not None:
+            points = {}
+            for bbox in bboxes:
+                points.update((point[0], point) for point in index.points_in_bbox(*bbox))
+            candidates = list(points.values())
+        else:
+            # Один составной запрос: каждая ветка UNION использует R*Tree
+            result = await self.session.execute(union(*(
+                self._select_buildings_in_bbox(*bbox)
+                .with_only_columns(Building.id, Building.latitude, Building.longitude)
+                for bbox in bboxes
+            )))
+            candidates = result.all()
+
+        matches = [[] for _ in centers]
+        if candidates:
+            ids = np.fromiter((row[0] for row in candidates), dtype=np.int64, count=len(candidates))
+            lats = np.fromiter((row[1] for row in candidates), dtype=np.float64, count=len(candidates))
+            lngs = np.fromiter((row[2] for row in candidates), dtype=np.float64, count=len(candidates))
+            center_lats, center_lngs, radii = (np.array(column, dtype=np.float64) for column in zip(*centers))
+
+            for start in range(0, len(ids), DISTANCE_CHUNK_SIZE):
+                end = start + DISTANCE_CHUNK_SIZE
+                distances = haversine_matrix(center_lats, center_lngs, lats[start:end], lngs[start:end])
+                for i, j in zip(*np.nonzero(distances <= radii[:, None])):
+                    matches[i].append((distances[i, j], int(ids[start + j])))
+
+        matched_ids = sorted({building_id for center in matches for _, building_id in center})
+        buildings = {b["building"]["id"]: b for b in await self._load_buildings_with_orgs(matched_ids)}
+
+        results = []
+        for (lat, lng, radius), center in zip(centers, matches):
+            # Здания центра — по возрастанию расстояния; без организаций отсеяны при загрузке
+            found = [buildings[building_id] for _, building_id in sorted(center) if building_id in buildings]
+            results.append({
+                "center": {"lat": lat, "lng": lng, "radius": radius},
+                "buildings": found
+            })
+        return results, None
+
+    async def _nearest_candidates(self, lat: float, lng: float, wanted: int) -> AsyncIterator[tuple[float, int]]:
+        """(расстояние, id) зданий по возрастанию расстояния; wanted — сколько их, скорее всего, понадобится"""
+        index = await self._spatial_index()
+        if index is not None:
+            for candidate in index.nearest(lat, lng):
+                yield candidate
+            return
+
+        # Без индекса — R*Tree с растущим радиусом: здания в пределах радиуса окончательны,
+        # дальние дождутся следующего круга. Растёт только глубина захода в застройку — расстояние
+        # до её границ проходится сразу, иначе точка вдали от застройки стоит десятка пустых кругов
+        statistics = await self._statistics()
+        outside, depth = self._nearest_reach(statistics, lat, lng, wanted)
+        previous = -1.0
+        for ring in range(1, NEAREST_MAX_RINGS + 1):
+            radius = outside + depth
+            bbox = circle_bbox(lat, lng, radius)
+            # Круг не описать прямоугольником или прямоугольник накрыл всю застройку — R*Tree больше
+            # ничего не отсекает, берём всё разом; так же и на последнем круге, чтобы число запросов было ограничено
+            everything = ring == NEAREST_MAX_RINGS or bbox is None or statistics.bounds is None or (
+                bbox[0] <= statistics.bounds[0] and bbox[1] <= statistics.bounds[1]
+                and bbox[2] >= statistics.bounds[2] and bbox[3] >= statistics.bounds[3]
             )
-            filtered_buildings = result.unique().scalars().all()
+            query = (
+                select(Building.id, Building.latitude, Building.longitude)
+                .where(select(Organization.id).where(Organization.building_id == Building.id).exists())
+                if everything else
+                self._select_buildings_in_bbox(*bbox).with_only_columns(Building.id, Building.latitude, Building.longitude)
+            )
+            result = await self.session.execute(query)
+            for distance, building_id in self._by_distance(lat, lng, result.all()):
+                if previous < distance and (distance <= radius or everything):
+                    yield distance, building_id
+            if everything:
+                return
+            previous = radius
+            depth *= NEAREST_RADIUS_GROWTH
+
+    @staticmethod
+    def _nearest_reach(statistics, lat: float, lng: float, wanted: int) -> tuple[float, float]:
+        """
+        Первый R*Tree-запрос: расстояние от точки до границ застройки и глубина захода в неё —
+        радиус круга, в который при средней плотности попадает wanted зданий, с запасом на неравномерность:
+        лишние кандидаты R*Tree дёшевы, а каждый недобор — ещё один запрос
+        """
+        if statistics.bounds is None:
+            return 0.0, NEAREST_START_RADIUS
+        lat_min, lng_min, lat_max, lng_max = statistics.bounds
+        outside = haversine(lat, lng, min(max(lat, lat_min), lat_max), min(max(lng, lng_min), lng_max))
+        area = EARTH_RADIUS ** 2 * radians(lat_max - lat_min) * radians(lng_max - lng_min) * cos(radians((lat_min + lat_max) / 2))
+        inside = sqrt(NEAREST_RADIUS_GROWTH * wanted * area / (pi * statistics.buildings)) if statistics.buildings else 0.0
+        return outside, max(inside, NEAREST_START_RADIUS)
+
+    @staticmethod
+    def _by_distance(lat: float, lng: float, rows: list[tuple[int, float, float]]) -> list[tuple[float, int]]:
+        """(расстояние, id) зданий из строк (id, широта, долгота) по возрастанию расстояния"""
+        if not rows:
+            return []
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        lats = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+        lngs = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+        distances = haversine_matrix([lat], [lng], lats, lngs)[0]
+        order = np.lexsort((ids, distances))
+        return list(zip(distances[order].tolist(), ids[order].tolist()))
+
+    async def _nearest_in_subtree(self, lat: float, lng: float, k: int, activity_id: int) -> list[dict]:
+        """k ближайших среди всех зданий с организациями поддерева — для редкого вида деятельности это дешевле обхода по близости"""
+        nearest = self._by_distance(lat, lng, await self._subtree_buildings(activity_id))[:k]
+        if not nearest:
+            return []
+        loaded = await self._load_buildings_with_orgs(sorted(building_id for _, building_id in nearest), activity_id)
+        buildings = {building["building"]["id"]: building for building in loaded}
+        return [{**buildings[building_id], "distance": round(distance, 1)} for distance, building_id in nearest]
+
+    async def get_nearest_buildings(self, lat: float, lng: float, k: int, activity_id: int | None = None):
+        """
+        k ближайших к точке зданий с организациями, по возрастанию расстояния.
+        С activity_id учитываются только организации вида деятельности и его потомков
+        """
+        batch_size = k
+        if activity_id is not None:
+            tree = await self._activity_tree()
+            if tree.get_depth(activity_id) is None:
+                return None, "Activity not found"
 
-        return self._format_building_with_orgs(filtered_buildings), None
+            # Ближайших зданий придётся перебрать около k · buildings / subtree, если организации поддерева
+            # разбросаны равномерно; берём вдвое больше. Их загрузка читает batch · organizations / buildings
+            # строк организаций — если поддерево не больше, дешевле пройти его целиком
+            subtree = await self._subtree_organizations(activity_id)
+            organization_count, building_count = await self._table_sizes()
+            if not subtree or subtree ** 2 <= NEAREST_BATCH_MARGIN * k * organization_count:
+                return await self._nearest_in_subtree(lat, lng, k, activity_id), None
+            batch_size = min(ceil(NEAREST_BATCH_MARGIN * k * building_count / subtree), HYDRATE_CHUNK_SIZE)
+
+        found = []
+        candidates = self._nearest_candidates(lat, lng, batch_size)
+        growth = 1
+        rounds = 0
+        # Здания без подходящих организаций отсеиваются при загрузке — тогда добираем следующих порциями
+        # всё крупнее
+        while len(found) < k:
+            batch = []
+            async for candidate in candidates:
+                batch.append(candidate)
+                if len(batch) == batch_size:
+                    break
+            if not batch:
+                break
+            loaded = await self._load_buildings_with_orgs(sorted(building_id for _, building_id in batch), activity_id)
+            buildings = {building["building"]["id"]: building for building in loaded}
+            matched = [
+                {**buildings[building_id], "distance": round(distance, 1)}
+                for distance, building_id in batch
+                if building_id in buildings
+            ]
+            found.extend(matched)
+            rounds += 1
+            if activity_id is None:
+                growth *= NEAREST_BATCH_GROWTH
+                batch_size = (k - len(found)) * growth
+                continue
+
+            # С activity_id следующая порция — по доле подходящих зданий рядом (+1: в маленькой порции их может
+            # не оказаться случайно). Если порция выходит больше загрузки за раз или порций уже NEAREST_MAX_ROUNDS,
+            # поддерево здесь реже среднего — точный ответ дешевле дать по нему целиком
+            batch_size = ceil(NEAREST_BATCH_MARGIN * (k - len(found)) * (len(batch) + 1) / (len(matched) + 1))
+            if len(found) < k and (rounds == NEAREST_MAX_ROUNDS or batch_size > HYDRATE_CHUNK_SIZE):
+                return await self._nearest_in_subtree(lat, lng, k, activity_id), None
+        return found[:k], None
 
     @staticmethod
-    def _format_building_with_orgs(buildings):
-        """Преобразует список Building в список словарей, совместимых с BuildingWithOrgsResponse"""
-        result = []
-        for b in buildings:
-            result.append({
-                "building": b,
-                "organizations": b.organizations  # ← уже загружены через selectinload
-            })
-        return result
+    def _select_buildings_in_bbox(lat_min: float, lng_min: float, lat_max: float, lng_max: float):
+        """Здания с организациями в прямоугольнике: кандидатов отбирает R*Tree, точную границу — колонки здания"""
+        return (
+            select(Building)
+            .select_from(buildings_rtree)
+            .join(Building, Building.id == buildings_rtree.c.id)
+            .where(
+                and_(
+                    buildings_rtree.c.max_lat >= lat_min,
+                    buildings_rtree.c.min_lat <= lat_max,
+                    buildings_rtree.c.max_lng >= lng_min,
+                    buildings_rtree.c.min_lng <= lng_max,
+                    Building.latitude >= lat_min,
+                    Building.latitude <= lat_max,
+                    Building.longitude >= lng_min,
+                    Building.longitude <= lng_max,
+                    )
+            )
+            # EXISTS вместо join + distinct: одно здание может иметь несколько организаций
+            .where(select(Organization.id).where(Organization.building_id == Building.id).exists())
+        )
 
     @staticmethod
     def _distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
         """Расстояние в метрах по приближённой формуле"""
-        r = 6371000  # метры
-        f1 = radians(lat1)
-        f2 = radians(lat2)
-        delta_f = radians(lat2 - lat1)
-        delta_l = radians(lng2 - lng1)
-
-        a = sin(delta_f / 2) ** 2 + cos(f1) * cos(f2) * sin(delta_l / 2) ** 2
-        c = 2 * atan2(sqrt(a), sqrt(1 - a))
-        return r * c
+        return haversine(lat1, lng1, lat2, lng2)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
@@ -6,14 +6,22 @@ from src.api.organizations.service import OrganizationService
 from src.api.buildings.service import BuildingService
 from src.api.schemas import OrganizationResponsePaginated
 from src.api.schemas import BuildingWithOrgsResponse
-from src.db.session import async_session_general
+from src.api.schemas import NearbyBatchRequest
+from src.api.schemas import NearbyBatchResult
+from src.api.schemas import NearestBuildingResponse
+from src.api.schemas import TileResponse
+from src.api.buildings.tiles import MAX_TILE_ZOOM
+from src.api.pagination import cursor_param
+from src.api.metrics import InstrumentedRoute
+from src.api.responses import fast_json_response
+from src.db.session import async_session_read
 
 
-router_buildings = APIRouter(prefix="/buildings", tags=["Здания"])
+router_buildings = APIRouter(prefix="/buildings", tags=["Здания"], route_class=InstrumentedRoute)
 
 
 async def get_db():
-    async with async_session_general() as session:
+    async with async_session_read() as session:
         yield session
 
 
@@ -24,21 +32,25 @@ async def get_db():
 )
 async def get_organizations_in_building(
     building_id: int,
+    response: Response,
     offset: int = Query(0, ge=0, description="Сдвиг записей (для пагинации)"),
     limit: int = Query(100, ge=1, le=1000, description="Макс. количество записей (до 1000)"),
+    cursor: Optional[list] = Depends(cursor_param(2)),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Возвращает список организаций в здании
+    Возвращает список организаций в здании, отсортированный по названию
 
     - **building_id**: Идентификатор здания
 
     """
     service = OrganizationService(db)
-    organizations, error = await service.get_organizations_by_building_id(building_id, offset=offset, limit=limit)
+    organizations, error = await service.get_organizations_by_building_id(
+        building_id, offset=offset, limit=limit, cursor=cursor
+    )
     if error:
         raise HTTPException(status_code=404, detail=error)
-    return organizations
+    return fast_json_response(organizations, response)
 
 
 @router_buildings.get(
@@ -47,6 +59,7 @@ async def get_organizations_in_building(
     summary="Возвращает список зданий и организаций по координатам на карте"
 )
 async def get_buildings_nearby(
+    response: Response,
     # Для box
     lat_min: Optional[float] = Query(None, ge=-90, le=90, description="минимальная широта (южная граница)"),
     lng_min: Optional[float] = Query(None, ge=-180, le=180, description="минимальная долгота (западная граница)"),
@@ -87,4 +100,87 @@ async def get_buildings_nearby(
     if error:
         raise HTTPException(status_code=404, detail=error)
 
-    return result
+    return fast_json_response(result, response)
+
+
+@router_buildings.post(
+    "/organizations/nearby/batch",
+    response_model=list[NearbyBatchResult],
+    summary="Поиск зданий и организаций по радиусу сразу для нескольких точек"
+)
+async def get_buildings_nearby_batch(
+    request: NearbyBatchRequest,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Пакетный поиск по радиусу (например, по точкам маршрута). Кандидаты загружаются один раз
+    на весь пакет, результаты возвращаются в порядке переданных центров.
+    Здания внутри центра отсортированы по расстоянию
+
+    - **centers**: список центров (lat, lng, radius), до 100 штук
+    """
+    service = BuildingService(db)
+    result, error = await service.get_buildings_in_radius_batch(
+        [(center.lat, center.lng, center.radius) for center in request.centers]
+    )
+    if error:
+        raise HTTPException(status_code=404, detail=error)
+    return fast_json_response(result, response)
+
+
+@router_buildings.get(
+    "/nearest",
+    response_model=list[NearestBuildingResponse],
+    summary="Возвращает k ближайших к точке зданий с организациями"
+)
+async def get_nearest_buildings(
+    response: Response,
+    lat: float = Query(ge=-90, le=90, description="широта точки"),
+    lng: float = Query(ge=-180, le=180, description="долгота точки"),
+    k: int = Query(10, ge=1, le=100, description="сколько зданий вернуть (до 100)"),
+    activity_id: Optional[int] = Query(None, description="только организации вида деятельности и его подвидов"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Ближайшие здания без заданного радиуса: поиск расширяется кольцами, пока не найдутся k зданий.
+    Здания отсортированы по расстоянию (при равенстве — по id)
+
+    - **lat**, **lng**: точка на карте
+    - **k**: сколько зданий вернуть
+    - **activity_id**: учитывать только здания, где есть организации этого вида деятельности
+      или его подвидов; в ответе — только такие организации
+    """
+    service = BuildingService(db)
+    result, error = await service.get_nearest_buildings(lat, lng, k, activity_id)
+    if error:
+        raise HTTPException(status_code=404, detail=error)
+    return fast_json_response(result, response)
+
+
+@router_buildings.get(
+    "/tiles/{z}/{x}/{y}",
+    response_model=TileResponse,
+    summary="Тайл карты: кластеры зданий на мелких масштабах, здания — на крупных"
+)
+async def get_tile(
+    response: Response,
+    z: int = Path(ge=0, le=MAX_TILE_ZOOM, description="масштаб"),
+    x: int = Path(ge=0, description="номер тайла с запада на восток"),
+    y: int = Path(ge=0, description="номер тайла с севера на юг"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Тайл в схеме XYZ (Web Mercator, как у OSM). До TILE_CLUSTER_MAX_ZOOM возвращает до 8×8 кластеров
+    с центром, числом зданий и организаций и ведущими корневыми видами деятельности;
+    кластеры предрасчитаны для каждого масштаба. На более крупных масштабах — здания тайла
+    с числом организаций в каждом
+
+    - **z**: масштаб (0–22)
+    - **x**, **y**: номер тайла
+    """
+    service = BuildingService(db)
+    result, error = await service.get_tile(z, x, y)
+    if error:
+        raise HTTPException(status_code=404, detail=error)
+    return fast_json_response(result, response)
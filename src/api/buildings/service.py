@@ -1,14 +1,30 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.api.buildings.repository import BuildingRepository
+from src.api.buildings.memory_repository import MemoryBuildingRepository
+from src.api.buildings.tiles import tile_index_cache
+from config import READ_ENGINE
 
 
 class BuildingService:
     def __init__(self, session: AsyncSession):
-        self.repo = BuildingRepository(session)
+        self.repo = (MemoryBuildingRepository if READ_ENGINE == "memory" else BuildingRepository)(session)
 
     async def get_buildings_in_bbox(self, lat_min: float, lng_min: float, lat_max: float, lng_max: float):
         return await self.repo.get_buildings_in_bbox(lat_min, lng_min, lat_max, lng_max)
 
     async def get_buildings_in_radius(self, lat: float, lng: float, radius: float):
         return await self.repo.get_buildings_in_radius(lat, lng, radius)
+
+    async def get_buildings_in_radius_batch(self, centers: list[tuple[float, float, float]]):
+        return await self.repo.get_buildings_in_radius_batch(centers)
+
+    async def get_nearest_buildings(self, lat: float, lng: float, k: int, activity_id: int | None = None):
+        return await self.repo.get_nearest_buildings(lat, lng, k, activity_id)
+
+    async def get_tile(self, z: int, x: int, y: int):
+        """Тайл из предрасчитанных кластеров — без запросов к БД"""
+        if x >= 1 << z or y >= 1 << z:
+            return None, "Tile not found"
+        index = await tile_index_cache.get()
+        return index.tile(z, x, y), None
@@ -0,0 +1,175 @@
+from array import array
+from math import asin, cos, floor, radians, sin
+from typing import Iterable, Iterator
+
+import numpy as np
+from sqlalchemy import select
+
+from config import SPATIAL_INDEX_CELL_SIZE
+from src.geo import EARTH_RADIUS, haversine, haversine_matrix, radius_bbox
+from src.db.session import async_session_read
+from src.db.version import VersionedCache
+from src.models import Building
+
+
+class SpatialGridIndex:
+    """
+    Равномерная сетка по координатам зданий.
+
+    Здания отсортированы по ячейкам и лежат в плоских массивах (ids / lats / lngs),
+    ячейка хранит только диапазон [start, end) в этих массивах
+    """
+
+    def __init__(self, rows: Iterable[tuple[int, float, float]], cell_size: float = SPATIAL_INDEX_CELL_SIZE):
+        self.cell_size = cell_size
+        rows = sorted(rows, key=lambda row: (self._cell(row[1]), self._cell(row[2]), row[0]))
+
+        self.ids = array("q", (row[0] for row in rows))
+        self.lats = array("d", (row[1] for row in rows))
+        self.lngs = array("d", (row[2] for row in rows))
+
+        self.cells: dict[tuple[int, int], tuple[int, int]] = {}
+        start = 0
+        for pos in range(1, len(rows) + 1):
+            if pos == len(rows) or self._key(pos) != self._key(start):
+                self.cells[self._key(start)] = (start, pos)
+                start = pos
+
+        # Углы описанного вокруг всех ячеек прямоугольника — чтобы понять, что кольца накрыли всё
+        xs = [cell[0] for cell in self.cells] or [0]
+        ys = [cell[1] for cell in self.cells] or [0]
+        self._extent = [(min(xs), min(ys)), (max(xs), max(ys))]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _cell(self, value: float) -> int:
+        return floor(value / self.cell_size)
+
+    def _key(self, pos: int) -> tuple[int, int]:
+        return self._cell(self.lats[pos]), self._cell(self.lngs[pos])
+
+    def _cells_in_bbox(self, lat_min: float, lng_min: float, lat_max: float, lng_max: float):
+        """Непустые ячейки, пересекающие прямоугольник"""
+        x_min, x_max = self._cell(lat_min), self._cell(lat_max)
+        y_min, y_max = self._cell(lng_min), self._cell(lng_max)
+
+        # Для огромных прямоугольников дешевле пройти по непустым ячейкам, чем по всей решётке
+        if (x_max - x_min + 1) * (y_max - y_min + 1) > len(self.cells):
+            for (x, y), span in self.cells.items():
+                if x_min <= x <= x_max and y_min <= y <= y_max:
+                    yield span
+            return
+
+        for x in range(x_min, x_max + 1):
+            for y in range(y_min, y_max + 1):
+                span = self.cells.get((x, y))
+                if span is not None:
+                    yield span
+
+    def _positions_in_bbox(self, lat_min: float, lng_min: float, lat_max: float, lng_max: float):
+        for start, end in self._cells_in_bbox(lat_min, lng_min, lat_max, lng_max):
+            for pos in range(start, end):
+                if lat_min <= self.lats[pos] <= lat_max and lng_min <= self.lngs[pos] <= lng_max:
+                    yield pos
+
+    def count_bbox(self, lat_min: float, lng_min: float, lat_max: float, lng_max: float) -> int:
+        """Оценка сверху числа зданий в прямоугольнике: все здания пересекающих его ячеек, без проверки координат"""
+        return sum(end - start for start, end in self._cells_in_bbox(lat_min, lng_min, lat_max, lng_max))
+
+    def query_bbox(self, lat_min: float, lng_min: float, lat_max: float, lng_max: float) -> list[int]:
+        """id зданий внутри прямоугольника (границы включительно)"""
+        return [self.ids[pos] for pos in self._positions_in_bbox(lat_min, lng_min, lat_max, lng_max)]
+
+    def points_in_bbox(self, lat_min: float, lng_min: float, lat_max: float, lng_max: float) -> list[tuple[int, float, float]]:
+        """(id, широта, долгота) зданий внутри прямоугольника"""
+        return [
+            (self.ids[pos], self.lats[pos], self.lngs[pos])
+            for pos in self._positions_in_bbox(lat_min, lng_min, lat_max, lng_max)
+        ]
+
+    def query_radius(self, lat: float, lng: float, radius: float) -> list[int]:
+        """id зданий не дальше radius метров от точки"""
+        lat_min, lng_min, lat_max, lng_max = radius_bbox(lat, lng, radius)
+        ids = []
+        for start, end in self._cells_in_bbox(lat_min, lng_min, lat_max, lng_max):
+            for pos in range(start, end):
+                if haversine(lat, lng, self.lats[pos], self.lngs[pos]) <= radius:
+                    ids.append(self.ids[pos])
+        return ids
+
+    def _ring_bound(self, lat: float, lng: float, x: int, y: int, ring: int) -> float:
+        """
+        Нижняя граница расстояния (м) от точки до любого здания вне квадрата колец 0..ring вокруг ячейки (x, y):
+        по широте — расстояние по меридиану, по долготе — до ближайшего меридиана за границей квадрата
+        """
+        lat_gap = min(lat - (x - ring) * self.cell_size, (x + ring + 1) * self.cell_size - lat)
+        lng_gap = min(lng - (y - ring) * self.cell_size, (y + ring + 1) * self.cell_size - lng)
+        return min(
+            EARTH_RADIUS * radians(lat_gap),
+            EARTH_RADIUS * asin(cos(radians(lat)) * sin(radians(min(lng_gap, 90)))),
+        )
+
+    def _ring(self, x: int, y: int, ring: int):
+        """Непустые ячейки кольца ring (граница квадрата со стороной 2 * ring + 1) вокруг ячейки (x, y)"""
+        if ring == 0:
+            cells = [(x, y)]
+        else:
+            cells = [(x - ring, y + dy) for dy in range(-ring, ring + 1)]
+            cells += [(x + ring, y + dy) for dy in range(-ring, ring + 1)]
+            cells += [(x + dx, y - ring) for dx in range(-ring + 1, ring)]
+            cells += [(x + dx, y + ring) for dx in range(-ring + 1, ring)]
+        for cell in cells:
+            span = self.cells.get(cell)
+            if span is not None:
+                yield span
+
+    def nearest(self, lat: float, lng: float) -> Iterator[tuple[float, int]]:
+        """
+        (расстояние в метрах, id) зданий по возрастанию расстояния, лениво. Кольца ячеек расширяются,
+        пока ближайший кандидат не окажется ближе любой ещё не просмотренной ячейки, поэтому
+        работа пропорциональна числу взятых зданий, а не плотности застройки
+        """
+        x, y = self._cell(lat), self._cell(lng)
+        lats = np.frombuffer(self.lats, dtype=np.float64)
+        lngs = np.frombuffer(self.lngs, dtype=np.float64)
+        ids = np.frombuffer(self.ids, dtype=np.int64)
+        distances = np.empty(0, dtype=np.float64)
+        candidates = np.empty(0, dtype=np.int64)
+        # Кольца, не дотягивающиеся до застройки, пусты — начинаем с первого, что её задевает
+        (x_min, y_min), (x_max, y_max) = self._extent
+        ring = max(x_min - x, x - x_max, y_min - y, y - y_max, 0)
+        while True:
+            # Кольцо длиннее, чем всего непустых ячеек (точка далеко от застройки), — добираем остальные разом
+            last = 8 * ring > len(self.cells)
+            if last:
+                spans = [span for (cx, cy), span in self.cells.items() if max(abs(cx - x), abs(cy - y)) >= ring]
+            else:
+                spans = list(self._ring(x, y, ring))
+            if spans:
+                positions = np.concatenate([np.arange(start, end) for start, end in spans])
+                distances = np.concatenate([distances, haversine_matrix([lat], [lng], lats[positions], lngs[positions])[0]])
+                candidates = np.concatenate([candidates, ids[positions]])
+
+            last = last or self._covers_all(x, y, ring)
+            ready = np.ones(len(distances), dtype=bool) if last else distances <= self._ring_bound(lat, lng, x, y, ring)
+            order = np.lexsort((candidates[ready], distances[ready]))
+            yield from zip(distances[ready][order].tolist(), candidates[ready][order].tolist())
+            if last:
+                return
+            distances, candidates = distances[~ready], candidates[~ready]
+            ring += 1
+
+    def _covers_all(self, x: int, y: int, ring: int) -> bool:
+        return all(abs(cx - x) <= ring and abs(cy - y) <= ring for cx, cy in self._extent)
+
+
+class SpatialIndexCache(VersionedCache):
+    """Держит актуальный пространственный индекс зданий"""
+
+    async def build(self, session) -> SpatialGridIndex:
+        result = await session.execute(select(Building.id, Building.latitude, Building.longitude))
+        return SpatialGridIndex(result.all())
+
+
+spatial_index_cache = SpatialIndexCache(async_session_read)
@@ -0,0 +1,173 @@
+import numpy as np
+from sqlalchemy import func, select
+
+from config import TILE_CLUSTER_MAX_ZOOM
+from src.geo import mercator_position
+from src.db.session import async_session_read
+from src.db.version import VersionedCache
+from src.models import Activity, Building, Organization, activity_closure, organization_activities
+
+# Кластер — ячейка тайловой сетки на CLUSTER_GRID_BITS уровней глубже тайла: до 8×8 кластеров в тайле
+CLUSTER_GRID_BITS = 3
+# Здания хранятся в целочисленных координатах сетки этого уровня (~2 м на экваторе)
+POSITION_BITS = 24
+MAX_TILE_ZOOM = 22
+# Сколько видов деятельности показывать у кластера
+TOP_ACTIVITIES = 3
+
+
+class ClusterLevel:
+    """Кластеры одного масштаба: ключ ячейки (x << level | y) по возрастанию и агрегаты по ней"""
+
+    def __init__(self, level: int, cells: np.ndarray, inverse: np.ndarray, index: "TileIndex"):
+        self.level = level
+        self.keys = cells
+        self.buildings = np.bincount(inverse, minlength=len(cells))
+        self.organizations = np.bincount(inverse, weights=index.org_counts, minlength=len(cells)).astype(np.int64)
+        self.lats = np.bincount(inverse, weights=index.lats, minlength=len(cells)) / self.buildings
+        self.lngs = np.bincount(inverse, weights=index.lngs, minlength=len(cells)) / self.buildings
+
+        activity_counts = np.zeros((len(cells), index.activity_counts.shape[1]))
+        for activity, column in enumerate(index.activity_counts.T):
+            activity_counts[:, activity] = np.bincount(inverse, weights=column, minlength=len(cells))
+        top = min(TOP_ACTIVITIES, activity_counts.shape[1])
+        self.top_activities = np.argsort(-activity_counts, axis=1, kind="stable")[:, :top]
+        self.top_counts = np.take_along_axis(activity_counts, self.top_activities, axis=1).astype(np.int64)
+
+
+class TileIndex:
+    """
+    Предрасчитанные кластеры зданий для тайлов карты (z/x/y, Web Mercator).
+
+    На масштабах до cluster_max_zoom тайл собирается из готовых агрегатов своего уровня
+    (центр, число зданий и организаций, ведущие корневые виды деятельности), поэтому размер
+    ответа и время не зависят от масштаба. На более крупных масштабах отдаются сами здания
+    """
+
+    def __init__(
+        self,
+        buildings: list[tuple[int, str, float, float]],
+        org_counts: list[tuple[int, int]],
+        activities: list[tuple[int, str]],
+        activity_counts: list[tuple[int, int, int]],
+        cluster_max_zoom: int = TILE_CLUSTER_MAX_ZOOM,
+    ):
+        self.cluster_max_zoom = cluster_max_zoom
+        self.activity_ids = [row[0] for row in activities]
+        self.activity_names = [row[1] for row in activities]
+
+        ids = np.array([row[0] for row in buildings], dtype=np.int64)
+        lats = np.array([row[2] for row in buildings], dtype=np.float64)
+        lngs = np.array([row[3] for row in buildings], dtype=np.float64)
+        x, y = mercator_position(lats, lngs)
+        scale = 1 << POSITION_BITS
+        px = np.clip((x * scale).astype(np.int64), 0, scale - 1)
+        py = np.clip((y * scale).astype(np.int64), 0, scale - 1)
+
+        # Здания по ячейкам самой мелкой сетки: здания тайла занимают диапазон в каждом столбце
+        order = np.argsort((px << POSITION_BITS) | py, kind="stable")
+        self.ids = ids[order]
+        self.addresses = [buildings[pos][1] for pos in order]
+        self.lats = lats[order]
+        self.lngs = lngs[order]
+        px, py = px[order], py[order]
+        self.keys = (px << POSITION_BITS) | py
+
+        positions = np.empty(len(order), dtype=np.int64)
+        positions[order] = np.arange(len(order))
+        building_positions = dict(zip(ids.tolist(), positions.tolist()))
+        self.org_counts = np.zeros(len(order), dtype=np.int64)
+        for building_id, count in org_counts:
+            if building_id in building_positions:
+                self.org_counts[building_positions[building_id]] = count
+
+        activity_positions = {activity_id: pos for pos, activity_id in enumerate(self.activity_ids)}
+        self.activity_counts = np.zeros((len(order), len(self.activity_ids)), dtype=np.int64)
+        for building_id, activity_id, count in activity_counts:
+            if building_id in building_positions and activity_id in activity_positions:
+                self.activity_counts[building_positions[building_id], activity_positions[activity_id]] = count
+
+        self.levels = []
+        for zoom in range(cluster_max_zoom + 1):
+            level = zoom + CLUSTER_GRID_BITS
+            shift = POSITION_BITS - level
+            cells, inverse = np.unique(((px >> shift) << level) | (py >> shift), return_inverse=True)
+            self.levels.append(ClusterLevel(level, cells, inverse.reshape(-1), self))
+
+    @staticmethod
+    def _ranges(keys: np.ndarray, level: int, x_min: int, x_max: int, y_min: int, y_max: int) -> np.ndarray:
+        """Позиции ключей (x << level | y) с x из [x_min, x_max) и y из [y_min, y_max)"""
+        columns = np.arange(x_min, x_max, dtype=np.int64) << level
+        starts = np.searchsorted(keys, columns | y_min)
+        ends = np.searchsorted(keys, columns | y_max)
+        ranges = [np.arange(start, end) for start, end in zip(starts.tolist(), ends.tolist()) if end > start]
+        return np.concatenate(ranges) if ranges else np.empty(0, dtype=np.int64)
+
+    def clusters(self, z: int, x: int, y: int) -> list[dict]:
+        clusters = self.levels[z]
+        size = 1 << CLUSTER_GRID_BITS
+        positions = self._ranges(clusters.keys, clusters.level, x * size, (x + 1) * size, y * size, (y + 1) * size)
+        return [
+            {
+                "latitude": float(clusters.lats[pos]),
+                "longitude": float(clusters.lngs[pos]),
+                "buildings": int(clusters.buildings[pos]),
+                "organizations": int(clusters.organizations[pos]),
+                "activities": [
+                    {"id": self.activity_ids[activity], "name": self.activity_names[activity], "organizations": int(count)}
+                    for activity, count in zip(clusters.top_activities[pos].tolist(), clusters.top_counts[pos].tolist())
+                    if count
+                ],
+            }
+            for pos in positions.tolist()
+        ]
+
+    def buildings(self, z: int, x: int, y: int) -> list[dict]:
+        # MAX_TILE_ZOOM < POSITION_BITS: тайл всегда состоит из целых ячеек сетки зданий
+        shift = POSITION_BITS - z
+        positions = self._ranges(self.keys, POSITION_BITS, x << shift, (x + 1) << shift, y << shift, (y + 1) << shift)
+        positions = positions[np.argsort(self.ids[positions], kind="stable")]
+        return [
+            {
+                "id": int(self.ids[pos]),
+                "address": self.addresses[pos],
+                "latitude": float(self.lats[pos]),
+                "longitude": float(self.lngs[pos]),
+                "organizations": int(self.org_counts[pos]),
+            }
+            for pos in positions.tolist()
+        ]
+
+    def tile(self, z: int, x: int, y: int) -> dict:
+        clustered = z <= self.cluster_max_zoom
+        return {
+            "z": z,
+            "x": x,
+            "y": y,
+            "clusters": self.clusters(z, x, y) if clustered else [],
+            "buildings": [] if clustered else self.buildings(z, x, y),
+        }
+
+
+class TileIndexCache(VersionedCache):
+    """Держит актуальные кластеры тайлов"""
+
+    async def build(self, session) -> TileIndex:
+        buildings = await session.execute(select(Building.id, Building.address, Building.latitude, Building.longitude))
+        org_counts = await session.execute(
+            select(Organization.building_id, func.count()).group_by(Organization.building_id)
+        )
+        roots = await session.execute(select(Activity.id, Activity.name).where(Activity.parent_id.is_(None)).order_by(Activity.id))
+        # Организации здания по корневым видам деятельности (с учётом всех подвидов, каждая — один раз)
+        activity_counts = await session.execute(
+            select(Organization.building_id, activity_closure.c.ancestor_id, func.count(Organization.id.distinct()))
+            .join(organization_activities, organization_activities.c.organization_id == Organization.id)
+            .join(activity_closure, activity_closure.c.descendant_id == organization_activities.c.activity_id)
+            .join(Activity, Activity.id == activity_closure.c.ancestor_id)
+            .where(Activity.parent_id.is_(None))
+            .group_by(Organization.building_id, activity_closure.c.ancestor_id)
+        )
+        return TileIndex(buildings.all(), org_counts.all(), roots.all(), activity_counts.all())
+
+
+tile_index_cache = TileIndexCache(async_session_read)
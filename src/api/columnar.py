@@ -0,0 +1,244 @@
+import heapq
+from array import array
+from bisect import bisect_right
+from types import SimpleNamespace
+from typing import Callable, Iterable, Iterator
+
+from sqlalchemy import select
+
+from src.api.activities.tree import ActivityTree
+from src.api.buildings.spatial import SpatialGridIndex
+from src.db.session import async_session_read
+from src.db.version import VersionedCache
+from src.models import Activity
+from src.models import Building
+from src.models import Organization
+from src.models import Phone
+from src.models import activity_organization_counts
+from src.models import organization_activities
+
+
+def _csr(size: int, pairs: list[tuple[int, object]], typecode: str | None = "q"):
+    """
+    Смежность в формате CSR: offsets[pos]..offsets[pos + 1] — диапазон значений владельца pos.
+    pairs — (позиция владельца, значение) в нужном порядке, порядок внутри владельца сохраняется
+    """
+    counts = [0] * (size + 1)
+    for owner, _ in pairs:
+        counts[owner + 1] += 1
+    for pos in range(size):
+        counts[pos + 1] += counts[pos]
+
+    fill = counts[:-1]
+    values = [None] * len(pairs)
+    for owner, value in pairs:
+        values[fill[owner]] = value
+        fill[owner] += 1
+    return array("q", counts), (array(typecode, values) if typecode else values)
+
+
+class ColumnarSnapshot:
+    """
+    Весь справочник в памяти процесса в виде колонок. Записи каждой таблицы лежат по позициям,
+    отсортированным по id; связи здание → организации, организация → телефоны,
+    организация ↔ виды деятельности хранятся в CSR. Снимок неизменяем и подменяется целиком
+    """
+
+    def __init__(
+        self,
+        buildings: Iterable[tuple[int, str, float, float]],
+        organizations: Iterable[tuple[int, str, int]],
+        phones: Iterable[tuple[int, int, str]],
+        links: Iterable[tuple[int, int]],
+        activities: Iterable[tuple[int, str, int | None]],
+        subtree_counts: Iterable[tuple[int, int]] = (),
+    ):
+        buildings = sorted(buildings)
+        self.building_ids = array("q", (row[0] for row in buildings))
+        self.building_addresses = [row[1] for row in buildings]
+        self.building_lats = array("d", (row[2] for row in buildings))
+        self.building_lngs = array("d", (row[3] for row in buildings))
+        self._building_positions = {building_id: pos for pos, building_id in enumerate(self.building_ids)}
+        self.spatial = SpatialGridIndex((row[0], row[2], row[3]) for row in buildings)
+
+        organizations = sorted(organizations)
+        self.org_ids = array("q", (row[0] for row in organizations))
+        self.org_names = [row[1] for row in organizations]
+        self.org_buildings = array("q", (self._building_positions.get(row[2], -1) for row in organizations))
+        self._org_positions = {org_id: pos for pos, org_id in enumerate(self.org_ids)}
+
+        # Организации здания — в порядке (name, id), как в /buildings/{id}/organizations
+        by_building = [(building, pos) for pos, building in enumerate(self.org_buildings) if building >= 0]
+        by_building.sort(key=lambda pair: (pair[0], self.name_key(pair[1])))
+        self.building_org_offsets, self.building_orgs = _csr(len(self.building_ids), by_building)
+
+        org_phones = sorted(
+            (self._org_positions[org_id], phone_id, number)
+            for org_id, phone_id, number in phones
+            if org_id in self._org_positions
+        )
+        self.phone_offsets, self.phone_ids = _csr(len(self.org_ids), [(pos, phone_id) for pos, phone_id, _ in org_phones])
+        _, self.phone_numbers = _csr(len(self.org_ids), [(pos, number) for pos, _, number in org_phones], None)
+
+        self.tree = ActivityTree(activities)
+        activity_ids = sorted(self.tree.ids)
+        self._activity_positions = {activity_id: pos for pos, activity_id in enumerate(activity_ids)}
+        links = [
+            (self._org_positions[org_id], activity_id)
+            for org_id, activity_id in links
+            if org_id in self._org_positions and activity_id in self._activity_positions
+        ]
+        self.org_activity_offsets, self.org_activities = _csr(len(self.org_ids), sorted(links))
+        # Обратная связь: организации вида деятельности по возрастанию id (позиции отсортированы по id)
+        self.activity_org_offsets, self.activity_orgs = _csr(
+            len(activity_ids),
+            sorted((self._activity_positions[activity_id], pos) for pos, activity_id in links),
+        )
+        # Организации поддерева без повторов — готовые счётчики из БД, чтобы не объединять списки на каждый запрос
+        self._subtree_organizations = dict(subtree_counts)
+
+        # Фильтр по названию в /organizations/query: lower() повторяет свёртку регистра триграммного
+        # токенизатора FTS5, casefold() — функцию casefold из src/db/session.py для коротких запросов.
+        # Сам поиск по названию идёт через FTS5 в SQLite и здесь не дублируется
+        self._folded_names = [name.lower() for name in self.org_names]
+        self._casefolded_names = [name.casefold() for name in self.org_names]
+
+    def name_key(self, pos: int) -> tuple[str, int]:
+        return self.org_names[pos], self.org_ids[pos]
+
+    def id_key(self, pos: int) -> tuple[int]:
+        return (self.org_ids[pos],)
+
+    def has_building(self, building_id: int) -> bool:
+        return building_id in self._building_positions
+
+    def has_activity(self, activity_id: int) -> bool:
+        return activity_id in self._activity_positions
+
+    def org_position(self, org_id: int) -> int | None:
+        return self._org_positions.get(org_id)
+
+    def organization(self, pos: int) -> dict:
+        return {"id": self.org_ids[pos], "name": self.org_names[pos]}
+
+    def building(self, pos: int) -> dict:
+        return {
+            "address": self.building_addresses[pos],
+            "latitude": self.building_lats[pos],
+            "longitude": self.building_lngs[pos],
+            "id": self.building_ids[pos],
+        }
+
+    def org_building_id(self, pos: int) -> int | None:
+        building = self.org_buildings[pos]
+        return self.building_ids[building] if building >= 0 else None
+
+    def phones(self, pos: int) -> list[dict]:
+        return [
+            {"number": self.phone_numbers[i], "id": self.phone_ids[i]}
+            for i in range(self.phone_offsets[pos], self.phone_offsets[pos + 1])
+        ]
+
+    def activity_ids(self, pos: int) -> list[int]:
+        return list(self.org_activities[self.org_activity_offsets[pos]:self.org_activity_offsets[pos + 1]])
+
+    def organization_card(self, pos: int) -> SimpleNamespace:
+        """
+        Организация со зданием и телефонами — с теми же атрибутами, что ORM-объект.
+        Внешние ключи SQLite не проверяет: если здания нет, building — None, как у joinedload
+        """
+        building = self.org_buildings[pos]
+        return SimpleNamespace(
+            id=self.org_ids[pos],
+            name=self.org_names[pos],
+            building=self.building(building) if building >= 0 else None,
+            phones=self.phones(pos),
+        )
+
+    def building_organizations(self, building_id: int) -> array | None:
+        """Позиции организаций здания в порядке (name, id); None — здания нет"""
+        pos = self._building_positions.get(building_id)
+        if pos is None:
+            return None
+        return self.building_orgs[self.building_org_offsets[pos]:self.building_org_offsets[pos + 1]]
+
+    def activity_organizations(self, activity_id: int) -> array:
+        """Позиции организаций вида деятельности в порядке id"""
+        pos = self._activity_positions.get(activity_id)
+        if pos is None:
+            return array("q")
+        return self.activity_orgs[self.activity_org_offsets[pos]:self.activity_org_offsets[pos + 1]]
+
+    def subtree_organization_count(self, activity_id: int) -> int:
+        """Число организаций вида деятельности вместе с подвидами, каждая — один раз"""
+        return self._subtree_organizations.get(activity_id, 0)
+
+    def subtree_organizations(self, activity_id: int, after_id: int | None = None) -> Iterator[int]:
+        """
+        Позиции организаций поддерева без повторов по возрастанию id, строго после after_id.
+        Лениво сливает уже отсортированные списки подвидов: страница стоит offset + limit шагов, а не всё поддерево
+        """
+        streams = []
+        for descendant_id in self.tree.descendants(activity_id):
+            pos = self._activity_positions.get(descendant_id)
+            if pos is None:
+                continue
+            start, end = self.activity_org_offsets[pos], self.activity_org_offsets[pos + 1]
+            if after_id is not None:
+                start = bisect_right(self.activity_orgs, after_id, start, end, key=self.org_ids.__getitem__)
+            if start < end:
+                streams.append(memoryview(self.activity_orgs)[start:end])
+
+        previous = None
+        for pos in heapq.merge(*streams):
+            if pos != previous:
+                yield pos
+                previous = pos
+
+    def buildings_with_organizations(self, building_ids: Iterable[int], activity_id: int | None = None) -> list[dict]:
+        """
+        Здания по id в порядке id, только с организациями; формат BuildingWithOrgsResponse.
+        activity_id оставляет только организации этого вида деятельности и его потомков
+        """
+        activities = None if activity_id is None else set(self.tree.descendants(activity_id))
+        result = []
+        for building_id in sorted(building_ids):
+            organizations = self.building_organizations(building_id)
+            if organizations and activities is not None:
+                organizations = [pos for pos in organizations if not activities.isdisjoint(self.activity_ids(pos))]
+            if organizations:
+                result.append({
+                    "building": self.building(self._building_positions[building_id]),
+                    "organizations": [self.organization(pos) for pos in organizations],
+                })
+        return result
+
+    def name_filter(self, query: str, trigram: bool) -> Callable[[Iterable[int]], list[int]]:
+        """
+        Отбор позиций организаций с query в названии — с той же свёрткой регистра, что у SQL-движка:
+        lower() для триграмм FTS5, casefold() для коротких запросов
+        """
+        names, query = (self._folded_names, query.lower()) if trigram else (self._casefolded_names, query.casefold())
+        return lambda positions: [pos for pos in positions if query in names[pos]]
+
+
+class ColumnarSnapshotCache(VersionedCache):
+    """Держит актуальный колоночный снимок справочника"""
+
+    async def build(self, session) -> ColumnarSnapshot:
+        buildings = await session.execute(select(Building.id, Building.address, Building.latitude, Building.longitude))
+        organizations = await session.execute(select(Organization.id, Organization.name, Organization.building_id))
+        phones = await session.execute(select(Phone.organization_id, Phone.id, Phone.number))
+        links = await session.execute(
+            select(organization_activities.c.organization_id, organization_activities.c.activity_id)
+        )
+        activities = await session.execute(select(Activity.id, Activity.name, Activity.parent_id))
+        subtree_counts = await session.execute(
+            select(activity_organization_counts.c.activity_id, activity_organization_counts.c.subtree_organizations)
+        )
+        return ColumnarSnapshot(
+            buildings.all(), organizations.all(), phones.all(), links.all(), activities.all(), subtree_counts.all()
+        )
+
+
+columnar_snapshot_cache = ColumnarSnapshotCache(async_session_read)
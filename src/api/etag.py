@@ -0,0 +1,48 @@
+from fastapi import HTTPException, Request, Response
+
+from config import CACHE_CONTROL
+from src.db.version import data_version_watcher
+
+
+def current_etag(request: Request) -> str | None:
+    """
+    Сильный ETag ответа: версия API и версия набора данных.
+    Версию берём у DataVersionWatcher, без запроса к БД; она отстаёт от записи
+    не больше чем на интервал опроса — как и снимки в памяти процесса
+    """
+    if data_version_watcher.version is None:
+        return None
+    return f'"{request.app.version}-{data_version_watcher.version}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Сравнение для If-None-Match (слабое: префикс W/ не учитывается)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def validator_headers(etag: str) -> dict[str, str]:
+    # Ответ зависит от API-ключа (403 без него), поэтому общий кеш должен различать запросы по ключу
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "X-API-Key"}
+
+
+async def conditional_get(request: Request, response: Response):
+    """
+    Зависимость general_router: проставляет ETag и Cache-Control на GET-ответы
+    и отвечает 304 на совпавший If-None-Match до запросов к репозиториям
+    """
+    if request.method not in ("GET", "HEAD"):
+        return
+    etag = current_etag(request)
+    if etag is None:
+        return
+
+    headers = validator_headers(etag)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
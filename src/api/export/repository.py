@@ -0,0 +1,79 @@
+from typing import AsyncIterator
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models import Organization
+from src.models import Building
+from src.models import Activity
+from src.models import Phone
+from src.models import organization_activities
+
+# Сколько строк забирать с серверного курсора за раз и отдавать одним куском ответа
+EXPORT_BATCH_SIZE = 1000
+
+
+class ExportRepository:
+    """
+    Выгрузка справочника целиком. Каждая строка результата — готовый JSON-объект, собранный
+    SQLite (json_object), строки читаются с серверного курсора пачками: память не зависит от размера таблиц
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def _stream_lines(self, statement) -> AsyncIterator[str]:
+        result = await self.session.stream_scalars(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for lines in result.partitions():
+            yield "\n".join(lines) + "\n"
+
+    def stream_organizations(self) -> AsyncIterator[str]:
+        # json() восстанавливает JSON-подтип у результата подзапроса, иначе массив вложится строкой.
+        # Порядок внутри массивов задают индексы (organization_id, id) и (organization_id, activity_id)
+        phones = (
+            select(func.json_group_array(func.json_object("id", Phone.id, "number", Phone.number)))
+            .where(Phone.organization_id == Organization.id)
+            .scalar_subquery()
+        )
+        activity_ids = (
+            select(func.json_group_array(organization_activities.c.activity_id))
+            .where(organization_activities.c.organization_id == Organization.id)
+            .scalar_subquery()
+        )
+        return self._stream_lines(
+            select(func.json_object(
+                "id", Organization.id,
+                "name", Organization.name,
+                "building", func.json_object(
+                    "id", Building.id,
+                    "address", Building.address,
+                    "latitude", Building.latitude,
+                    "longitude", Building.longitude,
+                ),
+                "phones", func.json(phones),
+                "activity_ids", func.json(activity_ids),
+            ))
+            .join(Building, Building.id == Organization.building_id)
+            .order_by(Organization.id)
+        )
+
+    def stream_buildings(self) -> AsyncIterator[str]:
+        return self._stream_lines(
+            select(func.json_object(
+                "id", Building.id,
+                "address", Building.address,
+                "latitude", Building.latitude,
+                "longitude", Building.longitude,
+            ))
+            .order_by(Building.id)
+        )
+
+    def stream_activities(self) -> AsyncIterator[str]:
+        return self._stream_lines(
+            select(func.json_object(
+                "id", Activity.id,
+                "name", Activity.name,
+                "parent_id", Activity.parent_id,
+            ))
+            .order_by(Activity.id)
+        )
@@ -0,0 +1,53 @@
+from typing import AsyncIterator, Callable
+
+from fastapi import APIRouter, Response
+
+from src.api.export.service import ExportService
+from src.api.metrics import InstrumentedRoute
+from src.api.responses import ndjson_response
+from src.db.session import async_session_read
+
+
+router_export = APIRouter(prefix="/export", tags=["Выгрузка"], route_class=InstrumentedRoute)
+
+NDJSON_RESPONSE = {200: {"content": {"application/x-ndjson": {}}, "description": "NDJSON, одна запись на строку"}}
+
+
+async def _stream(export: Callable[[ExportService], AsyncIterator[str]]):
+    # Ответ читается уже после выхода из эндпоинта, поэтому сессией владеет сам поток
+    async with async_session_read() as session:
+        async for chunk in export(ExportService(session)):
+            yield chunk
+
+
+@router_export.get(
+    "/organizations.ndjson",
+    responses=NDJSON_RESPONSE,
+    summary="Выгрузка всех организаций"
+)
+async def export_organizations(response: Response):
+    """
+    Все организации, по одной на строку, в порядке id: здание, телефоны и id видов деятельности
+    вложены в запись. Отдаётся потоком с серверного курсора
+    """
+    return ndjson_response(_stream(ExportService.export_organizations), response)
+
+
+@router_export.get(
+    "/buildings.ndjson",
+    responses=NDJSON_RESPONSE,
+    summary="Выгрузка всех зданий"
+)
+async def export_buildings(response: Response):
+    """Все здания, по одному на строку, в порядке id"""
+    return ndjson_response(_stream(ExportService.export_buildings), response)
+
+
+@router_export.get(
+    "/activities.ndjson",
+    responses=NDJSON_RESPONSE,
+    summary="Выгрузка всех видов деятельности"
+)
+async def export_activities(response: Response):
+    """Все виды деятельности, по одному на строку, в порядке id (с parent_id)"""
+    return ndjson_response(_stream(ExportService.export_activities), response)
@@ -0,0 +1,19 @@
+from typing import AsyncIterator
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.api.export.repository import ExportRepository
+
+
+class ExportService:
+    def __init__(self, session: AsyncSession):
+        self.repo = ExportRepository(session)
+
+    def export_organizations(self) -> AsyncIterator[str]:
+        return self.repo.stream_organizations()
+
+    def export_buildings(self) -> AsyncIterator[str]:
+        return self.repo.stream_buildings()
+
+    def export_activities(self) -> AsyncIterator[str]:
+        return self.repo.stream_activities()
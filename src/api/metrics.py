@@ -0,0 +1,172 @@
+import functools
+from bisect import bisect_left
+from collections import defaultdict
+from time import perf_counter
+from typing import Callable
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRoute
+
+from src.db.stats import current_stats, track_request_stats
+
+# Границы корзин гистограммы длительности запроса, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя корзина — +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Метрики в памяти процесса с выдачей в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self.latency: dict[tuple, Histogram] = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.requests: dict[tuple, int] = defaultdict(int)
+        self.sql_statements: dict[tuple, int] = defaultdict(int)
+        self.sql_seconds: dict[tuple, float] = defaultdict(float)
+        self.sql_rows: dict[tuple, int] = defaultdict(int)
+        self.serialization_seconds: dict[tuple, float] = defaultdict(float)
+        # Метрики других подсистем без меток: имя -> (тип, описание, функция, возвращающая значение)
+        self.external: dict[str, tuple[str, str, Callable[[], float]]] = {}
+
+    def register(self, name: str, kind: str, description: str, source: Callable[[], float]):
+        self.external[name] = (kind, description, source)
+
+    def observe_request(self, method: str, route: str, status: int, duration: float, stats, serialization: float):
+        labels = (method, route)
+        self.latency[labels].observe(duration)
+        self.requests[(method, route, str(status))] += 1
+        self.sql_statements[labels] += stats.statements
+        self.sql_seconds[labels] += stats.db_time
+        self.sql_rows[labels] += stats.rows
+        self.serialization_seconds[labels] += serialization
+
+    @staticmethod
+    def _labels(names: tuple[str, ...], values: tuple) -> str:
+        def escape(value):
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+    def _counter(self, lines: list[str], name: str, description: str, kind: str, values: dict, label_names):
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(values.items()):
+            lines.append(f"{name}{{{self._labels(label_names, labels)}}} {value}")
+
+    def render(self) -> str:
+        lines = []
+        name = "compendium_http_request_duration_seconds"
+        lines.append(f"# HELP {name} Длительность обработки запроса")
+        lines.append(f"# TYPE {name} histogram")
+        for labels, histogram in sorted(self.latency.items()):
+            base = self._labels(("method", "route"), labels)
+            cumulative = 0
+            bounds = [str(bound) for bound in histogram.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{base}}} {histogram.sum}")
+            lines.append(f"{name}_count{{{base}}} {histogram.count}")
+
+        route_labels = ("method", "route")
+        self._counter(lines, "compendium_http_requests_total", "Количество запросов",
+                      "counter", self.requests, ("method", "route", "status"))
+        self._counter(lines, "compendium_sql_statements_total", "Количество SQL-запросов",
+                      "counter", self.sql_statements, route_labels)
+        self._counter(lines, "compendium_sql_duration_seconds_total", "Суммарное время SQL-запросов",
+                      "counter", self.sql_seconds, route_labels)
+        self._counter(lines, "compendium_sql_rows_fetched_total", "Количество выбранных из БД строк",
+                      "counter", self.sql_rows, route_labels)
+        self._counter(lines, "compendium_serialization_duration_seconds_total",
+                      "Суммарное время сериализации ответа", "counter", self.serialization_seconds, route_labels)
+
+        for name, (kind, description, source) in sorted(self.external.items()):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {source()}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics_registry = MetricsRegistry()
+
+
+class InstrumentedRoute(APIRoute):
+    """
+    Маршрут, отмечающий момент возврата из эндпоинта. Всё, что после него
+    и до начала ответа, — валидация и сериализация результата
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        @functools.wraps(endpoint)
+        async def timed_endpoint(*args, **kw):
+            try:
+                return await endpoint(*args, **kw)
+            finally:
+                stats = current_stats()
+                if stats is not None:
+                    stats.handler_finished = perf_counter()
+
+        super().__init__(path, timed_endpoint, **kwargs)
+
+
+class MetricsMiddleware:
+    """Собирает по маршрутам длительность, SQL-статистику и время сериализации; по желанию отдаёт Server-Timing"""
+
+    def __init__(self, app, server_timing: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = perf_counter()
+        status = 500
+        serialization = 0.0
+
+        async def send_with_timing(message):
+            nonlocal status, serialization
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                now = perf_counter()
+                if stats.handler_finished is not None:
+                    serialization = now - stats.handler_finished
+                if self.server_timing:
+                    timing = (
+                        f"db;dur={stats.db_time * 1000:.2f};desc=\"{stats.statements} statements\", "
+                        f"serialize;dur={serialization * 1000:.2f}, "
+                        f"total;dur={(now - started) * 1000:.2f}"
+                    )
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        with track_request_stats() as stats:
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                # Неизвестные пути сводим в одну метку, чтобы не раздувать число рядов
+                route = getattr(scope.get("route"), "path", "unmatched")
+                metrics_registry.observe_request(
+                    scope["method"], route, status, perf_counter() - started, stats, serialization
+                )
+
+
+router_metrics = APIRouter()
+
+
+@router_metrics.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
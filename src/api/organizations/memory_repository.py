@@ -0,0 +1,167 @@
+from bisect import bisect_right
+
+from config import SEARCH_TOTAL_EXACT_LIMIT
+
+from src.api.columnar import columnar_snapshot_cache
+from src.api.organizations.planner import OrganizationFilters, estimate_total, plan
+from src.api.organizations.repository import OrganizationRepository, FTS_MIN_QUERY_LENGTH
+from src.api.pagination import bounded_total, keyset_page, page_total, slice_page
+
+# Сколько позиций проверять за раз в /organizations/query
+SCAN_BLOCK = 4096
+# По скольким названиям оценивать долю совпадений с запросом
+NAME_SAMPLE_SIZE = 16384
+
+
+class MemoryOrganizationRepository(OrganizationRepository):
+    """
+    Те же выборки, что у OrganizationRepository, но из колоночного снимка в памяти, без запросов к БД.
+    Поиск по названию остаётся на FTS5 в SQLite: линейный проход по названиям медленнее индекса
+    """
+
+    async def get_by_building_id(self, building_id: int, offset: int, limit: int, cursor: list | None = None):
+        snapshot = await columnar_snapshot_cache.get()
+        positions = snapshot.building_organizations(building_id)
+        if positions is None:
+            return None, "Building not found"
+
+        page, next_cursor = slice_page(positions, limit, snapshot.name_key, offset, cursor)
+        return {
+            "offset": offset,
+            "limit": limit,
+            "organizations": [snapshot.organization(pos) for pos in page],
+            "next_cursor": next_cursor,
+            "total": len(positions),
+            "total_is_exact": True
+        }, None
+
+    async def get_organization_by_id(self, org_id: int):
+        snapshot = await columnar_snapshot_cache.get()
+        pos = snapshot.org_position(org_id)
+        if pos is None:
+            return None, "Organization not found"
+
+        return {
+            "organization": snapshot.organization_card(pos),
+            "activity_ids": snapshot.activity_ids(pos)
+        }, None
+
+    async def get_organizations_by_ids(self, org_ids: list[int]):
+        snapshot = await columnar_snapshot_cache.get()
+        organizations = {}
+        activity_ids = {}
+        for org_id in org_ids:
+            pos = snapshot.org_position(org_id)
+            if pos is None:
+                continue
+            card = snapshot.organization_card(pos)
+            # Организация без здания не проходит внутреннее соединение в SQL-движке — пропускаем так же
+            if card.building is None:
+                continue
+            organizations[org_id] = {"id": card.id, "name": card.name, "building": card.building, "phones": card.phones}
+            activity_ids[org_id] = snapshot.activity_ids(pos)
+
+        return {"organizations": organizations, "activity_ids": activity_ids}, None
+
+    async def query_organizations(self, filters: OrganizationFilters, offset: int = 0, limit: int = 100, cursor: list | None = None):
+        snapshot = await columnar_snapshot_cache.get()
+        if filters.activity_id is not None and not snapshot.has_activity(filters.activity_id):
+            return None, "Activity not found"
+        if filters.building_id is not None and not snapshot.has_building(filters.building_id):
+            return None, "Building not found"
+
+        # По каждому фасету: оценка числа организаций, кандидаты (позиции по возрастанию id)
+        # и проверка — сразу над блоком позиций, чтобы не вызывать функцию на каждую
+        estimates, candidates, checks = {}, {}, {}
+        organizations_per_building = len(snapshot.org_ids) / len(snapshot.building_ids) if snapshot.building_ids else 0.0
+        if filters.building_id is not None:
+            in_building = snapshot.building_organizations(filters.building_id)
+            estimates["building"] = len(in_building)
+            candidates["building"] = lambda: sorted(in_building)
+            checks["building"] = lambda block: [
+                pos for pos in block if snapshot.org_building_id(pos) == filters.building_id
+            ]
+        if filters.activity_id is not None:
+            activities = set(snapshot.tree.descendants(filters.activity_id))
+            estimates["activity"] = snapshot.subtree_organization_count(filters.activity_id)
+            candidates["activity"] = lambda: list(snapshot.subtree_organizations(filters.activity_id))
+            checks["activity"] = lambda block: [
+                pos for pos in block if not activities.isdisjoint(snapshot.activity_ids(pos))
+            ]
+        if filters.bbox is not None or filters.circle is not None:
+            buildings = snapshot.spatial.count_bbox(*filters.area_bbox) * filters.area_share
+            estimates["area"] = buildings * organizations_per_building
+
+            def in_area():
+                if filters.bbox is not None:
+                    building_ids = snapshot.spatial.query_bbox(*filters.bbox)
+                else:
+                    building_ids = snapshot.spatial.query_radius(*filters.circle)
+                return sorted(pos for building_id in building_ids for pos in snapshot.building_organizations(building_id))
+
+            candidates["area"] = in_area
+            checks["area"] = lambda block: [
+                pos for pos in block
+                if snapshot.org_buildings[pos] >= 0 and filters.area_contains(
+                    snapshot.building_lats[snapshot.org_buildings[pos]], snapshot.building_lngs[snapshot.org_buildings[pos]]
+                )
+            ]
+        if filters.name is not None:
+            # Индекса по названиям в памяти нет — только проверка; долю совпадений оцениваем по равномерной выборке
+            checks["name"] = snapshot.name_filter(filters.name, len(filters.name) >= FTS_MIN_QUERY_LENGTH)
+            sample = range(0, len(snapshot.org_ids), max(len(snapshot.org_ids) // NAME_SAMPLE_SIZE, 1))
+            estimates["name"] = len(checks["name"](sample)) * len(snapshot.org_ids) / len(sample) if sample else 0
+
+        wanted = limit + 1 if cursor is not None else offset + limit + 1
+        driver, rest = plan(estimates, set(candidates), len(snapshot.org_ids), wanted)
+        positions = range(len(snapshot.org_ids)) if driver is None else candidates[driver]()
+
+        # Проверяем блоками и останавливаемся, как только набралась страница
+        skip = 0 if cursor is not None else offset
+        start = bisect_right(positions, cursor[0], key=lambda pos: snapshot.org_ids[pos]) if cursor is not None else 0
+        matched = []
+        for block_start in range(start, len(positions), SCAN_BLOCK):
+            block = positions[block_start:block_start + SCAN_BLOCK]
+            for facet in rest:
+                block = checks[facet](block)
+            matched.extend(block)
+            if len(matched) >= skip + limit + 1:
+                break
+
+        page, next_cursor = keyset_page(matched[skip:skip + limit + 1], limit, snapshot.id_key)
+
+        # Для одного здания или вида деятельности total точный: оценки этих фасетов — сами счётчики;
+        # для одного названия — подсчёт с тем же пределом, что в SQL; для другого единственного
+        # фасета-ведущего вся выборка — его кандидаты
+        total = page_total(offset, page, next_cursor, cursor)
+        total_is_exact = total is not None
+        if total is None and (filters.facets == ["building"] or filters.facets == ["activity"]):
+            total, total_is_exact = next(iter(estimates.values())), True
+        elif total is None and filters.facets == ["name"]:
+            total, total_is_exact = self._count_name_matches(snapshot, checks["name"])
+            total = total if total_is_exact else bounded_total(total, offset, page, next_cursor, cursor)
+        elif total is None and driver is not None and not rest:
+            total, total_is_exact = len(positions), True
+        elif total is None:
+            total = bounded_total(estimate_total(estimates, len(snapshot.org_ids)), offset, page, next_cursor, cursor)
+
+        return {
+            "offset": offset,
+            "limit": limit,
+            "organizations": [snapshot.organization(pos) for pos in page],
+            "next_cursor": next_cursor,
+            "total": total,
+            "total_is_exact": total_is_exact
+        }, None
+
+    @staticmethod
+    def _count_name_matches(snapshot, check) -> tuple[float, bool]:
+        """То же, что OrganizationRepository._count_matches: не дальше SEARCH_TOTAL_EXACT_LIMIT совпадений, затем оценка"""
+        count = 0
+        for block_start in range(0, len(snapshot.org_ids), SCAN_BLOCK):
+            block = check(range(block_start, min(block_start + SCAN_BLOCK, len(snapshot.org_ids))))
+            if count + len(block) >= SEARCH_TOTAL_EXACT_LIMIT:
+                last_id = snapshot.org_ids[block[SEARCH_TOTAL_EXACT_LIMIT - count - 1]]
+                return SEARCH_TOTAL_EXACT_LIMIT * snapshot.org_ids[-1] / last_id, False
+            count += len(block)
+        return count, True
@@ -0,0 +1,138 @@
+from dataclasses import dataclass
+from math import inf, pi
+
+from sqlalchemy import func, select
+
+from src.geo import haversine, radius_bbox
+from src.db.session import async_session_read
+from src.db.version import VersionedCache
+from src.models import Building, Organization, activity_organization_counts
+
+# Фасеты при равных оценках — в порядке дешевизны проверки
+FACETS = ("building", "activity", "area", "name")
+
+
+@dataclass
+class OrganizationFilters:
+    """Фильтры /organizations/query; заданы любые из них, но хотя бы один"""
+    activity_id: int | None = None
+    building_id: int | None = None
+    name: str | None = None
+    # (lat_min, lng_min, lat_max, lng_max)
+    bbox: tuple[float, float, float, float] | None = None
+    # (lat, lng, radius)
+    circle: tuple[float, float, float] | None = None
+
+    @property
+    def area_bbox(self) -> tuple[float, float, float, float]:
+        return self.bbox if self.bbox is not None else radius_bbox(*self.circle)
+
+    @property
+    def area_share(self) -> float:
+        """Какую часть area_bbox занимает сама область"""
+        return 1.0 if self.bbox is not None else pi / 4
+
+    def area_contains(self, lat: float, lng: float) -> bool:
+        if self.bbox is not None:
+            lat_min, lng_min, lat_max, lng_max = self.bbox
+            return lat_min <= lat <= lat_max and lng_min <= lng <= lng_max
+        center_lat, center_lng, radius = self.circle
+        return haversine(center_lat, center_lng, lat, lng) <= radius
+
+    @property
+    def facets(self) -> list[str]:
+        present = {
+            "building": self.building_id is not None,
+            "activity": self.activity_id is not None,
+            "area": self.bbox is not None or self.circle is not None,
+            "name": self.name is not None,
+        }
+        return [facet for facet in FACETS if present[facet]]
+
+
+def plan(estimates: dict[str, float | None], indexed: set[str], organizations: int, wanted: int) -> tuple[str | None, list[str]]:
+    """
+    Ведущий фасет и фасеты-проверки по возрастанию оценки числа организаций.
+    Ведущий — фасет с индексом и наименьшей оценкой: кандидатов выбирает его индекс, остальные фасеты
+    проверяются у каждого кандидата. None — дешевле идти по всем организациям в порядке id
+    и остановиться на wanted-м совпадении: при независимых фильтрах это wanted / (доля прошедших все) строк.
+    Оценка None — селективность неизвестна; с таким фасетом просмотр не выбирается, если есть индекс:
+    без совпадений он прошёл бы всю таблицу
+    """
+    order = sorted(estimates, key=lambda facet: (
+        organizations if estimates[facet] is None else estimates[facet], FACETS.index(facet)
+    ))
+    driver = next((facet for facet in order if facet in indexed), None)
+    if driver is None:
+        return None, order
+    if None in estimates.values():
+        return driver, [facet for facet in order if facet != driver]
+
+    selectivity = 1.0
+    for estimate in estimates.values():
+        selectivity *= min(estimate / organizations, 1.0) if organizations else 0.0
+    scanned = wanted / selectivity if selectivity else inf
+    if scanned < estimates[driver]:
+        return None, order
+    return driver, [facet for facet in order if facet != driver]
+
+
+def estimate_total(estimates: dict[str, float | None], organizations: int) -> float:
+    """Сколько организаций пройдут все фасеты — при тех же независимых фильтрах, что и в plan(); None не сужает"""
+    total = float(organizations)
+    for estimate in estimates.values():
+        if estimate is not None:
+            total *= min(estimate / organizations, 1.0) if organizations else 0.0
+    return total
+
+
+class PlannerStatistics:
+    """
+    Объёмы таблиц, границы застройки и число организаций в поддеревьях видов деятельности —
+    для оценки селективности фасетов и радиуса поиска ближайших зданий
+    """
+
+    def __init__(
+        self,
+        organizations: int,
+        buildings: int,
+        subtree_organizations: list[tuple[int, int]],
+        bounds: tuple[float, float, float, float] | None = None,
+    ):
+        self.organizations = organizations
+        self.buildings = buildings
+        self.subtree_organizations = dict(subtree_organizations)
+        # (lat_min, lng_min, lat_max, lng_max) всех зданий; None — зданий нет
+        self.bounds = bounds
+
+    @property
+    def organizations_per_building(self) -> float:
+        return self.organizations / self.buildings if self.buildings else 0.0
+
+    def activity_organizations(self, activity_id: int) -> int:
+        """Точное число организаций поддерева из счётчиков, которые ведут триггеры"""
+        return self.subtree_organizations.get(activity_id, 0)
+
+
+class PlannerStatisticsCache(VersionedCache):
+    """Держит актуальную статистику планировщика"""
+
+    async def build(self, session) -> PlannerStatistics:
+        organizations = await session.execute(select(func.count()).select_from(Organization))
+        buildings = await session.execute(select(func.count()).select_from(Building))
+        subtree_organizations = await session.execute(
+            select(activity_organization_counts.c.activity_id, activity_organization_counts.c.subtree_organizations)
+        )
+        bounds = await session.execute(
+            select(func.min(Building.latitude), func.min(Building.longitude), func.max(Building.latitude), func.max(Building.longitude))
+        )
+        bounds = bounds.one()
+        return PlannerStatistics(
+            organizations.scalar_one(),
+            buildings.scalar_one(),
+            subtree_organizations.all(),
+            None if bounds[0] is None else tuple(bounds),
+        )
+
+
+planner_statistics_cache = PlannerStatisticsCache(async_session_read)
@@ -1,55 +1,80 @@
 from math import radians, cos, sin, sqrt, atan2
 
-from sqlalchemy import select, func, and_
+import orjson
+from sqlalchemy import select, func, and_, literal_column, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload, selectinload
 from sqlalchemy import select
 
 from src.models import Organization
 from src.models import Building
-from src.models import Activity
+from src.models import Phone
+from src.models import activity_closure
+from src.models import building_organization_counts
+from src.models import organization_activities
+from src.models import organizations_fts
+from src.api.activities.tree import activity_tree_cache
+from src.api.buildings.repository import BuildingRepository
+from src.api.organizations.planner import OrganizationFilters, estimate_total, plan, planner_statistics_cache
+from src.api.pagination import bounded_total, keyset_page, page_total
+from config import SEARCH_TOTAL_EXACT_LIMIT
+
+# Триграммный индекс находит только подстроки от трёх символов
+FTS_MIN_QUERY_LENGTH = 3
+
+
+def fts_phrase(query: str) -> str:
+    """Фраза целиком как подстрока; кавычки внутри экранируются удвоением"""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def like_pattern(query: str, trigram: bool = False) -> str:
+    """Шаблон LIKE «содержит query» после Unicode-свёртки регистра: lower() как у триграмм FTS5 или casefold()"""
+    folded = query.lower() if trigram else query.casefold()
+    escaped = folded.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
 
 
 class OrganizationRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def get_by_building_id(self, building_id: int, offset: int, limit: int):
+    async def get_by_building_id(self, building_id: int, offset: int, limit: int, cursor: list | None = None):
         # Проверяем, существует ли здание
-        building_result = await self.session.execute(
-            select(Building).where(Building.id == building_id)
-        )
-        building = building_result.scalar_one_or_none()
-        if not building:
+        total = await self._building_organizations(building_id)
+        if total is None:
             return None, "Building not found"
 
-        # Получаем организации с предзагрузкой связанных данных
-        result = await self.session.execute(
-            select(Organization)
+        # Порядок (name, id) целиком обслуживается индексом ix_organizations_building_id_name
+        statement = (
+            select(Organization.id, Organization.name)
             .where(Organization.building_id == building_id)
-            .offset(offset)
-            .limit(limit)
+            .order_by(Organization.name, Organization.id)
         )
+        if cursor is not None:
+            statement = statement.where(tuple_(Organization.name, Organization.id) > tuple(cursor))
+        else:
+            statement = statement.offset(offset)
 
-        organizations = result.scalars().all()
+        result = await self.session.execute(statement.limit(limit + 1))
+        page, next_cursor = keyset_page(result.all(), limit, lambda org: (org.name, org.id))
 
         return {
             "offset": offset,
             "limit": limit,
-            "organizations": organizations
+            "organizations": [{"id": org.id, "name": org.name} for org in page],
+            "next_cursor": next_cursor,
+            "total": total,
+            "total_is_exact": True
         }, None
     
     async def get_organization_by_id(self, org_id: int):
-        # Загружаем организацию с нужными связями
+        # Загружаем организацию со зданием и телефонами; остальные связи не трогаем
         result = await self.session.execute(
             select(Organization)
             .options(
                 joinedload(Organization.building),
                 selectinload(Organization.phones),
-                selectinload(Organization.activities)
-                .selectinload(Activity.children)
-                .selectinload(Activity.children)
-                .selectinload(Activity.children)  # ← 3 уровня
             )
             .where(Organization.id == org_id)
         )
@@ -58,22 +83,303 @@ class OrganizationRepository:
         if not organization:
             return None, "Organization not found"
 
-        return organization, None
+        # Поддеревья видов деятельности строятся из дерева в памяти, здесь нужны только id
+        result = await self.session.execute(
+            select(organization_activities.c.activity_id)
+            .where(organization_activities.c.organization_id == org_id)
+            .order_by(organization_activities.c.activity_id)
+        )
+
+        return {
+            "organization": organization,
+            "activity_ids": result.scalars().all()
+        }, None
     
-    async def search_organizations(self, query: str, offset: int = 0, limit: int = 100):
-        search_pattern = f"%{query.lower()}%"
+    async def get_organizations_by_ids(self, org_ids: list[int]):
+        """
+        Организации по списку id за три запроса при любом их числе: организации со зданиями,
+        телефоны, id видов деятельности. Строки сразу собираются в словари, без ORM-объектов
+        """
+        result = await self.session.execute(
+            select(
+                Organization.id, Organization.name,
+                Building.id.label("building_id"), Building.address, Building.latitude, Building.longitude,
+            )
+            .join(Building, Building.id == Organization.building_id)
+            .where(Organization.id.in_(org_ids))
+        )
+        organizations = {
+            row.id: {
+                "id": row.id,
+                "name": row.name,
+                "building": {
+                    "address": row.address,
+                    "latitude": row.latitude,
+                    "longitude": row.longitude,
+                    "id": row.building_id,
+                },
+                "phones": [],
+            }
+            for row in result.all()
+        }
+        if not organizations:
+            return {"organizations": organizations, "activity_ids": {}}, None
+
+        result = await self.session.execute(
+            select(Phone.organization_id, Phone.id, Phone.number)
+            .where(Phone.organization_id.in_(organizations))
+            .order_by(Phone.organization_id, Phone.id)
+        )
+        for organization_id, phone_id, number in result.all():
+            organizations[organization_id]["phones"].append({"number": number, "id": phone_id})
+
+        result = await self.session.execute(
+            select(organization_activities.c.organization_id, organization_activities.c.activity_id)
+            .where(organization_activities.c.organization_id.in_(organizations))
+            .order_by(organization_activities.c.organization_id, organization_activities.c.activity_id)
+        )
+        activity_ids = {}
+        for organization_id, activity_id in result.all():
+            activity_ids.setdefault(organization_id, []).append(activity_id)
+
+        return {"organizations": organizations, "activity_ids": activity_ids}, None
+
+    async def search_organizations(self, query: str, offset: int = 0, limit: int = 100, cursor: list | None = None):
+        if len(query) >= FTS_MIN_QUERY_LENGTH:
+            fts_table = literal_column("organizations_fts")
+            rank = func.bm25(fts_table)
+            statement = (
+                select(Organization.id, Organization.name, rank.label("sort_key"))
+                .select_from(organizations_fts)
+                .join(Organization, Organization.id == organizations_fts.c.rowid)
+                .where(fts_table.op("MATCH")(fts_phrase(query)))
+                .order_by(rank, Organization.id)  # по релевантности
+            )
+            sort_key = rank
+        else:
+            # Слишком короткий запрос для триграмм — полный просмотр с Unicode-свёрткой регистра
+            statement = (
+                select(Organization.id, Organization.name, Organization.name.label("sort_key"))
+                .where(func.casefold(Organization.name).like(like_pattern(query), escape="\\"))
+                .order_by(Organization.name, Organization.id)
+            )
+            sort_key = Organization.name
+
+        if cursor is not None:
+            statement = statement.where(tuple_(sort_key, Organization.id) > tuple(cursor))
+        else:
+            statement = statement.offset(offset)
 
         # Получение организаций с пагинацией
+        result = await self.session.execute(statement.limit(limit + 1))
+        page, next_cursor = keyset_page(result.all(), limit, lambda org: (org.sort_key, org.id))
+
+        # Последняя страница сама даёт total; иначе — отдельный подсчёт совпадений с ограничением
+        total = page_total(offset, page, next_cursor, cursor)
+        total_is_exact = total is not None
+        if total is None:
+            total, total_is_exact = await self._count_matches(self._name_matches(query))
+            total = total if total_is_exact else bounded_total(total, offset, page, next_cursor, cursor)
+
+        return {
+            "offset": offset,
+            "limit": limit,
+            "organizations": [{"id": org.id, "name": org.name} for org in page],
+            "next_cursor": next_cursor,
+            "total": total,
+            "total_is_exact": total_is_exact
+        }, None
+
+    async def _count_matches(self, matches) -> tuple[float, bool]:
+        """
+        Число совпадений поиска (matches — их id по возрастанию), посчитанное не дальше SEARCH_TOTAL_EXACT_LIMIT.
+        Если предел достигнут — оценка: доля совпадений в пройденной части диапазона id переносится на весь
+        """
+        counted = matches.order_by(matches.selected_columns[0]).limit(SEARCH_TOTAL_EXACT_LIMIT).subquery()
         result = await self.session.execute(
-            select(Organization)
-            .where(func.lower(Organization.name).like(search_pattern))
-            .offset(offset)
-            .limit(limit)
+            select(func.count(), func.max(counted.c[0]), select(func.max(Organization.id)).scalar_subquery())
+            .select_from(counted)
         )
-        organizations = result.scalars().all()
+        count, last_id, max_id = result.one()
+        if count < SEARCH_TOTAL_EXACT_LIMIT:
+            return count, True
+        return count * max_id / last_id, False
+
+    @staticmethod
+    async def _activity_tree():
+        return await activity_tree_cache.get()
+
+    async def _building_organizations(self, building_id: int) -> int | None:
+        """Число организаций в здании из счётчиков, которые ведут триггеры; None — здания нет"""
+        result = await self.session.execute(
+            select(func.coalesce(building_organization_counts.c.organizations, 0))
+            .select_from(Building)
+            .outerjoin(building_organization_counts, building_organization_counts.c.building_id == Building.id)
+            .where(Building.id == building_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def _area_building_ids(self, filters: OrganizationFilters) -> list[int]:
+        buildings = BuildingRepository(self.session)
+        if filters.bbox is not None:
+            return await buildings.get_building_ids_in_bbox(*filters.bbox)
+        return await buildings.get_building_ids_in_radius(*filters.circle)
+
+    async def _area_buildings_estimate(self, filters: OrganizationFilters) -> float:
+        buildings = BuildingRepository(self.session)
+        return await buildings.count_buildings_in_bbox(*filters.area_bbox) * filters.area_share
+
+    async def query_organizations(self, filters: OrganizationFilters, offset: int = 0, limit: int = 100, cursor: list | None = None):
+        """
+        Организации, подходящие под все заданные фильтры, по возрастанию id — одним запросом.
+        Самый селективный фильтр задаёт кандидатов через свой индекс (rowid IN (...)),
+        остальные проверяются у каждого кандидата без индексов
+        """
+        if filters.activity_id is not None:
+            tree = await self._activity_tree()
+            if tree.get_depth(filters.activity_id) is None:
+                return None, "Activity not found"
+        building_organizations = None
+        if filters.building_id is not None:
+            building_organizations = await self._building_organizations(filters.building_id)
+            if building_organizations is None:
+                return None, "Building not found"
+
+        statistics = await planner_statistics_cache.get()
+        estimates = {}
+        indexed = {"building", "activity", "area"}
+        if filters.building_id is not None:
+            estimates["building"] = building_organizations
+        if filters.activity_id is not None:
+            estimates["activity"] = statistics.activity_organizations(filters.activity_id)
+        if filters.bbox is not None or filters.circle is not None:
+            estimates["area"] = await self._area_buildings_estimate(filters) * statistics.organizations_per_building
+        if filters.name is not None:
+            if len(filters.name) < FTS_MIN_QUERY_LENGTH:
+                # Короткий запрос не попадает в триграммный индекс — только проверка каждой строки
+                estimates["name"] = None
+            elif not estimates:
+                estimates["name"] = 0
+                indexed.add("name")
+            else:
+                # Совпадения по FTS считаем не дальше лучшей альтернативы — проба стоит не больше её самой
+                bound = int(min(estimates.values())) + 1
+                probe = await self.session.execute(
+                    select(func.count()).select_from(
+                        self._name_candidates(filters.name).limit(bound).subquery()
+                    )
+                )
+                estimates["name"] = probe.scalar_one()
+                indexed.add("name")
+
+        wanted = limit + 1 if cursor is not None else offset + limit + 1
+        driver, checks = plan(estimates, indexed, statistics.organizations, wanted)
+
+        statement = select(Organization.id, Organization.name).order_by(Organization.id)
+        if driver is not None:
+            statement = statement.where(Organization.id.in_(await self._facet_candidates(driver, filters)))
+        for facet in checks:
+            statement = statement.where(self._facet_check(facet, filters))
+
+        if cursor is not None:
+            statement = statement.where(Organization.id > cursor[0])
+        else:
+            statement = statement.offset(offset)
+
+        result = await self.session.execute(statement.limit(limit + 1))
+        page, next_cursor = keyset_page(result.all(), limit, lambda org: (org.id,))
+
+        # Для одного здания или вида деятельности total точный из счётчиков, для одного названия — как в поиске,
+        # для сочетания фильтров — оценка планировщика
+        total = page_total(offset, page, next_cursor, cursor)
+        total_is_exact = total is not None
+        if total is None:
+            if filters.facets == ["building"] or filters.facets == ["activity"]:
+                total, total_is_exact = next(iter(estimates.values())), True
+            elif filters.facets == ["name"]:
+                total, total_is_exact = await self._count_matches(self._name_matches(filters.name))
+            else:
+                total = estimate_total(estimates, statistics.organizations)
+            total = total if total_is_exact else bounded_total(total, offset, page, next_cursor, cursor)
 
         return {
             "offset": offset,
             "limit": limit,
-            "organizations": organizations
+            "organizations": [{"id": org.id, "name": org.name} for org in page],
+            "next_cursor": next_cursor,
+            "total": total,
+            "total_is_exact": total_is_exact
         }, None
+
+    @staticmethod
+    def _name_candidates(name: str):
+        return (
+            select(organizations_fts.c.rowid)
+            .where(literal_column("organizations_fts").op("MATCH")(fts_phrase(name)))
+        )
+
+    @staticmethod
+    def _short_name_candidates(name: str):
+        """Запрос короче триграммы: полный просмотр с Unicode-свёрткой регистра"""
+        return select(Organization.id).where(func.casefold(Organization.name).like(like_pattern(name), escape="\\"))
+
+    @classmethod
+    def _name_matches(cls, name: str):
+        """id организаций с name в названии — так же, как их находит поиск"""
+        if len(name) >= FTS_MIN_QUERY_LENGTH:
+            return cls._name_candidates(name)
+        return cls._short_name_candidates(name)
+
+    async def _facet_candidates(self, facet: str, filters: OrganizationFilters):
+        """id организаций фасета, выбранные по его индексу"""
+        if facet == "building":
+            return select(Organization.id).where(Organization.building_id == filters.building_id)
+        if facet == "activity":
+            return (
+                select(organization_activities.c.organization_id)
+                .join(activity_closure, activity_closure.c.descendant_id == organization_activities.c.activity_id)
+                .where(activity_closure.c.ancestor_id == filters.activity_id)
+            )
+        if facet == "area":
+            # Здания области уже найдены индексом в памяти — передаются одним JSON-параметром
+            building_ids = orjson.dumps(await self._area_building_ids(filters)).decode()
+            return (
+                select(Organization.id)
+                .where(Organization.building_id.in_(select(literal_column("value")).select_from(func.json_each(building_ids))))
+            )
+        return self._name_candidates(filters.name)
+
+    @staticmethod
+    def _facet_check(facet: str, filters: OrganizationFilters):
+        """
+        Условие фасета для одной организации. «+ 0» не даёт SQLite взять индекс по этому столбцу
+        и ведёт запрос от кандидатов, выбранных планировщиком
+        """
+        if facet == "building":
+            return Organization.building_id + 0 == filters.building_id
+        if facet == "activity":
+            return (
+                select(organization_activities.c.organization_id)
+                .join(activity_closure, activity_closure.c.descendant_id == organization_activities.c.activity_id)
+                .where(
+                    organization_activities.c.organization_id == Organization.id,
+                    activity_closure.c.ancestor_id == filters.activity_id,
+                )
+                .exists()
+            )
+        if facet == "area":
+            # Здание по первичному ключу; круг — сначала описанный прямоугольник, затем точное расстояние
+            lat_min, lng_min, lat_max, lng_max = filters.area_bbox
+            building = select(Building.id).where(
+                Building.id == Organization.building_id,
+                Building.latitude.between(lat_min, lat_max),
+                Building.longitude.between(lng_min, lng_max),
+            )
+            if filters.circle is not None:
+                lat, lng, radius = filters.circle
+                building = building.where(func.haversine(lat, lng, Building.latitude, Building.longitude) <= radius)
+            return building.exists()
+        if len(filters.name) >= FTS_MIN_QUERY_LENGTH:
+            # Точечный MATCH по rowid каждый раз разбирает списки триграмм — сравнить само название дешевле
+            return func.unicode_lower(Organization.name).like(like_pattern(filters.name, trigram=True), escape="\\")
+        return func.casefold(Organization.name).like(like_pattern(filters.name), escape="\\")
@@ -1,16 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
 from src.api.organizations.service import OrganizationService
+from src.api.organizations.planner import OrganizationFilters
 from src.api.schemas import OrganizationResponsePaginated
 from src.api.schemas import OrganizationFullResponse
-from src.db.session import async_session_general
+from src.api.schemas import OrganizationBulkRequest
+from src.api.schemas import ORGANIZATIONS_BULK_MAX
+from src.api.pagination import cursor_param
+from src.api.metrics import InstrumentedRoute
+from src.api.responses import fast_json_response
+from src.db.session import async_session_read
 
 
-router_organizations = APIRouter(prefix="/organizations", tags=["Организации"])
+router_organizations = APIRouter(prefix="/organizations", tags=["Организации"], route_class=InstrumentedRoute)
 
 async def get_db():
-    async with async_session_general() as session:
+    async with async_session_read() as session:
         yield session
 
 
@@ -24,21 +31,131 @@ async def get_db():
     summary="Поиск организаций по названию"
 )
 async def search_organizations(
+    response: Response,
     query: str = Query(min_length=1, description="Поисковый запрос (по названию)"),
     offset: int = Query(0, ge=0, description="Сдвиг записей (для пагинации)"),
     limit: int = Query(100, ge=1, le=1000, description="Макс. количество записей (до 1000)"),
+    cursor: Optional[list] = Depends(cursor_param(2)),
     db: AsyncSession = Depends(get_db),
 ):
     """
-    Поиск организаций по названию (частичное совпадение, без учёта регистра(для латиницы, по кириллице привет SQLite))
+    Поиск организаций по названию (частичное совпадение, без учёта регистра, в т.ч. для кириллицы).
+    Результаты отсортированы по релевантности. При большом числе совпадений total — оценка (total_is_exact = false)
 
     - **query**: подстрока для поиска
     """
     service = OrganizationService(db)
-    result, error = await service.search_organizations(query, offset=offset, limit=limit)
+    result, error = await service.search_organizations(query, offset=offset, limit=limit, cursor=cursor)
     if error:
         raise HTTPException(status_code=404, detail=error)
-    return result
+    return fast_json_response(result, response)
+
+
+@router_organizations.get(
+    "/query",
+    response_model=OrganizationResponsePaginated,
+    summary="Поиск организаций по сочетанию фильтров: вид деятельности, область на карте, название, здание"
+)
+async def query_organizations(
+    response: Response,
+    activity_id: Optional[int] = Query(None, description="вид деятельности (вместе со всеми подвидами)"),
+    building_id: Optional[int] = Query(None, description="здание"),
+    name: Optional[str] = Query(None, min_length=1, description="подстрока названия"),
+    # Для box
+    lat_min: Optional[float] = Query(None, ge=-90, le=90, description="минимальная широта (южная граница)"),
+    lng_min: Optional[float] = Query(None, ge=-180, le=180, description="минимальная долгота (западная граница)"),
+    lat_max: Optional[float] = Query(None, ge=-90, le=90, description="максимальная широта (северная граница)"),
+    lng_max: Optional[float] = Query(None, ge=-180, le=180, description="максимальная долгота (восточная граница)"),
+    # Для радиуса
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="широта центра (для поиска по радиусу)"),
+    lng: Optional[float] = Query(None, ge=-180, le=180, description="долгота центра"),
+    radius: Optional[float] = Query(None, gt=0, le=50_000, description="радиус поиска в метрах"),
+    offset: int = Query(0, ge=0, description="Сдвиг записей (для пагинации)"),
+    limit: int = Query(100, ge=1, le=1000, description="Макс. количество записей (до 1000)"),
+    cursor: Optional[list] = Depends(cursor_param(1)),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Организации, подходящие сразу под все переданные фильтры, по возрастанию id.
+    Вместо пересечения ответов /activities/root/{id}/organizations, /buildings/organizations/nearby
+    и /organizations/search на клиенте — один запрос: самый селективный фильтр выбирает кандидатов
+    по своему индексу, остальные проверяются у каждого из них. Для сочетания фильтров total — оценка
+
+    - **activity_id**: вид деятельности, включая подвиды
+    - **building_id**: здание
+    - **name**: подстрока названия (как в /organizations/search)
+    - **lat_min**, **lng_min**, **lat_max**, **lng_max**: прямоугольная область
+    - **lat**, **lng**, **radius**: круг (если прямоугольник не задан)
+    """
+    bbox = circle = None
+    if lat_min is not None and lng_min is not None and lat_max is not None and lng_max is not None:
+        bbox = (lat_min, lng_min, lat_max, lng_max)
+    elif lat is not None and lng is not None and radius is not None:
+        circle = (lat, lng, radius)
+    elif any(value is not None for value in (lat_min, lng_min, lat_max, lng_max, lat, lng, radius)):
+        raise HTTPException(
+            status_code=400,
+            detail="Either (lat_min, lng_min, lat_max, lng_max) or (lat, lng, radius) must be provided"
+        )
+
+    filters = OrganizationFilters(activity_id=activity_id, building_id=building_id, name=name, bbox=bbox, circle=circle)
+    if not filters.facets:
+        raise HTTPException(status_code=400, detail="At least one filter must be provided")
+
+    service = OrganizationService(db)
+    result, error = await service.query_organizations(filters, offset=offset, limit=limit, cursor=cursor)
+    if error:
+        raise HTTPException(status_code=404, detail=error)
+    return fast_json_response(result, response)
+
+
+@router_organizations.get(
+    "",
+    response_model=list[OrganizationFullResponse],
+    summary="Полная информация о нескольких организациях по списку идентификаторов"
+)
+async def get_organizations_by_ids(
+    response: Response,
+    ids: List[int] = Query(
+        min_length=1,
+        max_length=ORGANIZATIONS_BULK_MAX,
+        description=f"Идентификаторы организаций (ids=1&ids=2..., до {ORGANIZATIONS_BULK_MAX})"
+    ),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    То же, что /organizations/{org_id}, но для списка организаций за фиксированное число запросов к БД.
+    Результат — в порядке переданных id, несуществующие id пропускаются
+
+    - **ids**: идентификаторы организаций
+    """
+    service = OrganizationService(db)
+    result, error = await service.get_organizations_by_ids(ids)
+    if error:
+        raise HTTPException(status_code=404, detail=error)
+    return fast_json_response(result, response)
+
+
+@router_organizations.post(
+    "/bulk",
+    response_model=list[OrganizationFullResponse],
+    summary="Полная информация о нескольких организациях по списку идентификаторов"
+)
+async def get_organizations_bulk(
+    request: OrganizationBulkRequest,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Вариант GET /organizations для длинных списков id, которые неудобно передавать в строке запроса
+
+    - **ids**: идентификаторы организаций
+    """
+    service = OrganizationService(db)
+    result, error = await service.get_organizations_by_ids(request.ids)
+    if error:
+        raise HTTPException(status_code=404, detail=error)
+    return fast_json_response(result, response)
 
 
 @router_organizations.get(
@@ -54,7 +171,7 @@ async def get_organization_by_id(
     Получить полную информацию об организации.
 
     - **org_id**: идентификатор организации
-    - Возвращает: название, здание, телефоны, виды деятельности (до 3 уровней)
+    - Возвращает: название, здание, телефоны, виды деятельности (с поддеревьями и путём от корня)
     """
     service = OrganizationService(db)
     org, error = await service.get_organization_by_id(org_id)
@@ -1,28 +1,65 @@
 from src.api.organizations.repository import OrganizationRepository
+from src.api.organizations.memory_repository import MemoryOrganizationRepository
+from src.api.organizations.planner import OrganizationFilters
+from src.api.activities.tree import activity_tree_cache
+from config import READ_ENGINE
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
 class OrganizationService:
     def __init__(self, session: AsyncSession):
-        self.repo = OrganizationRepository(session)
+        self.repo = (MemoryOrganizationRepository if READ_ENGINE == "memory" else OrganizationRepository)(session)
 
-    async def get_organizations_by_building_id(self, building_id: int, offset: int, limit: int):
-        return await self.repo.get_by_building_id(building_id, offset, limit)
+    async def get_organizations_by_building_id(self, building_id: int, offset: int, limit: int, cursor: list | None = None):
+        return await self.repo.get_by_building_id(building_id, offset, limit, cursor)
 
     async def get_organization_by_id(self, org_id: int):
-        return await self.repo.get_organization_by_id(org_id)
-    
-    async def search_organizations(self, query: str, offset: int = 0, limit: int = 100):
-        return await self.repo.search_organizations(query, offset, limit)
+        result, error = await self.repo.get_organization_by_id(org_id)
+        if error:
+            return None, error
 
+        organization = result["organization"]
+        tree = await activity_tree_cache.get()
 
-class ActivityService:
-    def __init__(self, session: AsyncSession):
-        self.repo = ActivityRepository(session)
+        return {
+            "id": organization.id,
+            "name": organization.name,
+            "building": organization.building,
+            "phones": organization.phones,
+            "activities": self._activities_with_subtrees(tree, result["activity_ids"])
+        }, None
+
+    async def get_organizations_by_ids(self, org_ids: list[int]):
+        """Полные карточки организаций в порядке запрошенных id; несуществующие id пропускаются"""
+        org_ids = list(dict.fromkeys(org_ids))
+        result, error = await self.repo.get_organizations_by_ids(org_ids)
+        if error:
+            return None, error
 
-    async def get_organizations_by_activity_id(self, activity_id: int, offset: int = 0, limit: int = 100):
-        return await self.repo.get_organizations_by_activity_id(activity_id, offset, limit)
+        tree = await activity_tree_cache.get()
+        organizations = []
+        for org_id in org_ids:
+            organization = result["organizations"].get(org_id)
+            if organization is None:
+                continue
+            organization["activities"] = self._activities_with_subtrees(tree, result["activity_ids"].get(org_id, []))
+            organizations.append(organization)
+        return organizations, None
+
+    @staticmethod
+    def _activities_with_subtrees(tree, activity_ids: list[int]) -> list[dict]:
+        """Виды деятельности организации с поддеревьями и путём от корня — из дерева в памяти"""
+        activities = []
+        for activity_id in activity_ids:
+            node = tree.subtree(activity_id)
+            if node is not None:
+                node["breadcrumbs"] = tree.path(activity_id)
+                activities.append(node)
+        return activities
     
-    async def get_organizations_by_activity_and_descendants(self, activity_id: int, offset: int = 0, limit: int = 100):
-        return await self.repo.get_organizations_by_activity_and_descendants(activity_id, offset, limit)
+    async def search_organizations(self, query: str, offset: int = 0, limit: int = 100, cursor: list | None = None):
+        return await self.repo.search_organizations(query, offset, limit, cursor)
+
+    async def query_organizations(self, filters: OrganizationFilters, offset: int = 0, limit: int = 100, cursor: list | None = None):
+        return await self.repo.query_organizations(filters, offset, limit, cursor)
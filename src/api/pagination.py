@@ -0,0 +1,79 @@
+import base64
+import json
+from bisect import bisect_right
+from typing import Any, Callable, Optional, Sequence
+
+from fastapi import HTTPException, Query
+
+
+def encode_cursor(*values: Any) -> str:
+    """Непрозрачный курсор: значения ключа сортировки последней записи страницы"""
+    raw = json.dumps(values, ensure_ascii=False, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    # Последнее значение ключа всегда id записи
+    if not isinstance(values, list) or len(values) != size or not isinstance(values[-1], int):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def cursor_param(size: int):
+    """Зависимость FastAPI: query-параметр cursor, разобранный в список из size значений ключа"""
+
+    async def dependency(
+        cursor: Optional[str] = Query(
+            None,
+            description="Курсор следующей страницы (next_cursor из предыдущего ответа). Если передан, offset игнорируется"
+        )
+    ) -> Optional[list]:
+        if cursor is None:
+            return None
+        try:
+            return decode_cursor(cursor, size)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    return dependency
+
+
+def keyset_page(rows: Sequence, limit: int, key: Callable[[Any], tuple]) -> tuple[list, Optional[str]]:
+    """
+    Режет выборку из limit + 1 строк на страницу и курсор следующей.
+    Лишняя строка нужна только чтобы понять, есть ли продолжение
+    """
+    page = list(rows[:limit])
+    if len(rows) <= limit or not page:
+        return page, None
+    return page, encode_cursor(*key(page[-1]))
+
+
+def slice_page(items: Sequence, limit: int, key: Callable[[Any], tuple], offset: int = 0, cursor: list | None = None):
+    """
+    Страница из уже отсортированной по key последовательности в памяти — с той же семантикой,
+    что у запросов с курсором (строго после ключа курсора) или со сдвигом
+    """
+    start = bisect_right(items, tuple(cursor), key=key) if cursor is not None else offset
+    return keyset_page(items[start:start + limit + 1], limit, key)
+
+
+def page_total(offset: int, page: Sequence, next_cursor: Optional[str], cursor: list | None) -> Optional[int]:
+    """
+    Число записей, если оно видно по самой странице: последняя страница при пагинации сдвигом.
+    Пустая страница за концом выборки его не показывает — тогда None
+    """
+    if cursor is None and next_cursor is None and (page or offset == 0):
+        return offset + len(page)
+    return None
+
+
+def bounded_total(estimate: float, offset: int, page: Sequence, next_cursor: Optional[str], cursor: list | None) -> int:
+    """Оценка числа записей, но не меньше уже известного по странице: всё до неё, она сама и хотя бы одна после"""
+    seen = (0 if cursor is not None else offset) + len(page) + (1 if next_cursor is not None else 0)
+    return max(round(estimate), seen)
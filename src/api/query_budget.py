@@ -0,0 +1,69 @@
+import logging
+
+from starlette.responses import JSONResponse
+
+from src.db.stats import track_request_stats
+
+logger = logging.getLogger(__name__)
+
+# Сколько SQL-запросов допускается на один вызов эндпоинта.
+# Рост числа запросов (N+1, забытый план загрузки) должен ломать тестовый прогон, а не незаметно тормозить прод
+QUERY_BUDGETS = {
+    ("GET", "/buildings/{building_id}/organizations"): 2,  # проверка здания + страница
+    ("GET", "/buildings/organizations/nearby"): 2,  # кандидаты + здания с организациями
+    ("POST", "/buildings/organizations/nearby/batch"): 2,  # кандидаты + здания с организациями
+    # Без индекса в памяти: до 4 кругов R*Tree + до 2 порций кандидатов + поддерево целиком (здания + их загрузка);
+    # с индексом кругов нет. Обычно — один-два круга и одна порция
+    ("GET", "/buildings/nearest"): 8,
+    ("GET", "/buildings/tiles/{z}/{x}/{y}"): 0,  # кластеры в памяти
+    ("GET", "/activities/tree"): 0,  # дерево в памяти
+    ("GET", "/activities/{activity_id}/organizations"): 2,  # проверка вида деятельности + страница
+    ("GET", "/activities/root/{activity_id}/organizations"): 2,  # проверка вида деятельности + страница
+    ("GET", "/organizations/search"): 2,  # страница + подсчёт совпадений для total, если страница не последняя
+    # Без индекса в памяти: проверка здания + оценка области по R*Tree + проба FTS для плана + здания области,
+    # если она ведущая, + страница; с индексом область стоит 0 запросов
+    ("GET", "/organizations/query"): 5,
+    ("GET", "/organizations"): 3,  # организации со зданиями + телефоны + id видов деятельности
+    ("POST", "/organizations/bulk"): 3,
+    ("GET", "/organizations/{org_id}"): 3,  # организация со зданием + телефоны + id видов деятельности
+}
+
+
+class QueryBudgetMiddleware:
+    """
+    Сверяет число SQL-запросов на вызов эндпоинта с QUERY_BUDGETS.
+    mode="warn" — пишет предупреждение в лог, mode="enforce" — подменяет ответ на 500 (для тестовых прогонов)
+    """
+
+    def __init__(self, app, mode: str = "warn"):
+        self.app = app
+        self.mode = mode
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        replaced = False
+
+        async def send_with_budget_check(message):
+            nonlocal replaced
+            if replaced:
+                return
+            if message["type"] == "http.response.start":
+                route = scope.get("route")
+                budget = QUERY_BUDGETS.get((scope["method"], getattr(route, "path", None)))
+                if budget is not None and stats.statements > budget:
+                    detail = (
+                        f"Query budget exceeded for {scope['method']} {route.path}: "
+                        f"{stats.statements} statements, budget {budget}"
+                    )
+                    logger.warning(detail)
+                    if self.mode == "enforce":
+                        replaced = True
+                        await JSONResponse({"detail": detail}, status_code=500)(scope, receive, send)
+                        return
+            await send(message)
+
+        with track_request_stats() as stats:
+            await self.app(scope, receive, send_with_budget_check)
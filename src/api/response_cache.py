@@ -0,0 +1,251 @@
+import asyncio
+import contextvars
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from time import monotonic
+from urllib.parse import parse_qsl, urlencode
+
+from config import (
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_STALE_TTL,
+)
+from src.api.etag import etag_matches, validator_headers
+
+logger = logging.getLogger(__name__)
+
+# Заголовки, которые относятся к одному ответу и в кеш не попадают
+UNCACHED_HEADERS = {b"server-timing"}
+# Условные заголовки клиента: фоновое обновление без них получает полный ответ 200, а не 304
+CONDITIONAL_HEADERS = {b"if-none-match", b"if-modified-since"}
+
+# Шаблоны маршрутов, ответы которых кешируются (только GET и только 200)
+CACHED_ROUTES = {
+    "/organizations/{org_id}",
+    "/organizations/search",
+    "/organizations/query",
+    "/buildings/organizations/nearby",
+    "/buildings/nearest",
+    "/buildings/tiles/{z}/{x}/{y}",
+}
+
+
+@dataclass
+class CachedResponse:
+    status: int
+    headers: list[tuple[bytes, bytes]]
+    body: bytes
+    route: object  # маршрут FastAPI — нужен метрикам при ответе из кеша
+    version: int | None
+    stored_at: float
+
+    @property
+    def etag(self) -> str | None:
+        for name, value in self.headers:
+            if name == b"etag":
+                return value.decode("latin-1")
+        return None
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(name) + len(value) for name, value in self.headers)
+
+
+class ResponseCache(ABC):
+    """
+    Интерфейс хранилища ответов. Записи привязаны к версии данных:
+    invalidate() сбрасывает всё, записи, посчитанные на старой версии, не принимаются
+    """
+
+    def __init__(self):
+        self.version: int | None = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abstractmethod
+    def lookup(self, key) -> tuple[CachedResponse | None, bool]:
+        """Запись и признак её свежести; (None, False), если записи нет или она совсем устарела"""
+
+    @abstractmethod
+    def store(self, key, entry: CachedResponse):
+        """Сохраняет запись, если она посчитана на текущей версии данных"""
+
+    @abstractmethod
+    def clear(self):
+        """Удаляет все записи"""
+
+    async def invalidate(self, version: int):
+        self.clear()
+        self.version = version
+
+
+class MemoryResponseCache(ResponseCache):
+    """
+    Кеш в памяти процесса: ограничен числом записей и суммарным размером, вытеснение LRU.
+    Запись свежая ttl секунд, ещё stale_ttl секунд она отдаётся устаревшей с фоновым обновлением
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float, stale_ttl: float):
+        super().__init__()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.entries: OrderedDict = OrderedDict()
+        self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, key) -> tuple[CachedResponse | None, bool]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None, False
+
+        age = monotonic() - entry.stored_at
+        if age > self.ttl + self.stale_ttl:
+            self._remove(key)
+            return None, False
+
+        self.entries.move_to_end(key)
+        return entry, age <= self.ttl
+
+    def store(self, key, entry: CachedResponse):
+        if entry.version != self.version or entry.size > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+
+        self.entries[key] = entry
+        self.bytes += entry.size
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def _remove(self, key):
+        self.bytes -= self.entries.pop(key).size
+
+
+response_cache = MemoryResponseCache(
+    RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL, RESPONSE_CACHE_STALE_TTL
+)
+
+
+async def _empty_receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _discard(message):
+    pass
+
+
+class ResponseCacheMiddleware:
+    """
+    Отдаёт ответы CACHED_ROUTES из кеша. Ключ — путь, нормализованные параметры запроса
+    и API-ключ: запрос с неверным ключом не совпадёт ни с одной записью и получит 403 от приложения
+    """
+
+    def __init__(self, app, cache: ResponseCache = response_cache):
+        self.app = app
+        self.cache = cache
+        self._revalidating: dict = {}
+
+    @staticmethod
+    def _key(scope) -> tuple:
+        query = urlencode(sorted(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)))
+        api_key = dict(scope["headers"]).get(b"x-api-key")
+        return scope["path"], query, api_key
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        key = self._key(scope)
+        entry, fresh = self.cache.lookup(key)
+        if entry is None:
+            await self._fetch(scope, receive, send, key)
+            return
+
+        if fresh:
+            self.cache.hits += 1
+        else:
+            self.cache.stale_hits += 1
+            self._revalidate(scope, key)
+
+        scope["route"] = entry.route
+        if_none_match = dict(scope["headers"]).get(b"if-none-match", b"").decode("latin-1")
+        if entry.etag is not None and etag_matches(if_none_match, entry.etag):
+            headers = [(name.lower().encode(), value.encode()) for name, value in validator_headers(entry.etag).items()]
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        await send({"type": "http.response.start", "status": entry.status, "headers": entry.headers})
+        await send({"type": "http.response.body", "body": entry.body})
+
+    async def _fetch(self, scope, receive, send, key, count_miss: bool = True):
+        version = self.cache.version
+        started = monotonic()
+        start_message = None
+        cacheable = False
+        chunks = []
+
+        async def send_and_capture(message):
+            nonlocal start_message, cacheable
+            if message["type"] == "http.response.start":
+                # Копия до отправки: внешние middleware (метрики) дописывают заголовки в это же сообщение
+                start_message = {
+                    **message,
+                    "headers": [(name, value) for name, value in message.get("headers", []) if name not in UNCACHED_HEADERS],
+                }
+                # К началу ответа маршрут уже известен; тело остальных (в т.ч. потоковых выгрузок) не копим
+                cacheable = getattr(scope.get("route"), "path", None) in CACHED_ROUTES
+            elif message["type"] == "http.response.body" and cacheable:
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive, send_and_capture)
+
+        route = scope.get("route")
+        if getattr(route, "path", None) not in CACHED_ROUTES:
+            return
+        if count_miss:
+            self.cache.misses += 1
+        if start_message is None or start_message["status"] != 200:
+            return
+
+        self.cache.store(key, CachedResponse(
+            status=start_message["status"],
+            headers=start_message["headers"],
+            body=b"".join(chunks),
+            route=route,
+            version=version,
+            stored_at=started,
+        ))
+
+    def _revalidate(self, scope, key):
+        if key in self._revalidating:
+            return
+        scope = dict(scope)
+        scope["headers"] = [(name, value) for name, value in scope["headers"] if name not in CONDITIONAL_HEADERS]
+        # Пустой контекст: фоновый запрос не должен попадать в статистику текущего
+        task = asyncio.create_task(self._refresh(scope, key), context=contextvars.Context())
+        self._revalidating[key] = task
+
+    async def _refresh(self, scope, key):
+        try:
+            await self._fetch(scope, _empty_receive, _discard, key, count_miss=False)
+        except Exception:
+            logger.exception("Failed to revalidate cached response for %s", scope["path"])
+        finally:
+            self._revalidating.pop(key, None)
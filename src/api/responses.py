@@ -0,0 +1,31 @@
+from typing import Any, AsyncIterator
+
+import orjson
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+
+
+class OrjsonResponse(Response):
+    """JSON, закодированный orjson; замена ORJSONResponse, который FastAPI объявил устаревшим"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def fast_json_response(content, response: Response) -> OrjsonResponse:
+    """
+    JSON-ответ из готовых dict/list, закодированный orjson. FastAPI отдаёт его как есть,
+    без валидации через response_model (схема в OpenAPI остаётся прежней), поэтому content
+    должен уже совпадать со схемой. Заголовки, выставленные зависимостями (ETag), переносятся
+    """
+    fast = OrjsonResponse(content)
+    fast.headers.raw.extend(response.headers.raw)
+    return fast
+
+
+def ndjson_response(chunks: AsyncIterator[str], response: Response) -> StreamingResponse:
+    """Потоковый ответ в формате NDJSON (один JSON-объект на строку); заголовки зависимостей переносятся"""
+    stream = StreamingResponse(chunks, media_type="application/x-ndjson")
+    stream.headers.raw.extend(response.headers.raw)
+    return stream
@@ -1,5 +1,5 @@
-from typing import List
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field
 
 
 class Building(BaseModel):
@@ -58,6 +58,12 @@ class OrganizationResponsePaginated(BaseModel):
     offset: int
     limit: int
     organizations: List[Organization]
+    # Курсор следующей страницы; None — страниц больше нет
+    next_cursor: Optional[str] = None
+    # Всего записей в выборке (без учёта offset и limit)
+    total: int
+    # False — total оценён, а не посчитан (поиск по названию и сочетания фильтров)
+    total_is_exact: bool = True
 
     class Config:
         from_attributes = True
@@ -78,25 +84,87 @@ class BuildingWithOrgsResponse(BaseModel):
         from_attributes = True
 
 
-class OrganizationFullResponse(BaseModel):
+class NearestBuildingResponse(BuildingWithOrgsResponse):
+    # Расстояние от точки запроса в метрах
+    distance: float
+
+
+class ActivityResponse(BaseModel):
     id: int
     name: str
-    building: BuildingResponse
-    phones: List[PhoneResponse]
-    activities: List[ActivityResponseFull]
 
     class Config:
         from_attributes = True
 
 
-class ActivityResponse(BaseModel):
+class OrganizationActivityResponse(ActivityResponseFull):
+    # Путь от корня дерева до вида деятельности включительно
+    breadcrumbs: List[ActivityResponse] = []
+
+
+class RadiusQuery(BaseModel):
+    lat: float = Field(ge=-90, le=90, description="широта центра")
+    lng: float = Field(ge=-180, le=180, description="долгота центра")
+    radius: float = Field(gt=0, le=50_000, description="радиус поиска в метрах")
+
+
+class NearbyBatchRequest(BaseModel):
+    centers: List[RadiusQuery] = Field(min_length=1, max_length=100)
+
+
+class NearbyBatchResult(BaseModel):
+    center: RadiusQuery
+    buildings: List[BuildingWithOrgsResponse]
+
+
+class TileActivity(BaseModel):
+    id: int
+    name: str
+    organizations: int
+
+
+class TileCluster(BaseModel):
+    # Центр кластера — среднее координат его зданий
+    latitude: float
+    longitude: float
+    buildings: int
+    organizations: int
+    # Корневые виды деятельности с наибольшим числом организаций в кластере
+    activities: List[TileActivity]
+
+
+class TileBuilding(BuildingResponse):
+    organizations: int
+
+
+class TileResponse(BaseModel):
+    z: int
+    x: int
+    y: int
+    # Заполнен один из списков: кластеры на мелких масштабах, здания — на крупных
+    clusters: List[TileCluster]
+    buildings: List[TileBuilding]
+
+
+class OrganizationFullResponse(BaseModel):
     id: int
     name: str
+    building: BuildingResponse
+    phones: List[PhoneResponse]
+    activities: List[OrganizationActivityResponse]
 
     class Config:
         from_attributes = True
 
 
+# Сколько организаций можно запросить за один вызов пакетного поиска по id
+ORGANIZATIONS_BULK_MAX = 500
+
+
+class OrganizationBulkRequest(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=ORGANIZATIONS_BULK_MAX)
+
+
 class OrganizationWithActivitiesResponse(BaseModel):
     organization: OrganizationResponse
     matched_activities: List[ActivityResponse]
@@ -109,6 +177,10 @@ class PaginatedOrgsWithActivitiesResponse(BaseModel):
     offset: int
     limit: int
     organizations: List[OrganizationWithActivitiesResponse]
+    next_cursor: Optional[str] = None
+    # Всего организаций в поддереве
+    total: int
+    total_is_exact: bool = True
 
     class Config:
         from_attributes = True
@@ -0,0 +1,350 @@
+"""
+Потоковый импорт организаций (со зданиями и телефонами) из JSONL или CSV.
+
+Записи читаются по одной и обрабатываются порциями: ссылки на здания и виды деятельности
+разрешаются одним запросом на порцию, запись идёт Core-upsert'ами, каждая порция — своя транзакция.
+Производные индексы (замыкание дерева, R*Tree, FTS, счётчики организаций) перестраиваются один раз в конце — см. bulk_load.
+Память ограничена размером порции и справочником видов деятельности
+
+Формат записи JSONL (совместим с /export/organizations.ndjson):
+    {"id": 1, "name": "...", "building": {"id": 16, "address": "...", "latitude": 55.7, "longitude": 37.6},
+     "phones": [{"id": 7, "number": "..."}], "activity_ids": [43]}
+Вместо building можно передать building_id, телефоны — строками, виды деятельности — именами в activities.
+Колонки CSV: id, name, building_id, address, latitude, longitude, phones, activity_ids, activities;
+списки разделяются «;»
+"""
+import csv
+import sys
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Iterable, Iterator, TextIO
+
+import orjson
+from sqlalchemy import Connection, delete, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from src.db.maintenance import bulk_load
+from src.models import Activity, Building, Organization, Phone, organization_activities
+
+LIST_SEPARATOR = ";"
+# Сколько текстов ошибок хранить для отчёта; остальные только считаются
+MAX_ERROR_MESSAGES = 20
+
+
+@dataclass
+class OrganizationRecord:
+    line: int
+    id: int | None
+    name: str
+    building_id: int | None
+    # (адрес, широта, долгота) — если есть, здание создаётся или обновляется
+    building: tuple[str, float, float] | None
+    # (id, номер); id — из выгрузки /export/organizations.ndjson, у телефонов строкой или из CSV его нет
+    phones: list[tuple[int | None, str]]
+    activity_ids: list[int]
+    activity_names: list[str]
+
+
+@dataclass
+class ImportReport:
+    records: int = 0
+    imported: int = 0
+    buildings_created: int = 0
+    errors: int = 0
+    messages: list[str] = field(default_factory=list)
+
+    def error(self, line: int, message: str):
+        self.errors += 1
+        if len(self.messages) < MAX_ERROR_MESSAGES:
+            self.messages.append(f"строка {line}: {message}")
+
+
+def _split(value) -> list:
+    if value is None or value == "":
+        return []
+    if isinstance(value, list):
+        return value
+    return [item.strip() for item in str(value).split(LIST_SEPARATOR) if item.strip()]
+
+
+def _optional_int(value) -> int | None:
+    return None if value is None or value == "" else int(value)
+
+
+def parse_record(line: int, raw: dict | ValueError) -> OrganizationRecord:
+    """Приводит запись JSONL или строку CSV к OrganizationRecord; ValueError — запись некорректна"""
+    # Строку, которую не удалось даже прочитать, читатель передаёт ошибкой — она попадает в отчёт как обычная
+    if isinstance(raw, ValueError):
+        raise raw
+    if not isinstance(raw, dict):
+        raise ValueError("запись должна быть объектом JSON")
+
+    name = (raw.get("name") or "").strip()
+    if not name:
+        raise ValueError("нет названия")
+
+    building = raw.get("building") or {}
+    building_id = _optional_int(building.get("id", raw.get("building_id")))
+    address = building.get("address", raw.get("address"))
+    latitude = building.get("latitude", raw.get("latitude"))
+    longitude = building.get("longitude", raw.get("longitude"))
+    location = None
+    if address not in (None, "") or latitude not in (None, "") or longitude not in (None, ""):
+        if address in (None, "") or latitude in (None, "") or longitude in (None, ""):
+            raise ValueError("у здания нужны адрес, широта и долгота")
+        location = (str(address), float(latitude), float(longitude))
+        if not -90 <= location[1] <= 90 or not -180 <= location[2] <= 180:
+            raise ValueError("координаты здания вне допустимого диапазона")
+    elif building_id is None:
+        raise ValueError("не указано здание")
+
+    return OrganizationRecord(
+        line=line,
+        id=_optional_int(raw.get("id")),
+        name=name,
+        building_id=building_id,
+        building=location,
+        phones=[
+            (_optional_int(phone.get("id")), phone["number"]) if isinstance(phone, dict) else (None, str(phone))
+            for phone in _split(raw.get("phones"))
+        ],
+        activity_ids=[int(activity_id) for activity_id in _split(raw.get("activity_ids"))],
+        activity_names=[str(activity) for activity in _split(raw.get("activities"))],
+    )
+
+
+def read_jsonl(file: TextIO) -> Iterator[tuple[int, dict | ValueError]]:
+    for line, text in enumerate(file, start=1):
+        if not text.strip():
+            continue
+        # Одна битая строка не должна обрывать импорт — ошибка разбора уходит в отчёт вместо записи
+        try:
+            raw = orjson.loads(text)
+        except orjson.JSONDecodeError as error:
+            raw = ValueError(f"некорректный JSON: {error}")
+        yield line, raw
+
+
+def read_csv(file: TextIO) -> Iterator[tuple[int, dict]]:
+    # Первая строка — заголовок, поэтому данные начинаются со второй
+    for line, row in enumerate(csv.DictReader(file), start=2):
+        yield line, row
+
+
+class OrganizationImporter:
+    def __init__(self, connection: Connection, chunk_size: int = 5000, progress: TextIO | None = sys.stderr):
+        self.connection = connection
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.report = ImportReport()
+
+        # Справочник видов деятельности невелик — держим целиком; неоднозначные имена помечаются None
+        self.activity_ids = set()
+        self.activity_by_name: dict[str, int | None] = {}
+        for activity_id, name in connection.execute(select(Activity.id, Activity.name)):
+            self.activity_ids.add(activity_id)
+            self.activity_by_name[name] = None if name in self.activity_by_name else activity_id
+
+        # Импорт — единственный писатель, поэтому новые id можно раздавать самим
+        self.next_org_id = (connection.execute(select(func.max(Organization.id))).scalar() or 0) + 1
+        self.next_building_id = (connection.execute(select(func.max(Building.id))).scalar() or 0) + 1
+
+    def run(self, rows: Iterable[tuple[int, dict]]) -> ImportReport:
+        started = perf_counter()
+        with bulk_load(self.connection):
+            chunk = []
+            for line, raw in rows:
+                self.report.records += 1
+                try:
+                    chunk.append(parse_record(line, raw))
+                except (ValueError, TypeError, KeyError, AttributeError) as error:
+                    self.report.error(line, str(error))
+                if len(chunk) == self.chunk_size:
+                    self._import_chunk(chunk)
+                    chunk = []
+                    self._print_progress(started)
+            if chunk:
+                self._import_chunk(chunk)
+            self._print_progress(started)
+            if self.progress:
+                print("\nПерестройка индексов...", file=self.progress)
+        return self.report
+
+    def _print_progress(self, started: float):
+        if self.progress:
+            elapsed = perf_counter() - started
+            print(
+                f"\rЗаписей: {self.report.records}, импортировано: {self.report.imported}, "
+                f"ошибок: {self.report.errors} ({self.report.records / max(elapsed, 1e-9):.0f} записей/с)",
+                end="", file=self.progress, flush=True,
+            )
+
+    def _resolve_activities(self, record: OrganizationRecord) -> list[int]:
+        resolved = []
+        for activity_id in record.activity_ids:
+            if activity_id not in self.activity_ids:
+                raise ValueError(f"нет вида деятельности с id {activity_id}")
+            resolved.append(activity_id)
+        for name in record.activity_names:
+            if name not in self.activity_by_name:
+                raise ValueError(f"нет вида деятельности «{name}»")
+            if self.activity_by_name[name] is None:
+                raise ValueError(f"несколько видов деятельности называются «{name}», укажите id")
+            resolved.append(self.activity_by_name[name])
+        return list(dict.fromkeys(resolved))
+
+    def _resolve_buildings(self, records: list[OrganizationRecord]) -> tuple[list[OrganizationRecord], list[dict]]:
+        """
+        Проставляет building_id записям без него. Возвращает записи с разрешённым зданием
+        и строки зданий для upsert; записи со ссылкой на несуществующее здание отбрасываются
+        """
+        upserts = {record.building_id: record.building for record in records if record.building_id and record.building}
+
+        referenced = {record.building_id for record in records if not record.building} - upserts.keys()
+        existing = set()
+        if referenced:
+            existing = set(self.connection.execute(select(Building.id).where(Building.id.in_(referenced))).scalars())
+
+        # Здания без id ищем по точному совпадению адреса и координат
+        located = {}
+        addresses = {record.building[0] for record in records if record.building_id is None}
+        if addresses:
+            rows = self.connection.execute(
+                select(Building.id, Building.address, Building.latitude, Building.longitude)
+                .where(Building.address.in_(addresses))
+            )
+            for building_id, address, latitude, longitude in rows:
+                located.setdefault((address, latitude, longitude), building_id)
+
+        accepted = []
+        for record in records:
+            if record.building_id is None:
+                building_id = located.get(record.building)
+                if building_id is None:
+                    building_id = located[record.building] = self.next_building_id
+                    self.next_building_id += 1
+                    self.report.buildings_created += 1
+                    upserts[building_id] = record.building
+                record.building_id = building_id
+            elif not record.building and record.building_id not in existing and record.building_id not in upserts:
+                self.report.error(record.line, f"нет здания с id {record.building_id}")
+                continue
+            accepted.append(record)
+
+        buildings = [
+            {"id": building_id, "address": address, "latitude": latitude, "longitude": longitude}
+            for building_id, (address, latitude, longitude) in upserts.items()
+        ]
+        return accepted, buildings
+
+    def _import_chunk(self, records: list[OrganizationRecord]):
+        activities = {}
+        resolved = []
+        for record in records:
+            try:
+                activities[record.line] = self._resolve_activities(record)
+            except ValueError as error:
+                self.report.error(record.line, str(error))
+                continue
+            resolved.append(record)
+        accepted, buildings = self._resolve_buildings(resolved)
+
+        # Повтор id внутри порции: побеждает последняя запись
+        organizations = {}
+        for record in accepted:
+            if record.id is None:
+                record.id = self.next_org_id
+                self.next_org_id += 1
+            else:
+                self.next_org_id = max(self.next_org_id, record.id + 1)
+            organizations[record.id] = (record, activities[record.line])
+        if not organizations:
+            self.connection.commit()
+            return
+
+        if buildings:
+            statement = sqlite_insert(Building)
+            self.connection.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[Building.id],
+                    set_={
+                        "address": statement.excluded.address,
+                        "latitude": statement.excluded.latitude,
+                        "longitude": statement.excluded.longitude,
+                    },
+                ),
+                buildings,
+            )
+
+        statement = sqlite_insert(Organization)
+        self.connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=[Organization.id],
+                set_={"name": statement.excluded.name, "building_id": statement.excluded.building_id},
+            ),
+            [
+                {"id": org_id, "name": record.name, "building_id": record.building_id}
+                for org_id, (record, _) in organizations.items()
+            ],
+        )
+
+        # Телефоны и виды деятельности запись задаёт целиком
+        org_ids = list(organizations)
+        self._import_phones(organizations)
+        self.connection.execute(
+            delete(organization_activities).where(organization_activities.c.organization_id.in_(org_ids))
+        )
+        links = [
+            {"organization_id": org_id, "activity_id": activity_id}
+            for org_id, (_, activity_ids) in organizations.items()
+            for activity_id in activity_ids
+        ]
+        if links:
+            self.connection.execute(insert(organization_activities), links)
+
+        self.connection.commit()
+        self.report.imported += len(organizations)
+
+    def _import_phones(self, organizations: dict[int, tuple[OrganizationRecord, list[int]]]):
+        """
+        Приводит телефоны организаций к записям. id телефонов публичные (PhoneResponse), поэтому не перенумеровываются:
+        телефон с id обновляется на месте, без id — сохраняет id уже существующего телефона с тем же номером.
+        Удаляются только телефоны, которых в записи нет
+        """
+        existing: dict[int, dict[str, list[int]]] = {}
+        for phone_id, org_id, number in self.connection.execute(
+            select(Phone.id, Phone.organization_id, Phone.number)
+            .where(Phone.organization_id.in_(list(organizations)))
+            .order_by(Phone.id)
+        ):
+            existing.setdefault(org_id, {}).setdefault(number, []).append(phone_id)
+
+        kept, created, stale = [], [], []
+        for org_id, (record, _) in organizations.items():
+            by_number = existing.get(org_id, {})
+            # Сначала телефоны с явным id: их id не должны достаться телефону без id с тем же номером
+            explicit = {phone_id for phone_id, _ in record.phones if phone_id is not None}
+            for ids in by_number.values():
+                ids[:] = [phone_id for phone_id in ids if phone_id not in explicit]
+            for phone_id, number in record.phones:
+                if phone_id is None and by_number.get(number):
+                    phone_id = by_number[number].pop(0)
+                if phone_id is None:
+                    created.append({"number": number, "organization_id": org_id})
+                else:
+                    kept.append({"id": phone_id, "number": number, "organization_id": org_id})
+            stale.extend(phone_id for ids in by_number.values() for phone_id in ids)
+
+        if stale:
+            self.connection.execute(delete(Phone).where(Phone.id.in_(stale)))
+        if kept:
+            statement = sqlite_insert(Phone)
+            self.connection.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[Phone.id],
+                    set_={"number": statement.excluded.number, "organization_id": statement.excluded.organization_id},
+                ),
+                kept,
+            )
+        if created:
+            self.connection.execute(insert(Phone), created)
@@ -0,0 +1,127 @@
+"""
+Обслуживание БД для массовой загрузки: схема через миграции, отключение триггеров на время загрузки
+и однократная перестройка производных таблиц (замыкание дерева, R*Tree, FTS, счётчики организаций) в конце.
+
+Функции синхронные — для скриптов и CLI, а не для обработчиков запросов
+"""
+import os
+from contextlib import contextmanager
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import Connection, text
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def upgrade_schema(url: str):
+    """Применяет все миграции к БД по адресу url (синхронный драйвер, например sqlite:///data/x.db)"""
+    config = Config(os.path.join(project_root, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(project_root, "migrations"))
+    config.set_main_option("sqlalchemy.url", url)
+    command.upgrade(config, "head")
+
+
+def rebuild_derived_tables(connection: Connection):
+    """Заново заполняет таблицы, которые в обычной работе ведут триггеры"""
+    connection.execute(text("DELETE FROM activity_closure"))
+    connection.execute(text("""
+        INSERT INTO activity_closure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE paths(ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM activities
+            UNION ALL
+            SELECT p.ancestor_id, a.id, p.depth + 1
+            FROM paths p
+            JOIN activities a ON a.parent_id = p.descendant_id
+        )
+        SELECT ancestor_id, descendant_id, depth FROM paths
+    """))
+
+    connection.execute(text("DELETE FROM buildings_rtree"))
+    connection.execute(text("""
+        INSERT INTO buildings_rtree (id, min_lat, max_lat, min_lng, max_lng)
+        SELECT id, latitude, latitude, longitude, longitude FROM buildings
+    """))
+
+    connection.execute(text("INSERT INTO organizations_fts (organizations_fts) VALUES ('rebuild')"))
+
+    # Счётчики — после замыкания: поддеревья считаются по нему
+    connection.execute(text("DELETE FROM building_organization_counts"))
+    connection.execute(text("""
+        INSERT INTO building_organization_counts (building_id, organizations)
+        SELECT id, (SELECT count(*) FROM organizations WHERE building_id = buildings.id)
+        FROM buildings
+    """))
+    connection.execute(text("DELETE FROM activity_organization_counts"))
+    connection.execute(text("""
+        INSERT INTO activity_organization_counts (activity_id, organizations, subtree_organizations)
+        SELECT
+            id,
+            (SELECT count(*) FROM organization_activities WHERE activity_id = activities.id),
+            (
+                SELECT count(DISTINCT oa.organization_id)
+                FROM activity_closure c
+                JOIN organization_activities oa ON oa.activity_id = c.descendant_id
+                WHERE c.ancestor_id = activities.id
+            )
+        FROM activities
+    """))
+
+
+def _finish_bulk_load(connection: Connection):
+    """
+    Перестраивает производные таблицы, возвращает сохранённые в bulk_load_triggers триггеры
+    и поднимает версию данных — всё одной транзакцией
+    """
+    rebuild_derived_tables(connection)
+    existing = set(connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'")).scalars())
+    for name, sql in connection.execute(text("SELECT name, sql FROM bulk_load_triggers ORDER BY name")).all():
+        if name not in existing:
+            connection.exec_driver_sql(sql)
+    connection.execute(text("DELETE FROM bulk_load_triggers"))
+    connection.execute(text("UPDATE data_version SET version = version + 1 WHERE id = 1"))
+    connection.commit()
+
+
+def repair_after_bulk_load(connection: Connection) -> int:
+    """
+    Доводит до конца прерванную массовую загрузку (SIGKILL, OOM, отключение питания): возвращает снятые триггеры
+    и перестраивает производные таблицы по уже зафиксированным данным. Повторный запуск безопасен.
+    Возвращает число восстановленных триггеров
+    """
+    missing = connection.execute(text("""
+        SELECT count(*) FROM bulk_load_triggers
+        WHERE name NOT IN (SELECT name FROM sqlite_master WHERE type = 'trigger')
+    """)).scalar()
+    _finish_bulk_load(connection)
+    return missing
+
+
+@contextmanager
+def bulk_load(connection: Connection):
+    """
+    Снимает все триггеры на время загрузки; после неё перестраивает производные таблицы,
+    возвращает триггеры и один раз поднимает версию данных.
+
+    Внутри можно фиксировать транзакции порциями. При ошибке незафиксированная порция откатывается,
+    а производные таблицы всё равно перестраиваются по уже зафиксированным данным.
+    Если процесс убит посреди загрузки, тексты триггеров остаются в bulk_load_triggers — их вернёт
+    repair_after_bulk_load или следующая загрузка. Пока триггеры сняты, в БД не должен писать никто, кроме загрузки
+    """
+    # Сохранение и снятие — одна транзакция: sqlite3 открывает её перед INSERT, и DROP TRIGGER попадает в неё же.
+    # OR IGNORE — триггеры, сохранённые прерванной загрузкой, уже на месте в таблице
+    connection.execute(text("""
+        INSERT OR IGNORE INTO bulk_load_triggers (name, sql)
+        SELECT name, sql FROM sqlite_master WHERE type = 'trigger'
+    """))
+    for name in connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'")).scalars().all():
+        connection.execute(text(f'DROP TRIGGER "{name}"'))
+    connection.commit()
+
+    try:
+        yield
+    except BaseException:
+        connection.rollback()
+        raise
+    finally:
+        _finish_bulk_load(connection)
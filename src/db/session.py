@@ -1,8 +1,70 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-from config import DATABASE_CONNECTION_STRING
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine
+from config import (
+    DATABASE_CONNECTION_STRING,
+    SQLITE_WAL,
+    SQLITE_READ_POOL_SIZE,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_BUSY_TIMEOUT,
+    SQLITE_CACHE_SIZE,
+    SQLITE_MMAP_SIZE,
+)
+from src.geo import haversine
 
+# Единственный пишущий экземпляр: SQLite всё равно допускает одного писателя за раз,
+# а очередь в пуле дешевле, чем ожидание блокировки файла с busy_timeout
 engine_general = create_async_engine(
-    DATABASE_CONNECTION_STRING
+    DATABASE_CONNECTION_STRING,
+    pool_size=1,
+    max_overflow=0,
+)
+
+# Пул соединений только для чтения. У aiosqlite каждое соединение работает в своём потоке,
+# поэтому параллельные читатели не выстраиваются в очередь за одним соединением; в WAL они не ждут и писателя
+engine_read = create_async_engine(
+    DATABASE_CONNECTION_STRING,
+    pool_size=SQLITE_READ_POOL_SIZE,
+    max_overflow=0,
 )
 
 async_session_general = async_sessionmaker(engine_general, expire_on_commit=False)
+async_session_read = async_sessionmaker(engine_read, expire_on_commit=False)
+
+
+def _casefold(value):
+    return value.casefold() if value is not None else None
+
+
+def _unicode_lower(value):
+    return value.lower() if value is not None else None
+
+
+def _configure_connection(dbapi_connection, read_only: bool):
+    # Встроенный lower() в SQLite понимает только ASCII — даём Unicode-свёртку регистра из Python
+    dbapi_connection.create_function("casefold", 1, _casefold, deterministic=True)
+    # Посимвольная свёртка, как у триграмм FTS5: проверка названия без обращения к индексу
+    dbapi_connection.create_function("unicode_lower", 1, _unicode_lower, deterministic=True)
+    # Фильтр по радиусу в SQL считает расстояние той же функцией, что и пространственный индекс
+    dbapi_connection.create_function("haversine", 4, haversine, deterministic=True)
+
+    cursor = dbapi_connection.cursor()
+    if SQLITE_WAL:
+        # Режим журнала хранится в самом файле БД, повторная установка ничего не стоит
+        cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+    cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    if read_only:
+        cursor.execute("PRAGMA query_only=1")
+    cursor.close()
+
+
+def _listen_connect(engine: AsyncEngine, read_only: bool):
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        _configure_connection(dbapi_connection, read_only)
+
+
+_listen_connect(engine_general, read_only=False)
+_listen_connect(engine_read, read_only=True)
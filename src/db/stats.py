@@ -0,0 +1,67 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+@dataclass
+class RequestStats:
+    """Статистика одного HTTP-запроса: SQL и момент, когда эндпоинт вернул результат"""
+    statements: int = 0
+    db_time: float = 0.0
+    rows: int = 0
+    handler_finished: float | None = None
+
+
+_current_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+@contextmanager
+def track_request_stats():
+    """
+    Включает сбор статистики для текущего запроса. Контекст наследуют все его задачи и гринлеты
+    SQLAlchemy; если статистику уже собирает внешний middleware, переиспользуем её
+    """
+    stats = _current_stats.get()
+    if stats is not None:
+        yield stats
+        return
+
+    stats = RequestStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def current_stats() -> RequestStats | None:
+    return _current_stats.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None:
+        conn.info.setdefault("query_start_time", []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is None or not conn.info.get("query_start_time"):
+        return
+    stats.statements += 1
+    stats.db_time += perf_counter() - conn.info["query_start_time"].pop()
+    # Курсор адаптера aiosqlite выбирает результат целиком сразу после execute;
+    # у серверных курсоров (стриминг) буфер пуст и строки здесь не считаются
+    rows = getattr(cursor, "_rows", None)
+    if rows is not None:
+        stats.rows += len(rows)
+
+
+def instrument_engine(engine: AsyncEngine):
+    if event.contains(engine.sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from config import DATA_VERSION_POLL_INTERVAL
+from src.db.session import async_session_read
+from src.models import DataVersion, bulk_load_triggers
+
+logger = logging.getLogger(__name__)
+
+VersionListener = Callable[[int], Awaitable[None]]
+
+
+async def fetch_data_version(session: AsyncSession) -> int:
+    """Текущая версия набора данных (меняется при любой записи в справочник)"""
+    result = await session.execute(select(DataVersion.version).where(DataVersion.id == 1))
+    return result.scalar_one()
+
+
+class VersionedCache(ABC):
+    """
+    Снимок данных в памяти процесса. Строится при первом обращении или при старте,
+    перестраивается подпиской на DataVersionWatcher. Ссылка на снимок подменяется целиком,
+    поэтому читатели всегда видят согласованное состояние
+    """
+
+    def __init__(self, session_factory: async_sessionmaker):
+        self.session_factory = session_factory
+        self.snapshot = None
+        self.version: int | None = None
+        self._lock = asyncio.Lock()
+
+    @abstractmethod
+    async def build(self, session: AsyncSession):
+        """Строит снимок по данным БД"""
+
+    async def _load(self):
+        async with self.session_factory() as session:
+            return await self.build(session)
+
+    async def reload(self, version: int | None = None):
+        async with self._lock:
+            self.snapshot = await self._load()
+            self.version = version
+
+    async def get(self):
+        if self.snapshot is None:
+            async with self._lock:
+                if self.snapshot is None:
+                    self.snapshot = await self._load()
+        return self.snapshot
+
+
+class DataVersionWatcher:
+    """
+    Периодически опрашивает версию данных и оповещает подписчиков о её смене.
+    Подписчики — кеши в памяти процесса, которые нужно перестроить после записи в БД
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, interval: float):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.version: int | None = None
+        self._listeners: list[VersionListener] = []
+        # Подписчики, упавшие на текущей версии: повторяются при следующем опросе
+        self._failed: list[VersionListener] = []
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self, listener: VersionListener):
+        self._listeners.append(listener)
+
+    async def refresh(self) -> bool:
+        """
+        Перечитывает версию; при изменении вызывает подписчиков. Возвращает True, если версия сменилась.
+        Ошибка одного подписчика не мешает остальным (в т.ч. сбросу кеша ответов) — он повторится при следующем опросе
+        """
+        async with self.session_factory() as session:
+            version = await fetch_data_version(session)
+        changed = version != self.version
+        if not changed and not self._failed:
+            return False
+
+        failed = []
+        for listener in self._listeners if changed else self._failed:
+            try:
+                await listener(version)
+            except Exception:
+                logger.exception("Data version listener %r failed on version %s", listener, version)
+                failed.append(listener)
+        self._failed = failed
+        self.version = version
+        return changed
+
+    async def start(self):
+        await self._check_bulk_load()
+        # Первое чтение — синхронно со стартом приложения, чтобы кеши были готовы к первому запросу
+        await self.refresh()
+        self._task = asyncio.create_task(self._poll())
+
+    async def _check_bulk_load(self):
+        """
+        Снятые триггеры при старте — либо идёт массовая загрузка, либо её прервали. Чинить здесь нельзя
+        (загрузка может быть жива), поэтому только предупреждаем: без триггеров счётчики и индексы не обновляются
+        """
+        async with self.session_factory() as session:
+            saved = (await session.execute(select(func.count()).select_from(bulk_load_triggers))).scalar_one()
+        if saved:
+            logger.warning(
+                "%s triggers are removed by a bulk load; if no import is running, "
+                "run scripts/import_data.py --repair", saved
+            )
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Failed to refresh data version")
+
+
+data_version_watcher = DataVersionWatcher(async_session_read, DATA_VERSION_POLL_INTERVAL)
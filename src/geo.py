@@ -0,0 +1,67 @@
+from math import asin, atan2, cos, degrees, radians, sin, sqrt
+
+import numpy as np
+
+EARTH_RADIUS = 6371000  # метры
+METERS_PER_DEGREE = 111_000  # 1° широты ≈ 111 км
+
+
+def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Расстояние в метрах по формуле гаверсинусов"""
+    f1 = radians(lat1)
+    f2 = radians(lat2)
+    delta_f = radians(lat2 - lat1)
+    delta_l = radians(lng2 - lng1)
+
+    a = sin(delta_f / 2) ** 2 + cos(f1) * cos(f2) * sin(delta_l / 2) ** 2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+    return EARTH_RADIUS * c
+
+
+def radius_bbox(lat: float, lng: float, radius: float) -> tuple[float, float, float, float]:
+    """Прямоугольник (lat_min, lng_min, lat_max, lng_max), описанный вокруг круга радиусом radius метров"""
+    lat_delta = radius / METERS_PER_DEGREE
+    # У полюсов долготный градус вырождается — не даём делителю обнулиться
+    lng_delta = radius / (METERS_PER_DEGREE * max(abs(cos(radians(lat))), 1e-6))
+    return lat - lat_delta, lng - lng_delta, lat + lat_delta, lng + lng_delta
+
+
+def circle_bbox(lat: float, lng: float, radius: float) -> tuple[float, float, float, float] | None:
+    """
+    Точный прямоугольник (lat_min, lng_min, lat_max, lng_max), описанный вокруг круга на сфере, — для радиусов
+    в сотни километров, где radius_bbox уже занижает долготу. None — круг накрывает полюс или пересекает
+    антимеридиан, и прямоугольником не описывается
+    """
+    # Небольшой запас на погрешность округления: здание ровно на границе круга не должно выпасть
+    angle = radius / EARTH_RADIUS * (1 + 1e-9)
+    lat_min, lat_max = lat - degrees(angle), lat + degrees(angle)
+    if lat_min <= -90 or lat_max >= 90:
+        return None
+    lng_delta = degrees(asin(sin(angle) / cos(radians(lat))))
+    if lng - lng_delta < -180 or lng + lng_delta > 180:
+        return None
+    return lat_min, lng - lng_delta, lat_max, lng + lng_delta
+
+
+def haversine_matrix(lats1, lngs1, lats2, lngs2) -> np.ndarray:
+    """Матрица расстояний в метрах: строки — точки (lats1, lngs1), столбцы — точки (lats2, lngs2)"""
+    f1 = np.radians(np.asarray(lats1, dtype=np.float64))[:, None]
+    f2 = np.radians(np.asarray(lats2, dtype=np.float64))[None, :]
+    l1 = np.radians(np.asarray(lngs1, dtype=np.float64))[:, None]
+    l2 = np.radians(np.asarray(lngs2, dtype=np.float64))[None, :]
+
+    a = np.sin((f2 - f1) / 2) ** 2 + np.cos(f1) * np.cos(f2) * np.sin((l2 - l1) / 2) ** 2
+    return EARTH_RADIUS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+# Web Mercator (EPSG:3857) не определён у полюсов — широта обрезается, как у всех веб-карт
+MERCATOR_MAX_LAT = 85.05112878
+
+
+def mercator_position(lats, lngs) -> tuple[np.ndarray, np.ndarray]:
+    """Положение точек на карте мира в долях [0, 1): x — с запада на восток, y — с севера на юг"""
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -MERCATOR_MAX_LAT, MERCATOR_MAX_LAT)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    x = (lngs + 180) / 360
+    y = (1 - np.log(np.tan(np.radians(lats)) + 1 / np.cos(np.radians(lats))) / np.pi) / 2
+    return x, y
@@ -1,6 +1,7 @@
 from typing import Optional
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Integer, String, ForeignKey, Column, Table
+from sqlalchemy import Integer, String, Float, ForeignKey, Column, Table, Index, CheckConstraint
+from sqlalchemy import table, column
 from sqlalchemy.orm import DeclarativeBase
 
 
@@ -8,6 +9,10 @@ class Model(DeclarativeBase):
     pass
 
 
+# Все связи объявлены с lazy="raise": неявных догрузок нет, план загрузки
+# (joinedload / selectinload) задаётся явно в каждом методе репозитория
+
+
 class Building(Model):
 
     __tablename__ = "buildings"
@@ -19,10 +24,30 @@ class Building(Model):
     organizations: Mapped[list["Organization"]] = relationship(
         "Organization",
         back_populates="building",
-        lazy="selectin"
+        lazy="raise"
     )
 
 
+# Виртуальная таблица R*Tree по координатам зданий. Создаётся миграцией и синхронизируется
+# триггерами, поэтому объявлена вне metadata (create_all не должен делать из неё обычную таблицу)
+buildings_rtree = table(
+    "buildings_rtree",
+    column("id", Integer),
+    column("min_lat", Float),
+    column("max_lat", Float),
+    column("min_lng", Float),
+    column("max_lng", Float),
+)
+
+
+# Полнотекстовый индекс FTS5 (триграммы) по названиям организаций, синхронизируется триггерами
+organizations_fts = table(
+    "organizations_fts",
+    column("rowid", Integer),
+    column("name", String),
+)
+
+
 class Activity(Model):
     __tablename__ = 'activities'
 
@@ -41,7 +66,7 @@ class Activity(Model):
         "Activity",
         back_populates="children",
         remote_side=[id],
-        lazy="selectin"
+        lazy="raise"
     )
 
     # Связь с дочерними элементами
@@ -49,14 +74,14 @@ class Activity(Model):
         "Activity",
         back_populates="parent",
         cascade="all, delete-orphan",
-        lazy="selectin"
+        lazy="raise"
     )
 
     organizations: Mapped[list["Organization"]] = relationship(
         "Organization",
         secondary="organization_activities",
         back_populates="activities",
-        lazy="selectin"
+        lazy="raise"
     )
 
     def __str__(self) -> str:
@@ -68,6 +93,7 @@ class Activity(Model):
 
 class Organization(Model):
     __tablename__ = 'organizations'
+    __table_args__ = (Index("ix_organizations_building_id_name", "building_id", "name", "id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String, nullable=False)  # Название организации
@@ -78,14 +104,14 @@ class Organization(Model):
         ForeignKey("buildings.id"),
         nullable=False
     )
-    building: Mapped["Building"] = relationship("Building", back_populates="organizations", lazy="joined")
+    building: Mapped["Building"] = relationship("Building", back_populates="organizations", lazy="raise")
 
     # Связь с деятельностью (многие-ко-многим: организация может иметь несколько видов деятельности)
     activities: Mapped[list["Activity"]] = relationship(
         "Activity",
         secondary="organization_activities",
         back_populates="organizations",
-        lazy="selectin"
+        lazy="raise"
     )
 
     # Телефоны — отдельная таблица для множества номеров
@@ -93,7 +119,7 @@ class Organization(Model):
         "Phone",
         back_populates="organization",
         cascade="all, delete-orphan",
-        lazy="selectin"
+        lazy="raise"
     )
 
 
@@ -102,12 +128,55 @@ organization_activities = Table(
     "organization_activities",
     Model.metadata,
     Column("organization_id", Integer, ForeignKey("organizations.id"), primary_key=True),
-    Column("activity_id", Integer, ForeignKey("activities.id"), primary_key=True)
+    Column("activity_id", Integer, ForeignKey("activities.id"), primary_key=True),
+    Index("ix_organization_activities_activity_id", "activity_id", "organization_id")
+)
+
+
+# Транзитивное замыкание дерева видов деятельности: все пары (предок, потомок),
+# включая пару узла с самим собой (depth = 0). Поддерживается триггерами в БД
+activity_closure = Table(
+    "activity_closure",
+    Model.metadata,
+    Column("ancestor_id", Integer, ForeignKey("activities.id"), primary_key=True),
+    Column("descendant_id", Integer, ForeignKey("activities.id"), primary_key=True),
+    Column("depth", Integer, nullable=False),
+    Index("ix_activity_closure_descendant_id", "descendant_id", "ancestor_id")
+)
+
+
+# Число организаций в каждом здании — для total в ответах без COUNT(*) на каждый запрос. Поддерживается триггерами в БД
+building_organization_counts = Table(
+    "building_organization_counts",
+    Model.metadata,
+    Column("building_id", Integer, ForeignKey("buildings.id"), primary_key=True),
+    Column("organizations", Integer, nullable=False),
+)
+
+
+# Число организаций по виду деятельности: с ним самим и во всём поддереве (каждая организация — один раз).
+# Поддерживается триггерами в БД
+activity_organization_counts = Table(
+    "activity_organization_counts",
+    Model.metadata,
+    Column("activity_id", Integer, ForeignKey("activities.id"), primary_key=True),
+    Column("organizations", Integer, nullable=False),
+    Column("subtree_organizations", Integer, nullable=False),
 )
 
 
+# Триггеры, снятые на время массовой загрузки (см. src/db/maintenance.bulk_load). Сохраняются в той же транзакции,
+# что и снимаются: если загрузку прервали, по этой таблице их возвращает import_data.py --repair
+bulk_load_triggers = Table(
+    "bulk_load_triggers",
+    Model.metadata,
+    Column("name", String, primary_key=True),
+    Column("sql", String, nullable=False),
+)
+
 class Phone(Model):
     __tablename__ = 'phones'
+    __table_args__ = (Index("ix_phones_organization_id", "organization_id", "id"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     number: Mapped[str] = mapped_column(String, nullable=False)  # Номер телефона
@@ -118,4 +187,13 @@ class Phone(Model):
         ForeignKey("organizations.id"),
         nullable=False
     )
-    organization: Mapped["Organization"] = relationship("Organization", back_populates="phones", lazy="selectin")
+    organization: Mapped["Organization"] = relationship("Organization", back_populates="phones", lazy="raise")
+
+
+class DataVersion(Model):
+    """Версия набора данных: единственная строка, счётчик увеличивают триггеры при любой записи в справочник"""
+    __tablename__ = 'data_version'
+    __table_args__ = (CheckConstraint("id = 1", name="ck_data_version_single_row"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -0,0 +1,71 @@
+"""
+Тестовый прогон: справочник генерируется заново во временный файл, бюджеты запросов — в режиме enforce.
+Конфигурация читается при импорте, поэтому окружение задаётся до импорта приложения
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+API_KEY = "test-api-key"
+
+data_dir = tempfile.mkdtemp(prefix="compendium-tests-")
+database_path = os.path.join(data_dir, "compendium.db")
+
+os.environ["DATABASE_CONNECTION_STRING"] = f"sqlite+aiosqlite:///{database_path}"
+os.environ["API_KEY"] = API_KEY
+os.environ["QUERY_BUDGET_MODE"] = "enforce"
+# Ответ из кеша не делает запросов к БД и скрыл бы перерасход бюджета
+os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+os.environ["READ_ENGINE"] = "sql"
+os.environ["SPATIAL_INDEX_ENABLED"] = "true"
+
+
+def pytest_configure(config):
+    subprocess.run(
+        [sys.executable, os.path.join(project_root, "scripts", "gen_data.py"),
+         "--organizations", "2000", "--output", database_path, "--replace"],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from main import app
+
+    with TestClient(app, headers={"X-API-Key": API_KEY}) as test_client:
+        yield test_client
+
+
+@pytest.fixture(params=[True, False], ids=["memory-index", "rtree"])
+def spatial_index(request, monkeypatch):
+    """Пространственный индекс зданий в памяти или R*Tree в SQLite"""
+    import src.api.buildings.repository as building_repository
+
+    monkeypatch.setattr(building_repository, "SPATIAL_INDEX_ENABLED", request.param)
+    return request.param
+
+
+@pytest.fixture(params=["sql", "memory"])
+def read_engine(request, monkeypatch, client):
+    """
+    Движок чтения: сервисы выбирают репозиторий при каждом запросе, поэтому переключается на лету.
+    Колоночный снимок строится заранее, как при старте с READ_ENGINE=memory, — иначе его запросы попадут в бюджет
+    """
+    import src.api.activities.service as activity_service
+    import src.api.buildings.service as building_service
+    import src.api.organizations.service as organization_service
+    from src.api.columnar import columnar_snapshot_cache
+
+    for module in (activity_service, building_service, organization_service):
+        monkeypatch.setattr(module, "READ_ENGINE", request.param)
+    if request.param == "memory":
+        client.portal.call(columnar_snapshot_cache.get)
+    return request.param
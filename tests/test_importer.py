@@ -0,0 +1,175 @@
+"""
+Импорт выгрузки обратно в справочник: отчёт об ошибках, сохранность id телефонов, производные таблицы
+после bulk_load и восстановление после убитой посреди загрузки
+"""
+import io
+import os
+import sqlite3
+import subprocess
+import sys
+
+import orjson
+import pytest
+from sqlalchemy import create_engine, text
+
+from conftest import database_path, project_root
+from src.db.importer import OrganizationImporter, read_jsonl
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Копия тестового справочника: импорт не должен менять данные, на которых работает приложение"""
+    path = str(tmp_path / "import.db")
+    with sqlite3.connect(database_path) as source, sqlite3.connect(path) as target:
+        source.backup(target)
+    return path
+
+
+@pytest.fixture
+def connection(database):
+    engine = create_engine(f"sqlite:///{database}")
+    with engine.connect() as connection:
+        yield connection
+    engine.dispose()
+
+
+def snapshot(connection, query: str) -> set:
+    return set(map(tuple, connection.execute(text(query)).all()))
+
+
+def assert_derived_tables_consistent(connection):
+    """Производные таблицы совпадают с пересчётом с нуля, триггеры на месте"""
+    assert connection.execute(text("SELECT count(*) FROM bulk_load_triggers")).scalar() == 0
+    assert snapshot(connection, "SELECT building_id, organizations FROM building_organization_counts") == snapshot(
+        connection, "SELECT id, (SELECT count(*) FROM organizations WHERE building_id = buildings.id) FROM buildings"
+    )
+    assert snapshot(connection, "SELECT ancestor_id, descendant_id FROM activity_closure") == snapshot(connection, """
+        WITH RECURSIVE paths(ancestor_id, descendant_id) AS (
+            SELECT id, id FROM activities
+            UNION ALL
+            SELECT p.ancestor_id, a.id FROM paths p JOIN activities a ON a.parent_id = p.descendant_id
+        )
+        SELECT ancestor_id, descendant_id FROM paths
+    """)
+    assert snapshot(
+        connection, "SELECT activity_id, organizations, subtree_organizations FROM activity_organization_counts"
+    ) == snapshot(connection, """
+        SELECT a.id,
+               (SELECT count(*) FROM organization_activities WHERE activity_id = a.id),
+               (SELECT count(DISTINCT oa.organization_id) FROM activity_closure c
+                JOIN organization_activities oa ON oa.activity_id = c.descendant_id WHERE c.ancestor_id = a.id)
+        FROM activities a
+    """)
+    # Координаты в R*Tree округлены до float32 — сверяем состав
+    assert snapshot(connection, "SELECT id FROM buildings_rtree") == snapshot(connection, "SELECT id FROM buildings")
+
+
+def fts_ids(connection, name: str) -> set:
+    return set(connection.execute(
+        text("SELECT rowid FROM organizations_fts WHERE organizations_fts MATCH :name"), {"name": f'"{name}"'}
+    ).scalars())
+
+
+def triggers(connection) -> set:
+    return set(connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'")).scalars())
+
+
+def test_export_import_round_trip(client, connection):
+    exported = [orjson.loads(line) for line in client.get("/export/organizations.ndjson").text.splitlines()]
+    phones_before = snapshot(connection, "SELECT id, number, organization_id FROM phones")
+    triggers_before = triggers(connection)
+    version_before = connection.execute(text("SELECT version FROM data_version")).scalar()
+
+    # Два вида деятельности с одним именем — ссылка по имени на них неоднозначна
+    parent_id = connection.execute(text("SELECT min(id) FROM activities")).scalar()
+    connection.execute(text("INSERT INTO activities (name, parent_id) VALUES ('Дубль', NULL), ('Дубль', :parent)"),
+                       {"parent": parent_id})
+    connection.commit()
+
+    changed = exported[0]
+    changed["name"] = "Переименованная Тестовая"
+    # Первый телефон остаётся со своим id и меняет номер, остальные удаляются, добавляется новый без id
+    kept_phone = changed["phones"][0]
+    kept_phone["number"] = "+7 900 000-00-01"
+    changed["phones"] = [kept_phone, {"number": "+7 900 000-00-02"}]
+
+    lines = [orjson.dumps(record).decode() for record in exported]
+    truncated = orjson.dumps(exported[1]).decode()
+    lines[1] = truncated[:len(truncated) // 2]
+    lines.append(orjson.dumps({"name": "Без здания", "building_id": 10 ** 9, "phones": ["+7 900 000-00-03"]}).decode())
+    lines.append(orjson.dumps({"name": "Неоднозначная", "building_id": changed["building"]["id"],
+                               "activities": ["Дубль"]}).decode())
+    lines.append(orjson.dumps({
+        "name": "Новая Тестовая",
+        "building": {"address": "г. Москва, ул. Новая, 1", "latitude": 55.5, "longitude": 37.5},
+        "phones": ["+7 900 000-00-04"],
+        "activity_ids": [parent_id],
+    }).decode())
+
+    report = OrganizationImporter(connection, chunk_size=40, progress=None).run(read_jsonl(io.StringIO("\n".join(lines))))
+
+    assert report.records == len(lines)
+    assert report.imported == len(lines) - 3
+    assert report.buildings_created == 1
+    assert report.errors == 3
+    assert report.messages[0].startswith("строка 2: некорректный JSON")
+    assert any(message.startswith(f"строка {len(lines) - 2}: нет здания с id") for message in report.messages)
+    assert any(message.startswith(f"строка {len(lines) - 1}: несколько видов деятельности")
+               for message in report.messages)
+
+    # Остальные телефоны не перенумерованы; у изменённой организации — ровно то, что в записи
+    phones_after = snapshot(connection, "SELECT id, number, organization_id FROM phones")
+    untouched = {phone for phone in phones_before if phone[2] != changed["id"]}
+    assert untouched <= phones_after
+    assert {phone for phone in phones_after if phone[2] == changed["id"]} == {
+        (kept_phone["id"], kept_phone["number"], changed["id"]),
+        (max(phone[0] for phone in phones_after if phone[2] == changed["id"]), "+7 900 000-00-02", changed["id"]),
+    }
+    assert {phone[1] for phone in phones_after - untouched} == {
+        "+7 900 000-00-01", "+7 900 000-00-02", "+7 900 000-00-04"
+    }
+
+    assert triggers(connection) == triggers_before
+    assert connection.execute(text("SELECT version FROM data_version")).scalar() > version_before
+    assert fts_ids(connection, "Переименованная") == {changed["id"]}
+    assert len(fts_ids(connection, "Новая Тестовая")) == 1
+    assert not fts_ids(connection, "Без здания") and not fts_ids(connection, "Неоднозначная")
+    assert_derived_tables_consistent(connection)
+
+
+def test_repair_after_killed_load(database, connection):
+    triggers_before = triggers(connection)
+    # Загрузка убита посреди работы: данные зафиксированы, а выход из bulk_load так и не случился
+    killed = subprocess.run([sys.executable, "-c", f"""
+import os, sys
+sys.path.insert(0, {project_root!r})
+from sqlalchemy import create_engine, text
+from src.db.maintenance import bulk_load
+connection = create_engine("sqlite:///{database}").connect()
+# Ссылка на контекст держится до конца: иначе сборщик мусора закроет генератор и выполнит finally
+load = bulk_load(connection)
+load.__enter__()
+connection.execute(text("INSERT INTO organizations (name, building_id) VALUES ('Прерванная Загрузка', 1)"))
+connection.commit()
+os._exit(9)
+"""])
+    assert killed.returncode == 9
+    assert not triggers(connection)
+    assert connection.execute(text("SELECT count(*) FROM bulk_load_triggers")).scalar() == len(triggers_before)
+    connection.rollback()
+
+    def repair():
+        return subprocess.run(
+            [sys.executable, os.path.join(project_root, "scripts", "import_data.py"),
+             "--repair", "--database", f"sqlite:///{database}"],
+            check=True, capture_output=True, text=True,
+        ).stdout
+
+    assert f"восстановлено триггеров {len(triggers_before)}" in repair()
+    assert triggers(connection) == triggers_before
+    assert len(fts_ids(connection, "Прерванная Загрузка")) == 1
+    assert_derived_tables_consistent(connection)
+    # Повторный запуск ничего не ломает
+    assert "восстановлено триггеров 0" in repair()
+    assert triggers(connection) == triggers_before
+    connection.rollback()
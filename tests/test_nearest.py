@@ -0,0 +1,132 @@
+"""
+/buildings/nearest против полного перебора: ближайшие здания с организациями (с activity_id — с организациями
+поддерева) по haversine. Сверяются все три пути: обход по близости (сетка в памяти или растущие круги R*Tree),
+обход поддерева редкого вида деятельности и переход на поддерево после NEAREST_MAX_ROUNDS порций
+"""
+import sqlite3
+from collections import defaultdict
+
+import pytest
+
+from conftest import database_path
+
+import src.api.buildings.repository as building_repository
+from src.api.buildings.repository import BuildingRepository
+from src.geo import haversine
+
+POINTS = {
+    "center": (55.75, 37.61),
+    "edge": (55.95, 37.95),
+    "far": (0.0, 179.9),
+    "south-west": (-60.0, -100.0),
+    "pole": (89.5, 0.0),
+}
+
+
+class Directory:
+    def __init__(self, path: str):
+        with sqlite3.connect(path) as connection:
+            self.buildings = {
+                building_id: (latitude, longitude)
+                for building_id, latitude, longitude in connection.execute("SELECT id, latitude, longitude FROM buildings")
+            }
+            self.organizations = defaultdict(set)
+            for org_id, building_id in connection.execute("SELECT id, building_id FROM organizations"):
+                self.organizations[building_id].add(org_id)
+            self.activities = defaultdict(set)
+            for org_id, activity_id in connection.execute("SELECT organization_id, activity_id FROM organization_activities"):
+                self.activities[org_id].add(activity_id)
+            self.descendants = defaultdict(set)
+            for ancestor_id, descendant_id in connection.execute("SELECT ancestor_id, descendant_id FROM activity_closure"):
+                self.descendants[ancestor_id].add(descendant_id)
+            # Виды деятельности по числу организаций поддерева: от самых редких к самым частым
+            self.by_frequency = [
+                activity_id for activity_id, _ in connection.execute(
+                    "SELECT activity_id, subtree_organizations FROM activity_organization_counts "
+                    "WHERE subtree_organizations > 0 ORDER BY subtree_organizations, activity_id"
+                )
+            ]
+
+    def nearest(self, lat: float, lng: float, k: int, activity_id: int | None) -> list[tuple[int, float, set]]:
+        """(id здания, расстояние, организации) k ближайших зданий"""
+        subtree = self.descendants[activity_id] if activity_id is not None else None
+        found = []
+        for building_id, org_ids in self.organizations.items():
+            if subtree is not None:
+                org_ids = {org_id for org_id in org_ids if self.activities[org_id] & subtree}
+            if org_ids:
+                found.append((haversine(lat, lng, *self.buildings[building_id]), building_id, org_ids))
+        found.sort(key=lambda item: item[:2])
+        return [(building_id, distance, org_ids) for distance, building_id, org_ids in found[:k]]
+
+
+@pytest.fixture(scope="module")
+def directory():
+    return Directory(database_path)
+
+
+@pytest.fixture
+def paths(monkeypatch):
+    """
+    Какими путями отвечал репозиторий: rings — только обход по близости, subtree — сразу по поддереву,
+    fallback — по поддереву после порций обхода
+    """
+    taken = set()
+    state = {}
+    nearest_candidates = BuildingRepository._nearest_candidates
+    nearest_in_subtree = BuildingRepository._nearest_in_subtree
+    get_nearest_buildings = BuildingRepository.get_nearest_buildings
+
+    def spy_candidates(self, *args, **kwargs):
+        state["rings"] = True
+        return nearest_candidates(self, *args, **kwargs)
+
+    async def spy_subtree(self, *args, **kwargs):
+        state["subtree"] = True
+        return await nearest_in_subtree(self, *args, **kwargs)
+
+    async def spy_nearest(self, *args, **kwargs):
+        state.clear()
+        result = await get_nearest_buildings(self, *args, **kwargs)
+        taken.add("fallback" if len(state) == 2 else next(iter(state), "empty"))
+        return result
+
+    monkeypatch.setattr(BuildingRepository, "_nearest_candidates", spy_candidates)
+    monkeypatch.setattr(BuildingRepository, "_nearest_in_subtree", spy_subtree)
+    monkeypatch.setattr(BuildingRepository, "get_nearest_buildings", spy_nearest)
+    return taken
+
+
+def check_nearest(client, directory, lat: float, lng: float, k: int, activity_id: int | None):
+    params = {"lat": lat, "lng": lng, "k": k}
+    if activity_id is not None:
+        params["activity_id"] = activity_id
+    response = client.get("/buildings/nearest", params=params)
+    assert response.status_code == 200, response.text
+
+    expected = directory.nearest(lat, lng, k, activity_id)
+    actual = response.json()
+    assert [building["building"]["id"] for building in actual] == [item[0] for item in expected], params
+    for building, (_, distance, org_ids) in zip(actual, expected):
+        # Расстояние в ответе округлено до 0.1 м
+        assert building["distance"] == pytest.approx(distance, abs=0.06), params
+        assert {organization["id"] for organization in building["organizations"]} == org_ids, params
+
+
+def test_nearest_matches_brute_force(client, directory, spatial_index, read_engine, paths, monkeypatch):
+    rare = directory.by_frequency[:3]
+    middle = directory.by_frequency[len(directory.by_frequency) // 2:][:3]
+    frequent = directory.by_frequency[-2:]
+    for lat, lng in POINTS.values():
+        for k in (1, 7, 100):
+            for activity_id in (None, *rare, *middle, *frequent):
+                check_nearest(client, directory, lat, lng, k, activity_id)
+
+    # На маленьком справочнике порций почти всегда хватает; с одной порцией любой недобор уходит в поддерево
+    monkeypatch.setattr(building_repository, "NEAREST_MAX_ROUNDS", 1)
+    for lat, lng in POINTS.values():
+        for k in (7, 100):
+            for activity_id in (*middle, *frequent):
+                check_nearest(client, directory, lat, lng, k, activity_id)
+
+    assert {"rings", "subtree", "fallback"} <= paths
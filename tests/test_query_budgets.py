@@ -0,0 +1,135 @@
+"""
+Каждый эндпоинт из QUERY_BUDGETS укладывается в свой бюджет SQL-запросов — и с пространственным индексом
+в памяти, и на R*Tree. В режиме enforce перерасход превращает ответ в 500
+"""
+import math
+import sqlite3
+
+import pytest
+
+from conftest import database_path
+
+from src.api.query_budget import QUERY_BUDGETS
+
+CENTER_LAT, CENTER_LNG = 55.75, 37.61
+
+covered = set()
+
+
+def tile(z: int, lat: float, lng: float) -> str:
+    """Номер тайла XYZ с точкой (lat, lng)"""
+    n = 2 ** z
+    x = int((lng + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return f"{z}/{x}/{y}"
+
+
+@pytest.fixture(scope="module")
+def samples():
+    """Идентификаторы из сгенерированного справочника: корень дерева, редкий лист, заселённое здание"""
+    with sqlite3.connect(database_path) as connection:
+        root_id = connection.execute("SELECT min(id) FROM activities WHERE parent_id IS NULL").fetchone()[0]
+        rare_id = connection.execute("""
+            SELECT a.id FROM activities a
+            JOIN activity_organization_counts c ON c.activity_id = a.id
+            WHERE c.organizations > 0 AND NOT EXISTS (SELECT 1 FROM activities child WHERE child.parent_id = a.id)
+            ORDER BY c.organizations, a.id
+            LIMIT 1
+        """).fetchone()[0]
+        building_id, organizations = connection.execute("""
+            SELECT building_id, organizations FROM building_organization_counts ORDER BY organizations DESC LIMIT 1
+        """).fetchone()
+        org_ids = [row[0] for row in connection.execute("SELECT id FROM organizations ORDER BY id LIMIT 50")]
+    assert organizations > 1
+    return {"root": root_id, "rare": rare_id, "building": building_id, "orgs": org_ids}
+
+
+def call(client, method: str, route: str, params=None, json=None, **path):
+    """Вызов эндпоинта из QUERY_BUDGETS: шаблон пути запоминается для проверки покрытия"""
+    assert (method, route) in QUERY_BUDGETS
+    covered.add((method, route))
+    response = client.request(method, route.format(**path), params=params, json=json)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_buildings(client, samples, spatial_index):
+    page = call(client, "GET", "/buildings/{building_id}/organizations", building_id=samples["building"],
+                params={"limit": 1})
+    assert page
+    call(client, "GET", "/buildings/{building_id}/organizations", building_id=samples["building"])
+
+    assert call(client, "GET", "/buildings/organizations/nearby",
+                params={"lat": CENTER_LAT, "lng": CENTER_LNG, "radius": 3000})
+    call(client, "GET", "/buildings/organizations/nearby",
+         params={"lat_min": 55.7, "lng_min": 37.5, "lat_max": 55.8, "lng_max": 37.7})
+
+    batch = call(client, "POST", "/buildings/organizations/nearby/batch", json={"centers": [
+        {"lat": CENTER_LAT, "lng": CENTER_LNG, "radius": 2000},
+        {"lat": 55.8, "lng": 37.5, "radius": 5000},
+        {"lat": 0, "lng": 0, "radius": 100},
+    ]})
+    assert len(batch) == 3
+
+
+@pytest.mark.parametrize("lat, lng", [(CENTER_LAT, CENTER_LNG), (55.95, 37.95), (0, 179.9)],
+                         ids=["center", "edge", "far"])
+def test_nearest(client, samples, spatial_index, lat, lng):
+    assert len(call(client, "GET", "/buildings/nearest", params={"lat": lat, "lng": lng, "k": 10})) == 10
+    # Корень — частый вид деятельности (поиск по кругам), лист с минимумом организаций — обход поддерева
+    for activity_id in (samples["root"], samples["rare"]):
+        assert call(client, "GET", "/buildings/nearest",
+                    params={"lat": lat, "lng": lng, "k": 100, "activity_id": activity_id})
+
+
+def test_in_memory_routes(client, samples, spatial_index):
+    for z in (3, 10, 17):
+        call(client, "GET", "/buildings/tiles/{z}/{x}/{y}", **dict(zip("zxy", tile(z, CENTER_LAT, CENTER_LNG).split("/"))))
+    call(client, "GET", "/activities/tree")
+    call(client, "GET", "/activities/tree", params={"root": samples["root"], "depth": 1})
+
+
+def test_activities(client, samples, spatial_index, read_engine):
+    for activity_id in (samples["root"], samples["rare"]):
+        own = call(client, "GET", "/activities/{activity_id}/organizations", activity_id=activity_id,
+                   params={"limit": 5})
+        subtree = call(client, "GET", "/activities/root/{activity_id}/organizations", activity_id=activity_id,
+                       params={"limit": 5})
+        # Списки организаций отдаются в одном виде в обоих движках
+        assert own.keys() == subtree.keys()
+        assert subtree["total_is_exact"] is True
+
+
+def test_search(client, spatial_index):
+    for query in ("фуд", "а", "несуществующее"):
+        call(client, "GET", "/organizations/search", params={"query": query, "limit": 5})
+
+
+def test_query(client, samples, spatial_index):
+    radius = {"lat": CENTER_LAT, "lng": CENTER_LNG, "radius": 3000}
+    box = {"lat_min": 55.7, "lng_min": 37.5, "lat_max": 55.8, "lng_max": 37.7}
+    for params in (
+        {"name": "фуд"},
+        {"activity_id": samples["root"]},
+        {"activity_id": samples["rare"], "name": "а"},
+        {"building_id": samples["building"], "activity_id": samples["root"]},
+        radius,
+        {**radius, "name": "ан"},
+        {**radius, "activity_id": samples["rare"]},
+        {**box, "name": "фуд", "activity_id": samples["root"], "building_id": samples["building"]},
+        {"lat": CENTER_LAT, "lng": CENTER_LNG, "radius": 50, "name": "ан", "building_id": samples["building"]},
+    ):
+        call(client, "GET", "/organizations/query", params={**params, "limit": 5})
+
+
+def test_organizations(client, samples, spatial_index):
+    ids = samples["orgs"]
+    assert len(call(client, "GET", "/organizations", params={"ids": ids})) == len(ids)
+    assert len(call(client, "POST", "/organizations/bulk", json={"ids": ids})) == len(ids)
+    organization = call(client, "GET", "/organizations/{org_id}", org_id=ids[0])
+    assert organization
+
+
+def test_every_budget_covered():
+    """Идёт последним в модуле: новый эндпоинт с бюджетом должен получить и проверку здесь"""
+    assert covered == set(QUERY_BUDGETS)
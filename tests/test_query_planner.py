@@ -0,0 +1,138 @@
+"""
+/organizations/query против перебора на Python: при любом плане (ведущий фасет, подавление индексов «+ 0»,
+здания области через json_each) ответ — ровно те организации, что проходят все фильтры
+"""
+import random
+import sqlite3
+from collections import defaultdict
+
+import pytest
+
+from conftest import database_path
+from src.geo import haversine
+
+CASES = 60
+
+
+class Directory:
+    """Справочник целиком в памяти теста"""
+
+    def __init__(self, path: str):
+        with sqlite3.connect(path) as connection:
+            self.buildings = {
+                building_id: (latitude, longitude)
+                for building_id, latitude, longitude in connection.execute(
+                    "SELECT id, latitude, longitude FROM buildings"
+                )
+            }
+            self.organizations = list(connection.execute("SELECT id, name, building_id FROM organizations ORDER BY id"))
+            self.activities = defaultdict(set)
+            for org_id, activity_id in connection.execute("SELECT organization_id, activity_id FROM organization_activities"):
+                self.activities[org_id].add(activity_id)
+            self.descendants = defaultdict(set)
+            self.ancestors = defaultdict(set)
+            for ancestor_id, descendant_id in connection.execute("SELECT ancestor_id, descendant_id FROM activity_closure"):
+                self.descendants[ancestor_id].add(descendant_id)
+                self.ancestors[descendant_id].add(ancestor_id)
+
+    def matches(self, params: dict) -> list[int]:
+        subtree = self.descendants[params["activity_id"]] if "activity_id" in params else None
+        name = params.get("name")
+        result = []
+        for org_id, org_name, building_id in self.organizations:
+            if "building_id" in params and building_id != params["building_id"]:
+                continue
+            if subtree is not None and not self.activities[org_id] & subtree:
+                continue
+            if name is not None:
+                # Как в поиске: от трёх символов — свёртка триграмм FTS5 (lower), короче — casefold
+                if len(name) >= 3 and name.lower() not in org_name.lower():
+                    continue
+                if len(name) < 3 and name.casefold() not in org_name.casefold():
+                    continue
+            latitude, longitude = self.buildings[building_id]
+            if "radius" in params and haversine(params["lat"], params["lng"], latitude, longitude) > params["radius"]:
+                continue
+            if "lat_min" in params and not (
+                params["lat_min"] <= latitude <= params["lat_max"] and params["lng_min"] <= longitude <= params["lng_max"]
+            ):
+                continue
+            result.append(org_id)
+        return result
+
+
+@pytest.fixture(scope="module")
+def directory():
+    return Directory(database_path)
+
+
+def mixed_case(rng: random.Random, text: str) -> str:
+    return "".join(char.upper() if rng.random() < 0.5 else char.lower() for char in text)
+
+
+def random_filters(rng: random.Random, directory: Directory) -> dict:
+    """
+    Случайное сочетание фасетов. Обычно фильтры взяты от одной организации — ответ не пуст и фасеты пересекаются;
+    иногда фасет случайный — проверяются и пустые пересечения
+    """
+    org_id, org_name, building_id = rng.choice(directory.organizations)
+    latitude, longitude = directory.buildings[building_id]
+    facets = rng.sample(["activity", "building", "area", "name"], rng.randint(1, 4))
+    anchored = rng.random() < 0.8
+
+    params = {}
+    if "activity" in facets:
+        if anchored:
+            params["activity_id"] = rng.choice(sorted(
+                {ancestor for activity in directory.activities[org_id] for ancestor in directory.ancestors[activity]}
+            ))
+        else:
+            params["activity_id"] = rng.choice(sorted(directory.descendants))
+    if "building" in facets:
+        params["building_id"] = building_id if anchored else rng.choice(sorted(directory.buildings))
+    if "area" in facets:
+        if not anchored:
+            latitude, longitude = directory.buildings[rng.choice(sorted(directory.buildings))]
+        if rng.random() < 0.5:
+            params.update(lat=latitude + rng.uniform(-0.01, 0.01), lng=longitude + rng.uniform(-0.01, 0.01),
+                          radius=rng.choice([300, 1500, 5000, 20000]))
+        else:
+            half_lat, half_lng = rng.choice([(0.005, 0.01), (0.03, 0.05), (0.2, 0.3)])
+            params.update(lat_min=latitude - half_lat * rng.random(), lat_max=latitude + half_lat * rng.random(),
+                          lng_min=longitude - half_lng * rng.random(), lng_max=longitude + half_lng * rng.random())
+    if "name" in facets:
+        if anchored:
+            length = rng.choice([1, 2, 3, 4, 6, 9])
+            start = rng.randrange(max(len(org_name) - length, 0) + 1)
+            params["name"] = mixed_case(rng, org_name[start:start + length])
+        else:
+            params["name"] = mixed_case(rng, rng.choice(["а", "ан", "фуд", "сервис", "плюс", "ЦЕНТР", "нет такого"]))
+    return params
+
+
+def query_all(client, params: dict, limit: int) -> tuple[list[int], list[dict]]:
+    """Все страницы ответа по курсору"""
+    ids, pages = [], []
+    params = {**params, "limit": limit}
+    while True:
+        response = client.get("/organizations/query", params=params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        pages.append(page)
+        ids.extend(organization["id"] for organization in page["organizations"])
+        if page["next_cursor"] is None:
+            return ids, pages
+        params["cursor"] = page["next_cursor"]
+
+
+def test_query_matches_brute_force(client, directory, spatial_index, read_engine):
+    rng = random.Random(24)
+    for _ in range(CASES):
+        params = random_filters(rng, directory)
+        limit = rng.choice([7, 50, 1000])
+        expected = directory.matches(params)
+
+        ids, pages = query_all(client, params, limit)
+        assert ids == expected, params
+        if pages[0]["total_is_exact"]:
+            assert pages[0]["total"] == len(expected), params